@@ -1,28 +1,2620 @@
 # Copyright visjble (C) 2023, All rights reserved.
 
+import time
+_STARTUP_T0 = time.perf_counter()  # Reference point for the startup measurements
+
 import tkinter as tk
-from tkinter import filedialog, messagebox
-from PIL import ImageTk, Image, ImageDraw
+from tkinter import filedialog
+from PIL import ImageTk, Image, ImageDraw, ImageChops
 import os, platform
-from tkinter import ttk
 import math
-import json
+import threading
+import socket
+import queue
+import sys
+import argparse
+import tempfile
+import struct
+import zlib
+import functools
 import hashlib
+import mmap
+import io
+import importlib.util
+from collections import OrderedDict, deque
+# ttk, messagebox and json are imported where they are used, after the first frame is shown
+
+# Modes that carry more than 8 bits per sample and need a display window
+HIGH_BIT_DEPTH_MODES = ("I;16", "I;16L", "I;16B", "I;16N", "I", "F")
+LEVELS_HISTOGRAM_MAX_PIXELS = 4_000_000  # Histogram is built from a subsample above this
+
+FRAME_CACHE_SIZE = 16  # Decoded frames kept per multi-frame image
+FRAME_LOOKAHEAD = 3  # Frames decoded ahead of the current one on the worker thread
+
+# Ways of showing the overlay against the base: (menu label, mode)
+COMPARE_MODES = [
+    ("Blend", "blend"),
+    ("Difference", "difference"),
+    ("Subtract", "subtract"),
+    ("Multiply", "multiply"),
+    ("Screen", "screen"),
+    ("Checkerboard", "checkerboard"),
+    ("Split View", "split"),
+]
+CHECKERBOARD_TILE = 32  # Checkerboard square size in displayed pixels
+OVERLAY_PATCH_MARGIN = 256  # Displayed pixels resampled around the visible overlay, so short drags reuse the patch
+
+ALIGN_COARSE_SIZE = 512  # Longest side of the coarsest alignment level
+ALIGN_WINDOW = 256  # Refinement window size in pixels
+ALIGN_GRID = 3  # Refinement windows per axis at each level
+ALIGN_MIN_PEAK = 0.05  # Phase correlation peaks below this are treated as no match
+
+EXPORT_STRIP_HEIGHT = 256  # Rows rendered and encoded per export strip
+EXPORT_COMPRESSION_LEVEL = 1  # zlib level for exports; higher levels cost far more time than they save space
+THREAD_POOL_SIZE = os.cpu_count() or 4  # Workers shared by the parallel render and export code
+PARALLEL_RESAMPLE_MIN_PIXELS = 2_000_000  # Source plus output pixels below which a resize stays on one thread
+
+PROFILE_ENV_VAR = "IMAGEZOOMER_PROFILE"  # Set to 1 or an output directory to profile the session
+PROFILE_TRACEBACK_DEPTH = 10  # Frames kept per allocation while profiling
+PROFILE_TOP_FUNCTIONS = 30  # Functions listed in the profile report
+PROFILE_TOP_ALLOCATIONS = 25  # Allocation sites listed in the profile report
+
+UNDO_HISTORY_SIZE = 1000  # Undo entries kept; each is a few parameter values, not an image
+UNDO_MERGE_SECONDS = 0.75  # Repeats of the same edit (key auto-repeat, typing) closer than this undo as one
+UNDO_KEYS = ('base_ops', 'base_rotation', 'base_offset', 'layers', 'grid_interval', 'grid_offset',
+             'grid_rotation', 'grid_center')  # View state entries that undo restores
+
+RESIZE_DEBOUNCE_MS = 150  # Quiet time after the last window resize before the full re-render
+ROTATE_SETTLE_MS = 250  # Quiet time after the last base rotation step before the full-quality render
+ROTATE_DRAFT_FACTOR = 4  # While the angle is changing, frames are rotated from a level this much coarser
+ROTATE_STEP = 1.0  # Degrees per Ctrl+Left/Right
+ROTATE_FINE_STEP = 0.1  # Degrees per Ctrl+Shift+Left/Right
+COMPARE_MAX_PANES = 9  # Images tiled in one compare window, the base image included
+COMPARE_PANE_GAP = 4  # Pixels between compare panes
+COMPARE_ZOOM_STEP = 1.25  # Zoom factor per wheel step in the compare window
+COMPARE_SETTLE_MS = 150  # Quiet time after the last compare zoom or pan step before the full-quality render
+FRAME_BUDGET_MS = 1000 / 60  # Replayed frames slower than one 60 Hz refresh count as dropped
+RECORDED_EVENTS = ("<KeyPress>", "<KeyRelease>", "<ButtonPress>", "<ButtonRelease>", "<B1-Motion>", "<MouseWheel>")
+
+DECODED_IMAGE_CACHE_SIZE = 4  # Decoded images kept warm for reopening in the same process
+INSTANCE_POLL_MS = 50  # How often the Tk loop checks for paths handed over by new launches
+AUTOMATION_POLL_MS = 5  # How often the Tk loop checks for automation requests, see AutomationServer
+DECODE_POLL_MS = 10  # How often startup checks whether the background decode has finished
+WATCH_POLL_MS = 300  # How often watch mode checks the base image file for a new version
+STATS_SETTLE_MS = 250  # Quiet time after a change of image, scale or rotation before statistics tables are rebuilt
+LOUPE_SIZE = 240  # Side of the magnifier lens in screen pixels
+LOUPE_MAGNIFICATIONS = (2, 4, 8, 16)  # Lens pixels per source pixel offered in View > Magnifier Zoom
+
+PREVIEW_CACHE_ENV_VAR = "IMAGEZOOMER_CACHE_DIR"  # Overrides where the preview cache is kept
+PREVIEW_CACHE_SIZE_ENV_VAR = "IMAGEZOOMER_CACHE_MB"  # Overrides the size cap, 0 turns the cache off
+PREVIEW_CACHE_MAX_MB = 1024  # Default size cap of the preview cache
+PREVIEW_CACHE_MIN_PIXELS = 4_000_000  # Smaller images decode fast enough without a cache
+PREVIEW_CACHE_FACTORS = (2, 4, 8)  # Reductions kept per image, besides one fitted to the screen
+RESAMPLE_FILTERS = [  # (menu label, name, Pillow filter) for View > Resampling; the automatic one picks per resize
+    ("Automatic", "auto", None),
+    ("Nearest Neighbour", "nearest", Image.NEAREST),
+    ("Bilinear", "bilinear", Image.BILINEAR),
+    ("Bicubic", "bicubic", Image.BICUBIC),
+    ("Lanczos", "lanczos", Image.LANCZOS),
+]
+RESAMPLE_REDUCING_GAP = 3.0  # Automatic downscales average whole blocks down to this far above the target first (Pillow's reducing_gap)
+NEAREST_MIN_ZOOM = 3.0  # From this magnification on, the automatic filter shows source pixels as sharp squares
+PREVIEW_LEVEL_GAP = 2.0  # Frames are resampled from a cached reduction at least this much larger (Pillow's reducing_gap)
+FINGERPRINT_BLOCK_SIZE = 65536  # Bytes read per sampled block of a file fingerprint
+FINGERPRINT_BLOCKS = 16  # Blocks sampled evenly over the file, first and last included
+PIXEL_STORE_ENV_VAR = "IMAGEZOOMER_MMAP"  # Set to 1 to map decoded images from raw files instead of holding them
+MAPPABLE_MODES = ("L", "RGB", "RGBA", "I;16", "I;16L", "I;16B")  # Modes Pillow can map from a raw file without a copy
+PIXEL_STORE_MAX_MB = 8192  # Size cap of the mapped full-resolution pixels, kept apart from the previews
+DISPLAY_PROFILE_ENV_VAR = "IMAGEZOOMER_DISPLAY_PROFILE"  # Path of the monitor's ICC profile; sRGB is assumed without it
+COLOR_MANAGED_MODES = ("L", "RGB", "RGBA", "CMYK")  # Frame modes an embedded profile is applied to
+BUSY_BINDTAG = "ImageZoomerBusy"  # Swallows input while the image is still being decoded
+
+IMAGE_FILETYPES = [
+    ("All Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff *.tif *.webp"),
+    ("PNG files", "*.png"), 
+    ("JPEG files", "*.jpg *.jpeg"), 
+    ("GIF files", "*.gif"),
+    ("BMP files", "*.bmp"),
+    ("TIFF files", "*.tiff *.tif"),
+    ("WebP files", "*.webp"),
+    ("All files", "*.*")
+]
+
+# Workspaces restore a whole session: base, overlay layers and view, see ImageZoomApp.save_workspace()
+WORKSPACE_EXTENSION = ".izw"
+WORKSPACE_VERSION = 1
+WORKSPACE_FILETYPES = [
+    ("Image Zoomer workspaces", "*" + WORKSPACE_EXTENSION),
+    ("All files", "*.*")
+]
+
+EXPORT_FILETYPES = [
+    ("TIFF files", "*.tif *.tiff"),
+    ("PNG files", "*.png"),
+]
+
+# Startup budget in seconds since the module started importing, checked by --measure-startup
+STARTUP_BUDGET = {
+    'import': 0.5,
+    'first_paint': 1.0,
+    'first_full_frame': 2.5,
+}
+
+_decoded_images = OrderedDict()  # (path, mtime, size) -> decoded image, shared by all windows
+_decoded_images_lock = threading.Lock()
+_thread_pool = None  # Created on first use, see get_thread_pool()
+_thread_pool_lock = threading.Lock()
+_pool_thread = threading.local()  # Marks the pool's own workers, which must not wait on the pool
+_pixel_store = None  # PreviewCache that full-resolution pixels are mapped from, see enable_pixel_store()
+_color_transforms = {}  # (profile digest, frame mode) -> ImageCms transform to the display profile, None if unusable
+_color_transforms_lock = threading.Lock()
+_display_profile = None  # Read on first use, see get_display_profile()
+
+
+def load_image(image_path, cache=True):
+    """Decode an image, reusing the decoded pixels if this process already opened the same file
+
+    With cache False the decode is not kept for later opens, for versions that are soon replaced.
+    """
+    stat = os.stat(image_path)
+    key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+    with _decoded_images_lock:
+        if key in _decoded_images:
+            _decoded_images.move_to_end(key)
+            return _decoded_images[key]
+    
+    image = None
+    if _pixel_store:
+        try:
+            image = load_mapped(image_path, _pixel_store)
+        except OSError as e:
+            print(f"Error mapping {image_path}: {e}")
+    if image is None:
+        image = Image.open(image_path)
+        image.load()
+    if not cache:
+        return image
+    with _decoded_images_lock:
+        _decoded_images[key] = image
+        while len(_decoded_images) > DECODED_IMAGE_CACHE_SIZE:
+            _decoded_images.popitem(last=False)
+    return image
+
+
+def enable_pixel_store(store=None):
+    """Map decoded images from raw files in store (a PreviewCache) from now on
+
+    By default the pixels go to a "pixels" directory of the preview cache with a cap of their
+    own, so mapping one large image does not evict every cached preview.
+    """
+    global _pixel_store
+    if store is None:
+        store = PreviewCache(os.path.join(PreviewCache().directory, "pixels"), PIXEL_STORE_MAX_MB * 1024 * 1024)
+    _pixel_store = store
+
+
+def load_mapped(image_path, store):
+    """Full-resolution pixels memory-mapped from the store, decoded into it on the first open
+
+    The pages belong to the OS page cache, so every window and process opening the same file
+    shares one copy. Returns None for modes that cannot be mapped, and the decoded image unmapped
+    when the store is too small for it.
+    The key adds the modification time to the content fingerprint, as nothing checks these
+    pixels against a fresh decode.
+    """
+    key = f"{file_fingerprint(image_path)}-{os.stat(image_path).st_mtime_ns:x}"
+    cached = store.load(key)
+    if cached is None:
+        image = Image.open(image_path)
+        if image.mode not in MAPPABLE_MODES:
+            return None
+        image.load()
+        store.store(key, image.size, [(1, image)], image.info)
+        cached = store.load(key)
+        if cached is None:
+            return image  # Larger than the store, keep the decode rather than doing it again
+    return cached[1][0][1]
+
+
+def reduce_image(image, factor):
+    """Shrink by an integer factor, averaging each factor x factor block"""
+    try:
+        return image.reduce(factor)
+    except ValueError:
+        # reduce() does not handle 16-bit modes, BOX resampling gives the same result
+        return image.resize((max(1, image.size[0] // factor), max(1, image.size[1] // factor)), Image.BOX)
+
+
+def file_fingerprint(image_path, block_size=FINGERPRINT_BLOCK_SIZE, blocks=FINGERPRINT_BLOCKS):
+    """Hex digest of the file size and evenly spaced blocks of the file content
+
+    Only a fixed amount is read, so the cache can be looked up in milliseconds before the image
+    is decoded. Cached levels are checked against the decoded pixels afterwards, see
+    PreviewCache.update(), which catches edits that leave every sampled block unchanged.
+    """
+    size = os.path.getsize(image_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(image_path, 'rb') as f:
+        if size <= block_size * blocks:
+            digest.update(f.read())
+        else:
+            step = (size - block_size) / (blocks - 1)
+            for i in range(blocks):
+                f.seek(int(i * step))
+                digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+
+def file_digest(image_path, chunk_size=1 << 20):
+    """Hex digest of the whole file content, telling a rewritten file from an identical copy
+
+    Unlike file_fingerprint() every byte is read, as a pipeline rewriting an image in place
+    may change only blocks that a sampled fingerprint would skip.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def workspace_relpath(path, workspace_dir):
+    """Path as stored in a workspace: relative to it where possible, so a moved project folder still opens"""
+    try:
+        return os.path.relpath(path, workspace_dir).replace(os.sep, "/")
+    except ValueError:
+        return os.path.abspath(path)  # Another drive on Windows
+
+
+def read_workspace(workspace_path):
+    """Load a workspace file with every image path made absolute
+
+    The base's preview cache fingerprint is dropped if the file's size or modification time
+    no longer match, so a rewritten image is fingerprinted again instead of showing stale data.
+    """
+    import json
+    with open(workspace_path, 'r') as f:
+        workspace = json.load(f)
+    if workspace.get('version', 0) > WORKSPACE_VERSION:
+        raise ValueError(f"workspace version {workspace['version']} is newer than this Image Zoomer")
+    
+    directory = os.path.dirname(os.path.abspath(workspace_path))
+    resolve = lambda path: os.path.normpath(os.path.join(directory, path))  # join keeps absolute paths
+    base = workspace['base']
+    base['path'] = resolve(base['path'])
+    try:
+        stat = os.stat(base['path'])
+        if (stat.st_size, stat.st_mtime_ns) != (base.get('size'), base.get('mtime_ns')):
+            base['fingerprint'] = None
+    except OSError:
+        base['fingerprint'] = None
+    
+    view = workspace['view']
+    for layer in view.get('layers', []):
+        layer['path'] = resolve(layer['path'])
+    if view.get('overlay_path'):
+        view['overlay_path'] = resolve(view['overlay_path'])
+    return workspace
+
+
+def pick_level(levels, size, gap=1.0):
+    """Smallest level that is at least gap times size on both axes (the largest if none is)"""
+    choice = levels[0][1]
+    for factor, image in levels:
+        if image.size[0] >= size[0] * gap and image.size[1] >= size[1] * gap:
+            choice = image
+    return choice
+
+
+def build_preview_levels(image, screen_size=None, factors=PREVIEW_CACHE_FACTORS):
+    """[(factor, image)] reductions of image and one fitted to screen_size if given, largest first"""
+    if image.mode not in ("L", "RGB", "RGBX", "RGBA", "I;16", "I;16L", "I;16B", "I", "F"):
+        image = image.convert("RGBA" if "A" in image.mode or "transparency" in image.info else "RGB")
+    width, height = image.size
+    levels = [(factor, reduce_image(image, factor)) for factor in factors
+              if width // factor and height // factor]
+    
+    if screen_size:
+        scale = min(screen_size[0] / width, screen_size[1] / height)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        if scale < 1 / min(factors) and all(level.size != size for _, level in levels):
+            source = pick_level(levels, size) if levels else image
+            levels.append((1 / scale, resize_image(source, size)))
+    return sorted(levels, key=lambda level: level[0])
+
+
+class PreviewCache:
+    """Reduced copies of large images on disk, keyed by file content and memory-mapped on reuse
+
+    An entry is a single file: a magic line, the offset of a JSON trailer, then the raw pixels
+    of every level, each starting on a page boundary so it maps straight into a Pillow image
+    without a copy (RGB is stored padded as RGBX for that reason). Levels are streamed out one
+    at a time and described by the trailer. Entries are touched when used, and the least
+    recently used ones are deleted once the cache grows beyond max_bytes.
+    """
+    MAGIC = b"IZPC1\n"
+    SUFFIX = ".izc"
+
+    def __init__(self, directory=None, max_bytes=None):
+        if directory is None:
+            directory = os.environ.get(PREVIEW_CACHE_ENV_VAR)
+        if directory is None:
+            base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") \
+                or os.path.join(os.path.expanduser("~"), ".cache")
+            directory = os.path.join(base, "imagezoomer")
+        if max_bytes is None:
+            try:
+                max_mb = float(os.environ.get(PREVIEW_CACHE_SIZE_ENV_VAR, PREVIEW_CACHE_MAX_MB))
+            except ValueError:
+                max_mb = PREVIEW_CACHE_MAX_MB
+            max_bytes = int(max_mb * 1024 * 1024)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get_path(self, fingerprint):
+        return os.path.join(self.directory, fingerprint + self.SUFFIX)
+
+    def load(self, fingerprint):
+        """(source size, [(factor, image)]) of a cached image, the images memory-mapped; None on a miss
+
+        Images mapped from RGB come back as RGBX; the info saved with the entry is set on each.
+        """
+        import json
+        if not self.enabled:
+            return None
+        path = self.get_path(fingerprint)
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(self.MAGIC)) != self.MAGIC:
+                    return None
+                trailer_offset, = struct.unpack("<Q", f.read(8))
+                f.seek(trailer_offset)
+                trailer = json.loads(f.read())
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)  # Last use decides the cleanup order
+        except (OSError, ValueError, struct.error):
+            return None
+        
+        levels = []
+        for level in trailer['levels']:
+            offset = level['offset']
+            buffer = memoryview(data)[offset:offset + level['length']]
+            image = Image.frombuffer(level['mode'], tuple(level['size']), buffer, "raw", level['mode'], 0, 1)
+            image.info.update(trailer.get('info', {}))
+            levels.append((level['factor'], image))
+        return tuple(trailer['size']), levels
+
+    def store(self, fingerprint, size, levels, info=None):
+        """Write [(factor, image)] as the entry of fingerprint, then trim the cache to max_bytes
+
+        Only the JSON-friendly values of info (frame duration, transparency, ...) are kept.
+        """
+        import json
+        if not self.enabled:
+            return
+        # Written under a temporary name so readers never see a partial entry
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(fingerprint)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        entries = []
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(self.MAGIC + struct.pack("<Q", 0))
+                for factor, image in levels:
+                    if image.mode == "RGB":
+                        image = image.convert("RGBX")
+                    offset = -(-f.tell() // mmap.PAGESIZE) * mmap.PAGESIZE
+                    data = image.tobytes()
+                    f.seek(offset)
+                    f.write(data)
+                    entries.append({'factor': factor, 'mode': image.mode, 'size': list(image.size),
+                                    'offset': offset, 'length': len(data)})
+                trailer_offset = f.tell()
+                kept_info = {}
+                for name, value in (info or {}).items():
+                    try:
+                        json.dumps(value)
+                    except (TypeError, ValueError):
+                        continue  # Bytes such as ICC profiles and EXIF are not kept
+                    kept_info[name] = value
+                f.write(json.dumps({'size': list(size), 'levels': entries, 'info': kept_info}).encode("utf-8"))
+                f.seek(len(self.MAGIC))
+                f.write(struct.pack("<Q", trailer_offset))
+            
+            if os.path.getsize(temp_path) > self.max_bytes:
+                os.remove(temp_path)  # Would evict everything else and still not fit
+                return
+            os.replace(temp_path, path)
+        except BaseException:
+            # A failed write (disk full, interrupted) must not leave its partial file behind
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self.prune()
+
+    def prune(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(self.SUFFIX):
+                    path = os.path.join(self.directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass  # Still mapped by a window on Windows; tried again on the next write
+
+    def update(self, fingerprint, image, screen_size):
+        """Cached levels of a decoded image, checked against it and rebuilt when missing or stale"""
+        cached = self.load(fingerprint)
+        if cached and cached[0] == image.size:
+            # The finest level is recomputed and compared band by band, a cheap pass next to the decode
+            factor, level = next((level for level in cached[1] if isinstance(level[0], int)), (None, None))
+            if factor:
+                fresh = build_preview_levels(image, factors=(factor,))[0][1]
+                width, height = fresh.size
+                if fresh.size == level.size and all(
+                        fresh.crop((0, top, width, top + 256)).tobytes()
+                        == level.crop((0, top, width, top + 256)).convert(fresh.mode).tobytes()
+                        for top in range(0, height, 256)):
+                    return cached[1]
+        
+        levels = build_preview_levels(image, screen_size)
+        self.store(fingerprint, image.size, levels)
+        cached = self.load(fingerprint)
+        return cached[1] if cached else levels
+
+
+def get_instance_socket_path():
+    """Per-user socket path used by single-instance mode"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(runtime_dir, f"imagezoomer-{user}.sock")
+
+
+def send_to_running_instance(image_path, socket_path=None):
+    """Hand an image path to a running instance; return True if it accepted it"""
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    import json
+    socket_path = socket_path or get_instance_socket_path()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(2)
+            client.connect(socket_path)
+            message = {'open': os.path.abspath(image_path)}
+            client.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            return client.recv(16).startswith(b"ok")
+    except OSError:
+        return False
+
+
+class InstanceServer:
+    """Accept image paths from later launches on a Unix domain socket"""
+
+    poll_ms = INSTANCE_POLL_MS
+
+    def __init__(self, root, open_callback, socket_path=None):
+        self.root = root
+        self.open_callback = open_callback
+        self.socket_path = socket_path or get_instance_socket_path()
+        self.paths = queue.Queue()  # Filled by the accept thread, drained on the Tk thread
+        self.server = None
+
+    def start(self):
+        """Bind the socket and start serving; return False if another instance owns it"""
+        if not hasattr(socket, "AF_UNIX"):
+            return False
+        if os.path.exists(self.socket_path):
+            # A socket nobody answers on is left over from a crashed instance
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(self.socket_path)
+                return False
+            except OSError:
+                os.unlink(self.socket_path)
+        
+        try:
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(self.socket_path)
+            os.chmod(self.socket_path, 0o600)
+            self.server.listen(8)
+        except OSError as e:
+            print(f"Could not listen on {self.socket_path}: {e}")
+            self.server = None
+            return False
+        
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self.root.after(self.poll_ms, self._poll)
+        return True
+
+    def _accept_loop(self):
+        """Worker thread: read one JSON line per connection and queue the path"""
+        import json
+        while self.server:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            with conn:
+                try:
+                    conn.settimeout(2)
+                    data = b""
+                    while not data.endswith(b"\n"):
+                        chunk = conn.recv(4096)
+                        if not chunk:
+                            break
+                        data += chunk
+                    if not data:
+                        continue  # Liveness probe from another launch
+                    message = json.loads(data.decode("utf-8"))
+                    image_path = message.get('open') if isinstance(message, dict) else None
+                    if not isinstance(image_path, str) or not image_path:
+                        raise ValueError(f"no path to open in {message!r}")
+                    self.paths.put(image_path)
+                    conn.sendall(b"ok\n")
+                except Exception as e:
+                    # One bad client must not stop the accept thread
+                    print(f"Ignoring bad single-instance request: {e}")
+
+    def _poll(self):
+        """Open queued paths on the Tk thread"""
+        try:
+            while not self.paths.empty():
+                image_path = self.paths.get()
+                try:
+                    self.open_callback(image_path)
+                except Exception as e:
+                    print(f"Error opening {image_path}: {e}")
+        finally:
+            self.root.after(self.poll_ms, self._poll)
+
+    def stop(self):
+        """Close the listening socket and remove it"""
+        if self.server:
+            server, self.server = self.server, None
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def get_automation_socket_path():
+    """Per-user socket path of the automation interface"""
+    return get_instance_socket_path().replace("imagezoomer-", "imagezoomer-automation-")
+
+
+def send_automation_request(request, socket_path=None, timeout=60):
+    """Send one request to a window started with --automation and return its reply
+
+    request is {'commands': [...], 'capture': 'png', 'save': path}; see
+    ImageZoomApp.apply_commands() for the commands. The reply holds 'ok', 'timings',
+    'renders', 'size' and 'view', plus 'png' (base64) when captured, or 'error'.
+    """
+    import json
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path or get_automation_socket_path())
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with client.makefile('rb') as replies:
+            return json.loads(replies.readline().decode("utf-8"))
+
+
+class AutomationServer(InstanceServer):
+    """Run JSON command batches from scripts on a Unix domain socket
+
+    Each line a client sends is one request and gets one JSON line back. A connection can
+    stay open for any number of requests; they are run on the Tk thread in order.
+    """
+
+    poll_ms = AUTOMATION_POLL_MS
+
+    def __init__(self, app, socket_path=None):
+        super().__init__(app.root, None, socket_path or get_automation_socket_path())
+        self.app = app
+        self.requests = queue.Queue()  # (request, reply queue), answered on the Tk thread
+
+    def _accept_loop(self):
+        """Worker thread: serve each client connection on a thread of its own"""
+        while self.server:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        """Connection thread: hand each request line to the Tk thread and send back its reply"""
+        import json
+        with conn:
+            try:
+                with conn.makefile('rb') as lines:
+                    for line in lines:
+                        try:
+                            request = json.loads(line.decode("utf-8"))
+                        except ValueError as e:
+                            reply = {'ok': False, 'error': f"Bad request: {e}"}
+                        else:
+                            replies = queue.Queue(maxsize=1)
+                            self.requests.put((request, replies))
+                            reply = replies.get()
+                        conn.sendall((json.dumps(reply) + "\n").encode("utf-8"))
+            except OSError as e:
+                print(f"Automation client disconnected: {e}")
+
+    def _poll(self):
+        """Run queued requests on the Tk thread, once the window shows its image"""
+        while self.app.startup_complete and not self.requests.empty():
+            request, replies = self.requests.get()
+            replies.put(self.app.handle_automation_request(request))
+        self.root.after(self.poll_ms, self._poll)
+
+
+class FrameSequence:
+    """Lazily decoded frames of a multi-page TIFF or animated GIF/WebP"""
+
+    def __init__(self, image_path, cache_size=FRAME_CACHE_SIZE, lookahead=FRAME_LOOKAHEAD):
+        self.image_path = image_path
+        self.cache_size = cache_size
+        self.lookahead = lookahead
+        self.cache = OrderedDict()  # frame index -> decoded frame, in LRU order
+        self.lock = threading.Lock()
+        
+        # Separate file handles for the UI thread and the look-ahead worker, since seek is per handle
+        self._image = Image.open(image_path)
+        self.n_frames = getattr(self._image, "n_frames", 1)
+        self._worker_image = None
+        self._pending = []
+        self._wakeup = threading.Condition(self.lock)
+        self._closed = False
+        self._worker = None
+
+    def _decode(self, image, index):
+        """Seek a handle to a frame and decode a standalone copy of it"""
+        image.seek(index)
+        return image.copy()  # copy() also keeps the per-frame info (duration)
+
+    def _store(self, index, frame):
+        """Insert a frame into the cache and evict the least recently used ones (lock held)"""
+        self.cache[index] = frame
+        self.cache.move_to_end(index)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def get_frame(self, index):
+        """Return a decoded frame, decoding it on the calling thread if not cached"""
+        with self.lock:
+            if index in self.cache:
+                self.cache.move_to_end(index)
+                return self.cache[index]
+        
+        frame = self._decode(self._image, index)
+        with self.lock:
+            self._store(index, frame)
+        return frame
+
+    def seed(self, index, frame):
+        """Put an already decoded frame into the cache"""
+        with self.lock:
+            self._store(index, frame)
+
+    def prefetch(self, index):
+        """Queue the frames after index for background decoding, dropping older requests"""
+        if self.n_frames <= 1:
+            return
+        with self.lock:
+            self._pending = [(index + i) % self.n_frames for i in range(1, self.lookahead + 1)]
+            self._pending = [i for i in self._pending if i not in self.cache]
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._prefetch_loop, daemon=True)
+                self._worker.start()
+            self._wakeup.notify()
+
+    def _prefetch_loop(self):
+        """Worker thread: decode queued frames with its own file handle"""
+        while True:
+            with self.lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    break
+                index = self._pending.pop(0)
+                if index in self.cache:
+                    continue
+            
+            try:
+                if self._worker_image is None:
+                    self._worker_image = Image.open(self.image_path)
+                frame = self._decode(self._worker_image, index)
+            except Exception as e:
+                print(f"Error decoding frame {index}: {e}")
+                continue
+            
+            with self.lock:
+                self._store(index, frame)
+        
+        if self._worker_image is not None:
+            self._worker_image.close()
+
+    def close(self):
+        """Stop the worker and release the file handles"""
+        with self.lock:
+            self._closed = True
+            self._pending = []
+            self._wakeup.notify()
+        self._image.close()
+
+
+def _gray_pyramid(image, to_gray, min_size=ALIGN_COARSE_SIZE):
+    """List of (scale, image) from full resolution down to about min_size, reduced by 2 each step"""
+    levels = [(1.0, image)]
+    current, scale = image, 1.0
+    while max(current.size) > min_size * 1.5:
+        current = reduce_image(current, 2)
+        if len(levels) == 1:
+            current = to_gray(current)
+        scale /= 2
+        levels.append((scale, current))
+    if len(levels) == 1:
+        levels.append((1.0, to_gray(image)))
+    return levels
+
+
+def _as_array(image, to_gray):
+    """Grayscale float32 array of an image"""
+    import numpy as np
+    if image.mode != 'L':
+        image = to_gray(image)
+    return np.asarray(image, dtype=np.float32)
+
+
+def phase_correlate(a, b):
+    """Return (dy, dx, peak) such that b(y + dy, x + dx) best matches a(y, x); peak is in 0..1"""
+    import numpy as np
+    a = a - a.mean()
+    b = b - b.mean()
+    cross = np.fft.rfft2(a) * np.conj(np.fft.rfft2(b))
+    cross /= np.abs(cross) + 1e-9
+    corr = np.fft.irfft2(cross, s=a.shape)
+    iy, ix = np.unravel_index(int(np.argmax(corr)), corr.shape)
+    h, w = corr.shape
+
+    # Parabolic fit around the peak for sub-pixel precision
+    def refine(prev, centre, nxt):
+        denom = prev - 2 * centre + nxt
+        return 0.5 * (prev - nxt) / denom if denom else 0.0
+    dy = iy + refine(corr[(iy - 1) % h, ix], corr[iy, ix], corr[(iy + 1) % h, ix])
+    dx = ix + refine(corr[iy, (ix - 1) % w], corr[iy, ix], corr[iy, (ix + 1) % w])
+    if dy > h / 2:
+        dy -= h
+    if dx > w / 2:
+        dx -= w
+    return -dy, -dx, float(corr[iy, ix])
+
+
+def _log_polar_spectrum(array, size):
+    """Log-polar resampling of the high-passed FFT magnitude of a windowed array"""
+    import numpy as np
+    h, w = array.shape
+    padded = np.zeros((size, size), dtype=np.float32)
+    windowed = (array - array.mean()) * np.outer(np.hanning(h), np.hanning(w))
+    top, left = (size - h) // 2, (size - w) // 2
+    padded[top:top + h, left:left + w] = windowed
+    magnitude = np.abs(np.fft.fftshift(np.fft.fft2(padded)))
+
+    freq = np.fft.fftshift(np.fft.fftfreq(size))
+    cosines = np.outer(np.cos(np.pi * freq), np.cos(np.pi * freq))
+    magnitude *= (1 - cosines) * (2 - cosines)
+
+    # Magnitude spectra are symmetric, so half a turn of angles is enough
+    log_base = (size / 2) ** (1 / size)
+    theta = np.linspace(0, np.pi, size, endpoint=False)
+    radii = log_base ** np.arange(size)
+    ys = size / 2 + np.sin(theta)[:, None] * radii[None, :]
+    xs = size / 2 + np.cos(theta)[:, None] * radii[None, :]
+
+    # Bilinear sampling
+    y0 = np.clip(np.floor(ys).astype(int), 0, size - 2)
+    x0 = np.clip(np.floor(xs).astype(int), 0, size - 2)
+    fy, fx = ys - y0, xs - x0
+    sampled = (magnitude[y0, x0] * (1 - fy) * (1 - fx) + magnitude[y0 + 1, x0] * fy * (1 - fx)
+               + magnitude[y0, x0 + 1] * (1 - fy) * fx + magnitude[y0 + 1, x0 + 1] * fy * fx)
+    return sampled, log_base
+
+
+def _render_overlay_window(overlay_levels, transform, level_scale, origin, size):
+    """Resample the overlay into a base-level window under transform (scale, angle, cx, cy)"""
+    scale, angle, cx, cy = transform
+    # Pick the coarsest overlay level that still has at least one pixel per output pixel
+    needed = scale * level_scale
+    g, source = overlay_levels[0]
+    for g_level, image in overlay_levels:
+        if g_level >= needed:
+            g, source = g_level, image
+    ow, oh = overlay_levels[0][1].size
+
+    # Output (x, y) -> base full px -> overlay full px -> overlay level px
+    cos_a, sin_a = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    kr, ki = cos_a / scale, sin_a / scale
+    bx0 = origin[0] / level_scale - cx
+    by0 = origin[1] / level_scale - cy
+    data = (g * kr / level_scale, -g * ki / level_scale, g * (kr * bx0 - ki * by0 + ow / 2),
+            g * ki / level_scale, g * kr / level_scale, g * (ki * bx0 + kr * by0 + oh / 2))
+    return source.transform(size, Image.AFFINE, data, Image.BILINEAR)
+
+
+def estimate_overlay_alignment(base, overlay, initial_scale=1.0, estimate_rotation=False, to_gray=None):
+    """Estimate how the overlay maps onto the base by coarse-to-fine phase correlation
+
+    Returns a dict with the overlay scale (overlay px -> base px), rotation in degrees
+    (Pillow's counter-clockwise convention), the offset of the overlay centre from the
+    base centre in base pixels, and the number of matched refinement windows.
+    """
+    import numpy as np
+    to_gray = to_gray or (lambda image: image.convert('L'))
+    
+    # Both pyramids are built concurrently, Pillow releases the GIL while reducing
+    overlay_result = {}
+    overlay_thread = threading.Thread(target=lambda: overlay_result.update(levels=_gray_pyramid(overlay, to_gray)))
+    overlay_thread.start()
+    base_levels = _gray_pyramid(base, to_gray)
+    overlay_thread.join()
+    overlay_levels = overlay_result['levels']
+    bw, bh = base.size
+    ow, oh = overlay.size
+
+    # Coarsest level: scale and rotation from the log-polar spectra, then the translation
+    f, base_coarse = base_levels[-1]
+    base_array = _as_array(base_coarse, to_gray)
+    scale, angle = initial_scale, 0.0
+    overlay_coarse = overlay_levels[-1][1].resize(
+        (max(8, int(ow * scale * f)), max(8, int(oh * scale * f))), Image.BILINEAR)
+    overlay_array = _as_array(overlay_coarse, to_gray)
+    size = 1 << int(math.ceil(math.log2(max(base_array.shape + overlay_array.shape))))
+    base_lp, log_base = _log_polar_spectrum(base_array, size)
+    overlay_lp, _ = _log_polar_spectrum(overlay_array, size)
+    d_theta, d_rho, peak = phase_correlate(base_lp, overlay_lp)
+    if peak >= ALIGN_MIN_PEAK:
+        scale *= log_base ** d_rho
+        if estimate_rotation:
+            angle = d_theta * 180.0 / size
+
+    # Translation: render the whole overlay at the coarse level and correlate against the base
+    padded_h = 1 << int(math.ceil(math.log2(2 * max(base_array.shape[0], oh * scale * f) + 2)))
+    padded_w = 1 << int(math.ceil(math.log2(2 * max(base_array.shape[1], ow * scale * f) + 2)))
+    base_padded = np.zeros((padded_h, padded_w), dtype=np.float32)
+    base_padded[:base_array.shape[0], :base_array.shape[1]] = base_array - base_array.mean()
+    cx, cy = bw / 2, bh / 2
+    view = _render_overlay_window(overlay_levels, (scale, angle, bw / 2, bh / 2), f,
+                                  (0, 0), (padded_w, padded_h))
+    coverage = _render_overlay_window([(1.0, Image.new('L', (ow, oh), 255))], (scale, angle, bw / 2, bh / 2), f,
+                                      (0, 0), (padded_w, padded_h))
+    view_array = np.asarray(view, dtype=np.float32)
+    mask = np.asarray(coverage, dtype=np.float32) / 255
+    view_array = (view_array - view_array[mask > 0.5].mean()) * mask
+    dy, dx, peak = phase_correlate(base_padded, view_array)
+    cx -= dx / f
+    cy -= dy / f
+
+    # Finer levels: correlate windows spread over the overlay footprint and fit a similarity transform
+    matched = 0
+    for f, base_level in reversed(base_levels[:-1]):
+        window = min(ALIGN_WINDOW, int(min(bw, bh) * f) // 2)
+        if window < 32:
+            continue
+        
+        # Current model: base point = centre + k * overlay point (both relative to their centres)
+        k = scale * complex(math.cos(math.radians(angle)), -math.sin(math.radians(angle)))
+        base_points, overlay_points = [], []
+        for gy in range(ALIGN_GRID):
+            for gx in range(ALIGN_GRID):
+                u = complex(ow * ((gx + 1) / (ALIGN_GRID + 1) - 0.5), oh * ((gy + 1) / (ALIGN_GRID + 1) - 0.5))
+                p = complex(cx, cy) + k * u
+                x0 = int(p.real * f) - window // 2
+                y0 = int(p.imag * f) - window // 2
+                if x0 < 0 or y0 < 0 or x0 + window > base_level.size[0] or y0 + window > base_level.size[1]:
+                    continue
+                base_window = _as_array(base_level.crop((x0, y0, x0 + window, y0 + window)), to_gray)
+                overlay_window = _as_array(
+                    _render_overlay_window(overlay_levels, (scale, angle, cx, cy), f, (x0, y0), (window, window)),
+                    to_gray)
+                wdy, wdx, wpeak = phase_correlate(base_window, overlay_window)
+                if wpeak < ALIGN_MIN_PEAK:
+                    continue
+                # The overlay content drawn at centre + shift belongs at the window centre
+                centre = complex(x0 + window / 2, y0 + window / 2) / f
+                drawn = centre + complex(wdx, wdy) / f
+                overlay_points.append((drawn - complex(cx, cy)) / k)
+                base_points.append(centre)
+        if not base_points:
+            continue
+        matched = len(base_points)
+        
+        # Least squares: complex k gives scale and rotation, its real part alone scale only
+        u = np.array(overlay_points)
+        p = np.array(base_points)
+        u_mean, p_mean = u.mean(), p.mean()
+        if len(u) >= 2:
+            du, dp = u - u_mean, p - p_mean
+            fit = np.sum(np.conj(du) * dp) / np.sum(np.abs(du) ** 2)
+            if estimate_rotation:
+                scale, angle = float(abs(fit)), -math.degrees(np.angle(fit))
+            else:
+                scale = float(np.real(fit))
+            k = scale * complex(math.cos(math.radians(angle)), -math.sin(math.radians(angle)))
+        centre = p_mean - k * u_mean
+        cx, cy = float(centre.real), float(centre.imag)
+
+    return {
+        'scale': float(scale),
+        'rotation': float(angle),
+        'offset_x': float(cx - bw / 2),
+        'offset_y': float(cy - bh / 2),
+        'matched_windows': matched,
+    }
+
+
+def _mark_pool_thread():
+    _pool_thread.active = True
+
+
+def get_thread_pool():
+    """Worker pool shared by the parallel render and export code, sized to the CPU count"""
+    global _thread_pool
+    with _thread_pool_lock:
+        if _thread_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _thread_pool = ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="render",
+                                              initializer=_mark_pool_thread)
+        return _thread_pool
+
+
+def resample_parallel(image, size, resample=Image.BICUBIC):
+    """Same result as image.resize(size, resample), with row bands resampled concurrently
+
+    Each band reads its source rows plus the filter support around them, so the stitched
+    output has no seams and matches a single resize to within rounding (one level at most).
+    Pillow releases the GIL while resampling, so large resizes scale with the cores. Small
+    jobs, palette images and calls made from pool workers take the plain single-threaded path.
+    """
+    width, height = size
+    work = image.size[0] * image.size[1] + width * height
+    if (THREAD_POOL_SIZE == 1 or work < PARALLEL_RESAMPLE_MIN_PIXELS or image.mode in ('P', '1')
+            or getattr(_pool_thread, 'active', False)):
+        return image.resize(size, resample)
+    
+    image.load()
+    band_height = -(-height // (2 * THREAD_POOL_SIZE))
+    factor_y = image.size[1] / height
+    
+    def resample_band(top):
+        bottom = min(height, top + band_height)
+        box = (0, top * factor_y, image.size[0], bottom * factor_y)
+        return top, _resample_region(image, box, (width, bottom - top), resample)
+    
+    output = Image.new(image.mode, size)
+    for top, band in get_thread_pool().map(resample_band, range(0, height, band_height)):
+        output.paste(band, (0, top))
+    return output
+
+
+def choose_resample(scale, policy="auto", magnify_nearest=True):
+    """Pillow filter for resizing by scale (output pixels per source pixel) under a RESAMPLE_FILTERS policy
+
+    The automatic policy takes Lanczos for downscales, bicubic for magnification and, with
+    magnify_nearest, nearest neighbour from NEAREST_MIN_ZOOM on so single pixels can be inspected.
+    """
+    if policy != "auto":
+        return next(resample for _, name, resample in RESAMPLE_FILTERS if name == policy)
+    if scale < 1:
+        return Image.LANCZOS
+    if magnify_nearest and scale >= NEAREST_MIN_ZOOM:
+        return Image.NEAREST
+    return Image.BICUBIC
+
+
+def resize_image(image, size, policy="auto", magnify_nearest=True):
+    """image resized to size with the filter choose_resample() picks, reducing first where it can
+
+    Under the automatic policy, a downscale to exactly a whole fraction of the size is a plain
+    block average (Image.reduce), and larger downscales are block-averaged to within
+    RESAMPLE_REDUCING_GAP of the target before the Lanczos pass. Unlike Pillow's own
+    reducing_gap this reduces the whole image once, so the bands of resample_parallel join up.
+    """
+    width, height = size
+    if policy == "auto" and image.mode not in ('P', '1'):
+        factor = round(image.size[0] / width)
+        if factor >= 2 and abs(image.size[0] / factor - width) < 1 and abs(image.size[1] / factor - height) < 1:
+            reduced = reduce_image(image, factor)
+            if reduced.size[0] >= width and reduced.size[1] >= height:
+                # reduce() keeps a partly covered last block, the frame size rounds it away
+                return reduced if reduced.size == size else reduced.crop((0, 0, width, height))
+        factor = int(min(image.size[0] / width, image.size[1] / height) / RESAMPLE_REDUCING_GAP)
+        if factor >= 2:
+            image = reduce_image(image, factor)
+    scale = max(width / image.size[0], height / image.size[1])
+    return resample_parallel(image, size, choose_resample(scale, policy, magnify_nearest))
+
+
+def map_levels(image, low, high, gamma_lut=None):
+    """Map a high bit-depth image to 8-bit with a linear window, then an optional gamma table"""
+    if image.mode.startswith("I;16"):
+        image = image.convert("I")
+    
+    if low is None or high is None:
+        low, high = image.getextrema()
+    if high <= low:
+        high = low + 1
+    
+    # Linear window first (done in C by point), then clamp to 8-bit and apply gamma
+    scale = 255.0 / (high - low)
+    offset = -low * scale
+    image = image.point(lambda x: x * scale + offset).convert("L")
+    if gamma_lut:
+        image = image.point(gamma_lut)
+    return image
+
+
+def get_icc_profile(image, image_path=None):
+    """Embedded ICC profile of an image as bytes, or None
+
+    Mapped and cached decodes carry no info, so the profile is read from the file header then.
+    """
+    profile = image.info.get('icc_profile')
+    if not profile and image_path:
+        try:
+            with Image.open(image_path) as header:
+                profile = header.info.get('icc_profile')
+        except OSError:
+            pass
+    return profile or None
+
+
+def get_display_profile():
+    """The monitor's profile: IMAGEZOOMER_DISPLAY_PROFILE, the system one on Windows, else sRGB"""
+    global _display_profile
+    from PIL import ImageCms
+    if _display_profile is None:
+        profile = None
+        path = os.environ.get(DISPLAY_PROFILE_ENV_VAR)
+        try:
+            if path:
+                profile = ImageCms.getOpenProfile(path)
+            elif platform.system() == "Windows":
+                profile = ImageCms.get_display_profile()
+        except (OSError, ImageCms.PyCMSError) as e:
+            print(f"Error reading display profile: {e}")
+        _display_profile = profile or ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+    return _display_profile
+
+
+def get_color_transform(icc_profile, mode):
+    """Transform from an embedded profile to the display for frames of mode, built once per pair
+
+    Returns None when Pillow has no ImageCms or the profile does not fit the mode (an RGB
+    profile on a grayscale frame), in which case frames are shown uncorrected.
+    """
+    try:
+        from PIL import ImageCms
+    except ImportError:
+        return None
+    key = (hashlib.blake2b(icc_profile, digest_size=16).digest(), mode)
+    with _color_transforms_lock:
+        if key in _color_transforms:
+            return _color_transforms[key]
+    
+    transform = None
+    try:
+        source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        transform = ImageCms.buildTransform(source, get_display_profile(), mode,
+                                            "RGBA" if mode == "RGBA" else "RGB")
+    except (OSError, ValueError, ImageCms.PyCMSError) as e:
+        print(f"Colour management unavailable for this {mode} image: {e}")
+    with _color_transforms_lock:
+        _color_transforms[key] = transform
+    return transform
+
+
+def apply_color_transform(image, icc_profile):
+    """Image converted from its embedded profile to the display, unchanged if that is not possible"""
+    if not icc_profile or image.mode not in COLOR_MANAGED_MODES:
+        return image
+    transform = get_color_transform(icc_profile, image.mode)
+    if transform is None:
+        return image
+    from PIL import ImageCms
+    return ImageCms.applyTransform(image, transform)
+
+
+def checkerboard_mask(size, phase):
+    """Checkerboard mask of the given size, with squares offset by phase"""
+    # Build one pixel per square and blow it up with NEAREST, then crop to the phase
+    tile = CHECKERBOARD_TILE
+    phase_x, phase_y = phase[0] % (2 * tile), phase[1] % (2 * tile)
+    cols = (size[0] + phase_x) // tile + 1
+    rows = (size[1] + phase_y) // tile + 1
+    data = bytes(255 if (x + y) % 2 else 0 for y in range(rows) for x in range(cols))
+    mask = Image.frombytes('L', (cols, rows), data).resize((cols * tile, rows * tile), Image.NEAREST)
+    return mask.crop((phase_x, phase_y, phase_x + size[0], phase_y + size[1]))
+
+
+def compare_patch(mode, base_region, overlay_rgb, alpha, split_x=0, checkerboard=None):
+    """Combine two equally sized RGB regions with a compare mode, faded in by alpha (0-255)
+
+    split_x is the divider column for split view, checkerboard the mask for checkerboard mode.
+    """
+    if mode == "difference":
+        patch = ImageChops.difference(base_region, overlay_rgb)
+    elif mode == "subtract":
+        patch = ImageChops.subtract(base_region, overlay_rgb)
+    elif mode == "multiply":
+        patch = ImageChops.multiply(base_region, overlay_rgb)
+    elif mode == "screen":
+        patch = ImageChops.screen(base_region, overlay_rgb)
+    elif mode == "checkerboard":
+        patch = Image.composite(overlay_rgb, base_region, checkerboard)
+    else:  # split
+        split_x = max(0, min(split_x, base_region.size[0]))
+        patch = base_region.copy()
+        patch.paste(overlay_rgb.crop((split_x, 0) + overlay_rgb.size), (split_x, 0))
+    
+    if alpha < 255:
+        patch = Image.blend(base_region, patch, alpha / 255)
+    return patch
+
+
+def _line_intersects_box(x1, y1, x2, y2, width, height):
+    """Check if a line intersects with the box (0, 0, width, height)"""
+    # Simple bounding box check
+    min_x, max_x = min(x1, x2), max(x1, x2)
+    min_y, max_y = min(y1, y2), max(y1, y2)
+    
+    return not (max_x < 0 or min_x > width or max_y < 0 or min_y > height)
+
+
+def draw_grid_lines(draw, size, interval, offset, rotation=0, center=(0, 0), origin=(0, 0), canvas_size=None,
+                    fill="black"):
+    """Draw the grid into a drawing of the given size that sits at origin on the canvas
+
+    Lines are laid out for the whole canvas (canvas_size, the drawing itself by default),
+    so tiles of one canvas drawn separately join up without seams.
+    """
+    width, height = size
+    canvas_w, canvas_h = canvas_size or size
+    offset_x, offset_y = offset[0] - origin[0], offset[1] - origin[1]
+    
+    # If no rotation, use the simple method
+    if rotation == 0:
+        # Draw vertical lines
+        for i in range(offset_x % interval, width, interval):
+            draw.line([(i, 0), (i, height)], fill=fill)
+            
+        # Draw horizontal lines
+        for j in range(offset_y % interval, height, interval):
+            draw.line([(0, j), (width, j)], fill=fill)
+        return
+    
+    # For rotated grid, draw a proper rotated square grid
+    angle_rad = math.radians(rotation)
+    cos_a = math.cos(angle_rad)
+    sin_a = math.sin(angle_rad)
+    
+    # Use the clicked point as rotation center (accounting for offset)
+    cx = center[0] + offset[0]
+    cy = center[1] + offset[1]
+    
+    # Calculate the maximum distance from center to cover the entire canvas
+    max_dist = int(math.sqrt(canvas_w**2 + canvas_h**2)) + interval
+    
+    # Two perpendicular directions for the grid
+    # Direction 1: original vertical direction rotated
+    dir1_x = -sin_a  # perpendicular to angle
+    dir1_y = cos_a
+    
+    # Direction 2: original horizontal direction rotated  
+    dir2_x = cos_a
+    dir2_y = sin_a
+    
+    def draw_line(x1, y1, x2, y2):
+        # Ends are snapped to whole canvas pixels before moving to the drawing, so every tile
+        # rasterises exactly the same line
+        x1, y1 = int(x1) - origin[0], int(y1) - origin[1]
+        x2, y2 = int(x2) - origin[0], int(y2) - origin[1]
+        if _line_intersects_box(x1, y1, x2, y2, width, height):
+            draw.line([(x1, y1), (x2, y2)], fill=fill)
+    
+    # Draw grid lines in both directions
+    for i in range(-max_dist // interval, max_dist // interval + 1):
+        step = i * interval
+        
+        # Lines in direction 1 (rotated vertical lines)
+        # Start point: center + step in direction 2, extended backwards in direction 1
+        start_x = cx + step * dir2_x - max_dist * dir1_x
+        start_y = cy + step * dir2_y - max_dist * dir1_y
+        # End point: center + step in direction 2, extended forwards in direction 1  
+        end_x = cx + step * dir2_x + max_dist * dir1_x
+        end_y = cy + step * dir2_y + max_dist * dir1_y
+        
+        draw_line(start_x, start_y, end_x, end_y)
+        
+        # Lines in direction 2 (rotated horizontal lines)
+        # Start point: center + step in direction 1, extended backwards in direction 2
+        start_x = cx + step * dir1_x - max_dist * dir2_x
+        start_y = cy + step * dir1_y - max_dist * dir2_y
+        # End point: center + step in direction 1, extended forwards in direction 2
+        end_x = cx + step * dir1_x + max_dist * dir2_x
+        end_y = cy + step * dir1_y + max_dist * dir2_y
+        
+        draw_line(start_x, start_y, end_x, end_y)
+
+
+def _resample_region(image, box, size, resample=Image.BICUBIC):
+    """Resample the source box (float pixels) of image to size, reading only the pixels around it"""
+    if box == tuple(int(v) for v in box) and size == (box[2] - box[0], box[3] - box[1]):
+        region = image.crop(box)  # 1:1 on whole pixels, nothing to resample
+    else:
+        # Keep enough margin for the filter support so tiles match a resize of the whole image
+        margin = 4 * max(1.0, (box[2] - box[0]) / size[0], (box[3] - box[1]) / size[1])
+        left = max(0, int(math.floor(box[0] - margin)))
+        top = max(0, int(math.floor(box[1] - margin)))
+        right = min(image.size[0], int(math.ceil(box[2] + margin)))
+        bottom = min(image.size[1], int(math.ceil(box[3] + margin)))
+        region = image.crop((left, top, right, bottom))
+        if region.mode in ('P', '1'):
+            region = region.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        region = region.resize(size, resample, box=(box[0] - left, box[1] - top, box[2] - left, box[3] - top))
+    if region.mode in ('P', '1'):
+        region = region.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return region
+
+
+def rotated_size(size, angle):
+    """Size of the bounding box Image.rotate(angle, expand=True) gives an image of the given size"""
+    if not angle:
+        return size
+    width, height = size
+    if angle % 90 == 0:
+        return size if angle % 180 == 0 else (height, width)  # Pillow transposes, no rounding
+    radians = math.radians(angle)
+    cos_a, sin_a = abs(math.cos(radians)), abs(math.sin(radians))
+    half_w = (width * cos_a + height * sin_a) / 2
+    half_h = (width * sin_a + height * cos_a) / 2
+    return (math.ceil(width / 2 + half_w) - math.floor(width / 2 - half_w),
+            math.ceil(height / 2 + half_h) - math.floor(height / 2 - half_h))
+
+
+def rotate_image(image, angle, resample=Image.BICUBIC):
+    """Same result as image.rotate(angle, resample, expand=True) on white, with row bands rotated concurrently
+
+    Each band is its own affine transform of the source, so bands run on the thread pool like
+    resample_parallel. High bit-depth images are filled with 0, which has no colour to map.
+    """
+    if angle % 90 == 0:
+        return image.rotate(angle, expand=True)  # A transpose, nothing to resample
+    if image.mode in ('P', '1'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    width, height = image.size
+    out_w, out_h = rotated_size(image.size, angle)
+    radians = math.radians(angle)
+    cos_a, sin_a = math.cos(radians), math.sin(radians)
+    fill = 0 if image.mode in HIGH_BIT_DEPTH_MODES else 'white'
+    
+    # Output pixel p shows the source at R(-angle)(p - output centre) + source centre
+    origin_x = width / 2 - cos_a * out_w / 2 + sin_a * out_h / 2
+    origin_y = height / 2 - sin_a * out_w / 2 - cos_a * out_h / 2
+    
+    def rotate_band(top):
+        bottom = min(out_h, top + band_height)
+        data = (cos_a, -sin_a, origin_x - sin_a * top, sin_a, cos_a, origin_y + cos_a * top)
+        return top, image.transform((out_w, bottom - top), Image.AFFINE, data, resample, fillcolor=fill)
+    
+    work = width * height + out_w * out_h
+    if THREAD_POOL_SIZE == 1 or work < PARALLEL_RESAMPLE_MIN_PIXELS or getattr(_pool_thread, 'active', False):
+        band_height = out_h
+        return rotate_band(0)[1]
+    
+    image.load()
+    band_height = -(-out_h // (2 * THREAD_POOL_SIZE))
+    output = Image.new(image.mode, (out_w, out_h))
+    for top, band in get_thread_pool().map(rotate_band, range(0, out_h, band_height)):
+        output.paste(band, (0, top))
+    return output
+
+
+def render_overlay_region(overlay, scaled_size, rotation, region, to_display, resample=Image.BICUBIC):
+    """RGBA pixels of region of the overlay resized to scaled_size and rotated with expand=True
+
+    region is (left, top, right, bottom) in the bounding box of the rotated overlay. Only the
+    source pixels under it are read and resampled (with the resample filter), so the cost
+    follows the region, not the overlay. to_display maps the resampled source to 8-bit before
+    rotation.
+    """
+    left, top, right, bottom = region
+    overlay_w, overlay_h = overlay.size
+    scaled_w, scaled_h = scaled_size
+    factor_x, factor_y = overlay_w / scaled_w, overlay_h / scaled_h
+    
+    if not rotation:
+        source_box = (left * factor_x, top * factor_y, right * factor_x, bottom * factor_y)
+        patch = _resample_region(overlay, source_box, (right - left, bottom - top), resample)
+        return to_display(patch).convert('RGBA')
+    
+    # Rotated: scale the source under the region first (antialiased like a full resize), then rotate.
+    # A point p of the bounding box shows the scaled overlay at q = R(-angle)(p - centre) + scaled size / 2
+    patch_w, patch_h = rotated_size(scaled_size, rotation)
+    angle = math.radians(rotation)
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    
+    def to_scaled(x, y):
+        dx, dy = x - patch_w / 2, y - patch_h / 2
+        return dx * cos_a - dy * sin_a + scaled_w / 2, dx * sin_a + dy * cos_a + scaled_h / 2
+    
+    corners = [to_scaled(x, y) for x in (left, right) for y in (top, bottom)]
+    scaled_left = max(0, int(math.floor(min(q[0] for q in corners))) - 3)
+    scaled_top = max(0, int(math.floor(min(q[1] for q in corners))) - 3)
+    scaled_right = min(scaled_w, int(math.ceil(max(q[0] for q in corners))) + 3)
+    scaled_bottom = min(scaled_h, int(math.ceil(max(q[1] for q in corners))) + 3)
+    if scaled_right <= scaled_left or scaled_bottom <= scaled_top:
+        return Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+    
+    source_box = (scaled_left * factor_x, scaled_top * factor_y, scaled_right * factor_x, scaled_bottom * factor_y)
+    scaled = _resample_region(overlay, source_box, (scaled_right - scaled_left, scaled_bottom - scaled_top), resample)
+    scaled = to_display(scaled).convert('RGBA')
+    
+    qx, qy = to_scaled(left, top)
+    data = (cos_a, -sin_a, qx - scaled_left, sin_a, cos_a, qy - scaled_top)
+    return scaled.transform((right - left, bottom - top), Image.AFFINE, data, Image.BICUBIC)
+
+
+def _moments(count, total, squares):
+    """Mean and standard deviation from a pixel count, sum and sum of squares"""
+    mean = total / count
+    variance = max(0, count * squares - total * total) / (count * count)  # Exact for integer sums
+    return mean, math.sqrt(variance)
+
+
+class RegionStats:
+    """Summed-area tables of one image laid out along the grid axes, for O(1) rectangle statistics
+
+    The image is resampled once so that grid cells become axis-aligned rectangles of the
+    tables; for an unrotated grid over an unrotated, unscaled image the pixels are used as
+    they are. Table coordinates are along the grid axes from the image centre, so moving the
+    grid, the base or the overlay only shifts the queries. Sums of values, squares and covered
+    pixels over a rectangle are four lookups each; min and max do not decompose like that and
+    are reduced over the rectangle's pixels. Colour images are measured on their luminance,
+    high bit-depth images on their raw values.
+    """
+
+    def __init__(self, image, scale=1.0, rotation=0.0, grid_rotation=0.0):
+        """scale is displayed pixels per image pixel, rotation the image's (as Image.rotate)"""
+        import numpy as np
+        if image.mode.startswith("I;16"):
+            image = image.convert("I")
+        elif image.mode not in ("L", "I", "F"):
+            image = image.convert("L")
+        # Average whole blocks first when the image is shown much smaller than its pixels
+        factor = int(1 / scale) if scale < 1 else 1
+        if factor > 1:
+            image = reduce_image(image, factor)
+            scale *= factor
+        
+        # Table (along the grid axes, from the centre) -> image pixels: rotate and scale
+        width, height = image.size
+        angle = math.radians(rotation + grid_rotation)
+        cos_a, sin_a = math.cos(angle), math.sin(angle)
+        if abs(sin_a) < 1e-9 and cos_a > 0 and abs(scale - 1) < 1e-9:
+            self.values = np.asarray(image)
+            self.mask = None
+            self.origin = (-width / 2, -height / 2)
+        else:
+            corners = [(x - width / 2, y - height / 2) for x in (0, width) for y in (0, height)]
+            along = [scale * (cos_a * x + sin_a * y) for x, y in corners]
+            across = [scale * (-sin_a * x + cos_a * y) for x, y in corners]
+            left, top = math.floor(min(along)), math.floor(min(across))
+            size = (max(1, math.ceil(max(along)) - left), max(1, math.ceil(max(across)) - top))
+            data = (cos_a / scale, -sin_a / scale, width / 2 + (cos_a * left - sin_a * top) / scale,
+                    sin_a / scale, cos_a / scale, height / 2 + (sin_a * left + cos_a * top) / scale)
+            self.values = np.asarray(image.transform(size, Image.AFFINE, data, Image.BILINEAR))
+            covered = Image.new("L", image.size, 255).transform(size, Image.AFFINE, data, Image.NEAREST)
+            self.mask = np.asarray(covered) > 0
+            self.origin = (left, top)
+        
+        # Integer tables are exact, but squares of values beyond 16 bits can overflow int64 sums
+        exact = (self.values.dtype.kind != 'f' and
+                 max(-int(self.values.min()), int(self.values.max())) <= 0xFFFF)
+        dtype = np.int64 if exact else np.float64
+        values = self.values if self.mask is None else np.where(self.mask, self.values, 0)
+        self.sums = self.integral(values, dtype)
+        self.squares = self.integral(np.square(values, dtype=dtype), dtype)
+        self.counts = None if self.mask is None else self.integral(self.mask, np.int64)
+
+    @staticmethod
+    def integral(array, dtype):
+        """Summed-area table with a zero first row and column"""
+        import numpy as np
+        table = np.zeros((array.shape[0] + 1, array.shape[1] + 1), dtype=dtype)
+        np.cumsum(array, axis=0, dtype=dtype, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+        return table
+
+    def to_number(self, value):
+        return float(value) if self.sums.dtype.kind == 'f' else int(value)
+
+    def query(self, box, shift=(0, 0)):
+        """(pixels, mean, std, min, max) over box, None if it holds no pixel of the image
+
+        box is (left, top, right, bottom) along the grid axes, shift the position of the
+        image centre in the same coordinates.
+        """
+        height, width = self.values.shape
+        left, top = self.origin[0] + shift[0], self.origin[1] + shift[1]
+        x0 = min(width, max(0, int(round(box[0] - left))))
+        y0 = min(height, max(0, int(round(box[1] - top))))
+        x1 = min(width, max(0, int(round(box[2] - left))))
+        y1 = min(height, max(0, int(round(box[3] - top))))
+        area = lambda table: self.to_number(table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0])
+        count = (x1 - x0) * (y1 - y0) if self.counts is None else int(area(self.counts))
+        if count <= 0:
+            return None
+        
+        mean, std = _moments(count, area(self.sums), area(self.squares))
+        region = self.values[y0:y1, x0:x1]
+        if self.mask is not None:
+            region = region[self.mask[y0:y1, x0:x1]]
+        return count, mean, std, region.min().item(), region.max().item()
+
+    def cells(self, interval, shift=(0, 0)):
+        """{(column, row): (pixels, mean, std, min, max)} for every grid cell holding image pixels
+
+        Cell (0, 0) starts at the grid origin. All cells are summed at once from the tables,
+        min and max come from one reduceat pass per axis.
+        """
+        import numpy as np
+        height, width = self.values.shape
+        left, top = self.origin[0] + shift[0], self.origin[1] + shift[1]
+        
+        def edges(start, length):
+            first, last = math.floor(start / interval), math.floor((start + length) / interval)
+            indices = np.arange(first, last + 2)
+            return indices[:-1], np.clip(np.round(indices * interval - start), 0, length).astype(int)
+        
+        columns, xs = edges(left, width)
+        rows, ys = edges(top, height)
+        block = lambda table: (table[np.ix_(ys[1:], xs[1:])] - table[np.ix_(ys[:-1], xs[1:])]
+                               - table[np.ix_(ys[1:], xs[:-1])] + table[np.ix_(ys[:-1], xs[:-1])])
+        sums, squares = block(self.sums), block(self.squares)
+        if self.counts is None:
+            counts = np.outer(np.diff(ys), np.diff(xs))
+        else:
+            counts = block(self.counts)
+        
+        # Reduce over the cells that have a width and height, masked pixels never win
+        keep_x, keep_y = np.diff(xs) > 0, np.diff(ys) > 0
+        if self.mask is None:
+            low = high = self.values
+        else:
+            kind = np.finfo if self.values.dtype.kind == 'f' else np.iinfo
+            low = np.where(self.mask, self.values, kind(self.values.dtype).max)
+            high = np.where(self.mask, self.values, kind(self.values.dtype).min)
+        reduce = lambda ufunc, values: ufunc.reduceat(ufunc.reduceat(values, ys[:-1][keep_y], axis=0),
+                                                      xs[:-1][keep_x], axis=1)
+        minima, maxima = reduce(np.minimum, low), reduce(np.maximum, high)
+        
+        stats = {}
+        for i, (y, row) in enumerate(zip(np.flatnonzero(keep_y), rows[keep_y])):
+            for j, (x, column) in enumerate(zip(np.flatnonzero(keep_x), columns[keep_x])):
+                count = int(counts[y, x])
+                if count > 0:
+                    mean, std = _moments(count, self.to_number(sums[y, x]), self.to_number(squares[y, x]))
+                    stats[(int(column), int(row))] = (count, mean, std, minima[i, j].item(), maxima[i, j].item())
+        return stats
+
+
+class OverlayLayer:
+    """One overlay image of the layer stack, with its placement and its own render caches
+
+    scale and offsets are in pixels of the zoomed frame, as the overlay controls keep them.
+    A layer reuses its resampled patch while size, rotation and levels are unchanged, and its
+    composited frame while the frame below it and its placement are unchanged, so editing one
+    layer does not re-render the others.
+    """
+
+    def __init__(self, image, path=None):
+        self.image = image
+        self.path = path
+        self.visible = True
+        self.opacity = 255  # The opacity slider stands in for this while the layer is active
+        self.icc_profile = get_icc_profile(image, path) if image else None
+        self.reset()
+        self.patch_cache = None  # (source overlay, size/rotation/filter/levels, region, window, RGBA patch, visible, cropped)
+        self.fade_cache = None  # (patch, opacity, patch with the opacity applied)
+        self.compose_cache = None  # (frame below, patch, params, composited frame)
+        self.run_cache = None  # (params, patches, box, RGBA stack, frame below, composited frame) of the run this layer starts
+
+    @property
+    def name(self):
+        return os.path.basename(self.path) if self.path else "Overlay"
+
+    def reset(self):
+        """Back to unscaled, centred and unrotated"""
+        self.scale = 1.0
+        self.offset_x = 0
+        self.offset_y = 0
+        self.rotation = 0.0  # Degrees counter-clockwise, set by auto-align
+
+
+def _active_layer_property(name):
+    """Property that forwards to an attribute of the app's active overlay layer"""
+    return property(lambda self: getattr(self.active_layer, name),
+                    lambda self, value: setattr(self.active_layer, name, value))
+
+
+class CompositeRenderer:
+    """Tk-free snapshot of the view that renders any part of the composite on demand
+
+    Offsets and sizes are in base image pixels, and the composite is rendered at scale
+    output pixels per base pixel (1.0 is the source resolution). render() only reads the
+    source pixels under the requested box, so large composites can be built tile by tile
+    on several threads at once.
+    
+    layers is a list of (image, scale, offset, rotation, opacity, compared) from bottom to
+    top and replaces the single overlay; compare_mode applies to the compared layers, the
+    others are blended at their opacity. base_rotation turns the base by a free angle
+    (counter-clockwise, expanded like Image.rotate), sampled per tile from the unrotated base.
+    resample is a RESAMPLE_FILTERS name, the filter for base and overlays is chosen per scale.
+    icc_profiles is (base profile, one profile per layer) to convert the images to the display
+    profile like View > Color Management; by default colours are written as stored.
+    """
+
+    def __init__(self, base, scale=1.0, base_offset=(0, 0), overlay=None, overlay_scale=1.0,
+                 overlay_offset=(0, 0), overlay_rotation=0.0, opacity=255, compare_mode="blend",
+                 split=50, levels=(None, None), gamma=1.0, grid=None, layers=None, base_rotation=0.0,
+                 resample="auto", icc_profiles=None):
+        self.base = base
+        self.resample = resample
+        base.load()  # Tiles are read from several threads, so decode now
+        self.base_rotation = base_rotation
+        self.rotation_source = None
+        if base_rotation:
+            # Rotated tiles are sampled without antialiasing, so shrink the source to about the output first
+            factor = 1
+            while scale * factor * 2 <= 1:
+                factor *= 2
+            source = base if factor == 1 else reduce_image(base, factor)
+            if source.mode in ('P', '1'):
+                source = source.convert('RGBA' if 'transparency' in base.info else 'RGB')
+            self.rotation_source = source
+        self.compare_mode = compare_mode
+        self.gamma_lut = None
+        if gamma != 1.0:
+            inverse = 1.0 / max(gamma, 0.01)
+            self.gamma_lut = [int(round(255 * (i / 255) ** inverse)) for i in range(256)]
+        # Fix the window up front, per-tile extrema would give every tile its own levels
+        self.base_levels = self.resolve_levels(base, levels)
+        
+        # Base position on the canvas, padded on both sides by the offset like the display
+        width, height = rotated_size(base.size, base_rotation)
+        self.base_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        offset_x, offset_y = int(round(base_offset[0] * scale)), int(round(base_offset[1] * scale))
+        self.size = (self.base_size[0] + 2 * abs(offset_x), self.base_size[1] + 2 * abs(offset_y))
+        self.base_origin = (abs(offset_x) + offset_x, abs(offset_y) + offset_y)
+        
+        self.grid = None
+        if grid:
+            interval, grid_x, grid_y, rotation, center_x, center_y = grid
+            self.grid = (max(1, int(round(interval * scale))), (int(grid_x * scale), int(grid_y * scale)),
+                         rotation, (center_x * scale, center_y * scale))
+        
+        if layers is None:
+            layers = [] if overlay is None else [(overlay, overlay_scale, overlay_offset, overlay_rotation, opacity, True)]
+        self.base_profile, layer_profiles = icc_profiles or (None, [None] * len(layers))
+        self.layers = [self.place_layer(layer, scale, split, levels) for layer in layers]
+        for layer, profile in zip(self.layers, layer_profiles):
+            layer['icc_profile'] = profile
+
+    def place_layer(self, layer, scale, split, levels):
+        """Size, bounding box and levels of one overlay layer on the output canvas"""
+        overlay, overlay_scale, overlay_offset, overlay_rotation, opacity, compared = layer
+        overlay.load()
+        overlay_w, overlay_h = overlay.size
+        size = (max(1, int(overlay_w * overlay_scale * scale)), max(1, int(overlay_h * overlay_scale * scale)))
+        
+        # Bounding box of the (rotated) overlay on the canvas, centred plus offset like the display
+        patch_w, patch_h = rotated_size(size, overlay_rotation)
+        left = (self.size[0] - patch_w) // 2 + int(round(overlay_offset[0] * scale))
+        top = (self.size[1] - patch_h) // 2 + int(round(overlay_offset[1] * scale))
+        
+        # Split view divides the overlap of overlay and canvas
+        overlap_left = max(0, left)
+        overlap_right = min(self.size[0], left + patch_w)
+        return {
+            'image': overlay,
+            'resample': choose_resample(size[0] / overlay_w, self.resample),
+            'levels': self.resolve_levels(overlay, levels),
+            'size': size,
+            'rotation': overlay_rotation,
+            'box': (left, top, left + patch_w, top + patch_h),
+            'opacity': opacity,
+            'compare_mode': self.compare_mode if compared else "blend",
+            'split_column': overlap_left + max(0, overlap_right - overlap_left) * split // 100,
+        }
+
+    def resolve_levels(self, image, levels):
+        """Window for a high bit-depth image, None for images that are already 8-bit"""
+        if image.mode not in HIGH_BIT_DEPTH_MODES:
+            return None
+        low, high = levels
+        if low is None or high is None:
+            low, high = image.getextrema()
+        return (low, high)
+
+    def to_display(self, image, levels, icc_profile=None):
+        """Map a rendered region to 8-bit with the levels fixed in __init__, then to the display profile"""
+        if levels is not None:
+            image = map_levels(image, levels[0], levels[1], self.gamma_lut)
+        return apply_color_transform(image, icc_profile)
+
+    def render(self, box):
+        """Render the canvas box (left, top, right, bottom) in output pixels as an RGB image"""
+        x0, y0, x1, y1 = box
+        tile = self.render_base(box)
+        
+        for layer in self.layers:
+            overlay = self.render_overlay(layer, box)
+            if not overlay:
+                continue
+            patch, position = overlay
+            patch_alpha = patch.getchannel('A')
+            opacity, compare_mode = layer['opacity'], layer['compare_mode']
+            if compare_mode == "blend":
+                tile.paste(patch.convert('RGB'), position, patch_alpha.point(lambda a: a * opacity // 255))
+            else:
+                left, top = position
+                base_region = tile.crop((left, top, left + patch.size[0], top + patch.size[1]))
+                # Checkerboard squares and the split line are anchored to the whole overlay, not the tile
+                checkerboard = None
+                if compare_mode == "checkerboard":
+                    checkerboard = checkerboard_mask(patch.size, (x0 + left - layer['box'][0],
+                                                                  y0 + top - layer['box'][1]))
+                combined = compare_patch(compare_mode, base_region, patch.convert('RGB'), opacity,
+                                         layer['split_column'] - x0 - left, checkerboard)
+                tile.paste(combined, position, patch_alpha)
+        
+        if self.grid:
+            interval, offset, rotation, center = self.grid
+            draw_grid_lines(ImageDraw.Draw(tile), tile.size, interval, offset, rotation, center,
+                            origin=(x0, y0), canvas_size=self.size)
+        return tile
+
+    def render_base(self, box):
+        """Base image under the box as RGB, white where the offset canvas is uncovered"""
+        x0, y0, x1, y1 = box
+        base_x, base_y = self.base_origin
+        base_w, base_h = self.base_size
+        left, top = max(x0, base_x), max(y0, base_y)
+        right, bottom = min(x1, base_x + base_w), min(y1, base_y + base_h)
+        if right <= left or bottom <= top:
+            return Image.new('RGB', (x1 - x0, y1 - y0), 'white')
+        
+        if self.base_rotation:
+            region = self.render_rotated_base((left - base_x, top - base_y, right - base_x, bottom - base_y))
+        else:
+            factor_x = self.base.size[0] / base_w
+            factor_y = self.base.size[1] / base_h
+            source_box = ((left - base_x) * factor_x, (top - base_y) * factor_y,
+                          (right - base_x) * factor_x, (bottom - base_y) * factor_y)
+            region = _resample_region(self.base, source_box, (right - left, bottom - top),
+                                      choose_resample(base_w / self.base.size[0], self.resample))
+        region = self.to_display(region, self.base_levels, self.base_profile)
+        if region.mode != 'RGB':
+            region = region.convert('RGB')
+        if region.size == (x1 - x0, y1 - y0):
+            return region
+        
+        tile = Image.new('RGB', (x1 - x0, y1 - y0), 'white')
+        tile.paste(region, (left - x0, top - y0))
+        return tile
+
+    def render_rotated_base(self, box):
+        """The box (in output pixels of the rotated base) sampled from the unrotated source"""
+        source = self.rotation_source
+        rotated_w, rotated_h = rotated_size(source.size, self.base_rotation)
+        factor_x, factor_y = rotated_w / self.base_size[0], rotated_h / self.base_size[1]
+        angle = math.radians(self.base_rotation)
+        cos_a, sin_a = math.cos(angle), math.sin(angle)
+        
+        # Output pixel p shows the source at R(-angle)(p * factor - rotated centre) + source centre
+        dx, dy = box[0] * factor_x - rotated_w / 2, box[1] * factor_y - rotated_h / 2
+        data = (cos_a * factor_x, -sin_a * factor_y, cos_a * dx - sin_a * dy + source.size[0] / 2,
+                sin_a * factor_x, cos_a * factor_y, sin_a * dx + cos_a * dy + source.size[1] / 2)
+        fill = 0 if source.mode in HIGH_BIT_DEPTH_MODES else 'white'
+        return source.transform((box[2] - box[0], box[3] - box[1]), Image.AFFINE, data, Image.BICUBIC, fillcolor=fill)
+
+    def render_overlay(self, layer, box):
+        """Return (RGBA patch, position in the box) for a layer's overlay under the box, or None"""
+        x0, y0, x1, y1 = box
+        overlay_left, overlay_top, overlay_right, overlay_bottom = layer['box']
+        left, top = max(x0, overlay_left), max(y0, overlay_top)
+        right, bottom = min(x1, overlay_right), min(y1, overlay_bottom)
+        if right <= left or bottom <= top:
+            return None
+        
+        region = (left - overlay_left, top - overlay_top, right - overlay_left, bottom - overlay_top)
+        patch = render_overlay_region(layer['image'], layer['size'], layer['rotation'], region,
+                                      lambda image: self.to_display(image, layer['levels'], layer['icc_profile']),
+                                      layer['resample'])
+        return patch, (left - x0, top - y0)
+
+
+class ComparePane:
+    """One image of a compare window, with its reductions and its last rendered frame
+
+    Zoom, centre and grid are given in pixels of the reference image (the app's base); an
+    image of another resolution is scaled so the same part of the scene lines up. render()
+    only reads the pixels under the pane, from the smallest reduction with enough detail.
+    Draft frames, drawn while the view is still moving, resample the nearest reduction
+    bilinearly instead, which costs a third to a quarter as much.
+    """
+
+    def __init__(self, image, path=None, reference_size=None, levels=None):
+        self.image = image
+        self.path = path
+        self.reference_size = reference_size or image.size
+        self.ratio = image.size[0] / self.reference_size[0]  # Pane image pixels per reference pixel
+        self.levels = levels  # [(factor, image)] largest first, built by prepare() unless given
+        self.window = None  # (low, high) for high bit-depth images, fixed by prepare()
+        self.frame_cache = None  # ((zoom, centre, size, draft, filter), rendered frame without the grid)
+
+    @property
+    def name(self):
+        return os.path.basename(self.path) if self.path else "Base"
+
+    def prepare(self):
+        """Decode, reduce and fix the levels window up front, so frames only resample"""
+        self.image.load()
+        if self.levels is None:
+            self.levels = [(1, self.image)]
+            if self.image.size[0] * self.image.size[1] >= PREVIEW_CACHE_MIN_PIXELS:
+                self.levels += build_preview_levels(self.image)
+        if self.image.mode in HIGH_BIT_DEPTH_MODES:
+            self.window = self.image.getextrema()
+
+    def render(self, zoom, center, size, draft=False, resample="auto"):
+        """RGB frame of size centred on center, at zoom output pixels per reference pixel
+
+        resample is a RESAMPLE_FILTERS name for full-quality frames. The last frame is
+        returned again while none of the arguments changed.
+        """
+        params = (zoom, center, size, draft, resample)
+        if self.frame_cache and self.frame_cache[0] == params:
+            return self.frame_cache[1]
+        if self.levels is None:
+            self.prepare()
+        width, height = self.image.size
+        scale = zoom / self.ratio
+        full_w, full_h = max(1, int(width * scale)), max(1, int(height * scale))
+        x0 = int(round(center[0] * zoom - size[0] / 2))
+        y0 = int(round(center[1] * zoom - size[1] / 2))
+        
+        left, top = max(0, x0), max(0, y0)
+        right, bottom = min(full_w, x0 + size[0]), min(full_h, y0 + size[1])
+        if right <= left or bottom <= top:
+            frame = Image.new('RGB', size, 'white')
+        else:
+            source = pick_level(self.levels, (full_w, full_h), 1.0 if draft else PREVIEW_LEVEL_GAP)
+            factor_x, factor_y = source.size[0] / full_w, source.size[1] / full_h
+            method = Image.BILINEAR if draft else choose_resample(1 / factor_x, resample)
+            region = _resample_region(source, (left * factor_x, top * factor_y, right * factor_x, bottom * factor_y),
+                                      (right - left, bottom - top), method)
+            if self.window:
+                region = map_levels(region, *self.window)
+            if region.mode != 'RGB':
+                region = region.convert('RGB')
+            frame = region
+            if region.size != size:
+                frame = Image.new('RGB', size, 'white')
+                frame.paste(region, (left - x0, top - y0))
+        self.frame_cache = (params, frame)
+        return frame
+
+
+def render_panes(panes, zoom, center, size, grid=None, draft=False, resample="auto"):
+    """Frames of all panes for one shared view, rendered concurrently on the thread pool
+
+    grid is (interval, offset x, offset y, rotation, centre x, centre y) in pixels of the
+    first pane's image. It falls on the same pixels of every pane, so its lines are drawn
+    once into a mask that each frame is stamped with, and moving the grid resamples nothing.
+    """
+    lines = None
+    if grid:
+        interval, grid_x, grid_y, rotation, center_x, center_y = grid
+        reference_w, reference_h = panes[0].reference_size
+        lines = Image.new('L', size, 0)
+        draw_grid_lines(ImageDraw.Draw(lines), size, max(1, int(round(interval * zoom))),
+                        (int(grid_x * zoom), int(grid_y * zoom)), rotation, (center_x * zoom, center_y * zoom),
+                        origin=(int(round(center[0] * zoom - size[0] / 2)), int(round(center[1] * zoom - size[1] / 2))),
+                        canvas_size=(int(reference_w * zoom), int(reference_h * zoom)), fill=255)
+    
+    def render(pane):
+        frame = pane.render(zoom, center, size, draft, resample)
+        if lines:
+            frame = frame.copy()
+            frame.paste('black', (0, 0), lines)
+        return frame
+    
+    if len(panes) == 1 or THREAD_POOL_SIZE == 1 or getattr(_pool_thread, 'active', False):
+        return [render(pane) for pane in panes]
+    return list(get_thread_pool().map(render, panes))
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """Adler-32 of two buffers joined together, from their separate checksums"""
+    base = 65521
+    remainder = length2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = remainder * sum1 % base
+    sum1 = (sum1 + (adler2 & 0xffff) + base - 1) % base
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + base - remainder) % base
+    return sum1 | (sum2 << 16)
+
+
+class PngStripWriter:
+    """Streams RGB strips into a PNG file
+
+    Each strip is deflated on its own and ends on a byte boundary (sync flush), so strips
+    can be encoded in parallel and their compressed data simply appended in order.
+    """
+
+    def __init__(self, path, size):
+        self.file = open(path, 'wb')
+        self.adler = 1  # Adler-32 of no data
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.write_chunk(b'IHDR', struct.pack('>IIBBBBB', size[0], size[1], 8, 2, 0, 0, 0))
+        self.write_chunk(b'IDAT', b'\x78\x9c')  # zlib header, the deflate data follows in later IDATs
+
+    def write_chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)) + kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    @staticmethod
+    def encode(strip):
+        """Filter and compress one strip; safe to call from any thread"""
+        raw = strip.tobytes()
+        stride = strip.size[0] * 3
+        rows = b''.join(b'\x00' + raw[i:i + stride] for i in range(0, len(raw), stride))
+        compressor = zlib.compressobj(EXPORT_COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+        data = compressor.compress(rows) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data, zlib.adler32(rows), len(rows)
+
+    def write(self, encoded):
+        data, adler, length = encoded
+        self.adler = _adler32_combine(self.adler, adler, length)
+        self.write_chunk(b'IDAT', data)
+
+    def close(self):
+        # An empty final deflate block ends the stream, then the checksum of all rows
+        final_block = zlib.compressobj(EXPORT_COMPRESSION_LEVEL, zlib.DEFLATED, -15).flush()
+        self.write_chunk(b'IDAT', final_block + struct.pack('>I', self.adler))
+        self.write_chunk(b'IEND', b'')
+        self.file.close()
+
+
+class TiffStripWriter:
+    """Streams RGB strips into a deflate-compressed TIFF, the directory is written at the end"""
+
+    def __init__(self, path, size, rows_per_strip):
+        self.file = open(path, 'wb')
+        self.size = size
+        self.rows_per_strip = rows_per_strip
+        self.strip_offsets = []
+        self.strip_byte_counts = []
+        self.file.write(b'II*\x00\x00\x00\x00\x00')  # The directory offset is filled in by close()
+
+    @staticmethod
+    def encode(strip):
+        """Compress one strip; safe to call from any thread"""
+        return zlib.compress(strip.tobytes(), EXPORT_COMPRESSION_LEVEL)
+
+    def write(self, data):
+        position = self.file.tell()
+        if position + len(data) >= 1 << 32:
+            raise ValueError("The composite is too large for a TIFF file, export it as PNG instead")
+        self.strip_offsets.append(position)
+        self.strip_byte_counts.append(len(data))
+        self.file.write(data)
+
+    def write_values(self, values, kind):
+        """Write an array that does not fit in a directory entry, return its offset"""
+        if self.file.tell() % 2:
+            self.file.write(b'\x00')  # TIFF offsets are word aligned
+        offset = self.file.tell()
+        self.file.write(struct.pack(f'<{len(values)}{kind}', *values))
+        return offset
+
+    def close(self):
+        short, long = 3, 4
+        strips = len(self.strip_offsets)
+        bits_offset = self.write_values([8, 8, 8], 'H')
+        offsets = self.strip_offsets[0] if strips == 1 else self.write_values(self.strip_offsets, 'I')
+        counts = self.strip_byte_counts[0] if strips == 1 else self.write_values(self.strip_byte_counts, 'I')
+        entries = [
+            (256, long, 1, self.size[0]),  # ImageWidth
+            (257, long, 1, self.size[1]),  # ImageLength
+            (258, short, 3, bits_offset),  # BitsPerSample
+            (259, short, 1, 8),  # Compression: Adobe deflate
+            (262, short, 1, 2),  # PhotometricInterpretation: RGB
+            (273, long, strips, offsets),  # StripOffsets
+            (277, short, 1, 3),  # SamplesPerPixel
+            (278, long, 1, self.rows_per_strip),  # RowsPerStrip
+            (279, long, strips, counts),  # StripByteCounts
+            (284, short, 1, 1),  # PlanarConfiguration: chunky
+        ]
+        
+        if self.file.tell() % 2:
+            self.file.write(b'\x00')
+        directory_offset = self.file.tell()
+        self.file.write(struct.pack('<H', len(entries)))
+        for tag, kind, count, value in entries:
+            if kind == short and count == 1:
+                self.file.write(struct.pack('<HHIHH', tag, kind, count, value, 0))
+            else:
+                self.file.write(struct.pack('<HHII', tag, kind, count, value))
+        self.file.write(struct.pack('<I', 0))  # No further directories
+        self.file.seek(4)
+        self.file.write(struct.pack('<I', directory_offset))
+        self.file.close()
+
+
+def write_composite(renderer, path, strip_height=EXPORT_STRIP_HEIGHT, progress=None):
+    """Render the composite in horizontal strips on the thread pool and stream them to path
+
+    The format follows the extension (.tif/.tiff or .png). At most two strips per worker are
+    in flight at any time, so peak memory depends on the strip size, not the composite size.
+    progress(done, total) is called from the calling thread after each strip is written.
+    """
+    width, height = renderer.size
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.tif', '.tiff'):
+        writer = TiffStripWriter(path, renderer.size, strip_height)
+    elif extension == '.png':
+        writer = PngStripWriter(path, renderer.size)
+    else:
+        raise ValueError(f"Cannot export to '{extension}' files, use .tif or .png")
+    
+    def render_strip(top):
+        strip = renderer.render((0, top, width, min(height, top + strip_height)))
+        return writer.encode(strip)
+    
+    pool = get_thread_pool()
+    tops = list(range(0, height, strip_height))
+    pending = deque()
+    submitted = 0
+    try:
+        for done in range(1, len(tops) + 1):
+            # Keep the workers busy, but written strips in order and memory bounded
+            while submitted < len(tops) and len(pending) < 2 * THREAD_POOL_SIZE:
+                pending.append(pool.submit(render_strip, tops[submitted]))
+                submitted += 1
+            writer.write(pending.popleft().result())
+            if progress:
+                progress(done, len(tops))
+        writer.close()
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        writer.file.close()
+        os.remove(path)
+        raise
+
+
+def profiled(method):
+    """Send calls through the window's SessionProfiler while a profiling session is running"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None:
+            return method(self, *args, **kwargs)
+        return self.profiler.call(name, method, self, *args, **kwargs)
+    return wrapper
+
+
+class SessionProfiler:
+    """cProfile and tracemalloc capture of the interactive handlers of one window
+
+    Only time spent inside @profiled handlers is profiled, so idle time between events
+    does not drown out the slow calls. stop() writes a .prof file (for pstats/snakeviz)
+    and a text report with per-handler timings and the top allocations. tracemalloc sees
+    Python allocations only; Pillow's pixel buffers come from its own allocator.
+    """
+
+    def __init__(self, output_dir=None):
+        import cProfile
+        import tracemalloc
+        self.output_dir = output_dir or tempfile.gettempdir()
+        self.profile = cProfile.Profile()
+        self.handler_stats = {}  # name -> [calls, total seconds, slowest call, largest peak in bytes]
+        self.depth = 0  # Nesting of profiled calls, e.g. composite_images inside update_zoom
+        self.started = time.time()
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+        if self.owns_tracemalloc:
+            tracemalloc.start(PROFILE_TRACEBACK_DEPTH)
+
+    def call(self, name, method, *args, **kwargs):
+        import tracemalloc
+        outermost = self.depth == 0
+        if outermost:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+            self.profile.enable()
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.depth -= 1
+            stats = self.handler_stats.setdefault(name, [0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            if outermost:
+                self.profile.disable()
+                # Peak memory is measured per event, nested handlers share their caller's figure
+                stats[3] = max(stats[3], tracemalloc.get_traced_memory()[1] - start_memory)
+
+    def stop(self):
+        """Stop capturing and write the .prof file and the report, returning both paths"""
+        import tracemalloc
+        snapshot = None
+        if tracemalloc.is_tracing():  # Another window's profiler may have stopped it already
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ])
+        if self.owns_tracemalloc and snapshot is not None:
+            tracemalloc.stop()
+        import io
+        import pstats
+        
+        name = f"imagezoomer-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}-{os.getpid()}"
+        base_path = os.path.join(self.output_dir, name)
+        self.profile.dump_stats(base_path + ".prof")
+        
+        lines = [f"Image Zoomer profile, {time.time() - self.started:.1f} s session", "",
+                 f"{'Handler':<20}{'Calls':>8}{'Total s':>10}{'Mean ms':>10}{'Max ms':>10}{'Py peak MB':>12}"]
+        for handler, (calls, total, slowest, peak) in sorted(self.handler_stats.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{handler:<20}{calls:>8}{total:>10.3f}{total * 1000 / calls:>10.1f}"
+                         f"{slowest * 1000:>10.1f}{peak / 1e6:>12.2f}")
+        
+        if self.handler_stats:  # pstats cannot read a profile without calls
+            output = io.StringIO()
+            pstats.Stats(self.profile, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+            lines += ["", "Slowest functions (cumulative):", output.getvalue()]
+        
+        if snapshot is not None:
+            lines.append(f"Top {PROFILE_TOP_ALLOCATIONS} allocations still alive at exit:")
+            for stat in snapshot.statistics('lineno')[:PROFILE_TOP_ALLOCATIONS]:
+                lines.append(f"{stat.size / 1e6:>10.2f} MB {stat.count:>8} blocks  {stat.traceback[0]}")
+        
+        with open(base_path + ".txt", 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        return base_path + ".prof", base_path + ".txt"
+
+
+def apply_image_ops(image, ops):
+    """Replay recorded flips, rotations and resizes on a source image"""
+    for op, value in ops:
+        if op == 'transpose':
+            image = image.transpose(value)
+        elif op == 'resize':
+            image = resize_image(image, tuple(value), magnify_nearest=False)
+    return image
+
+
+def renderer_from_view(base, overlay, view, scale=None, icc_profiles=None):
+    """CompositeRenderer for a view state (see ImageZoomApp.get_view_state)
+
+    Renders at the view's own zoom unless scale is given. The view keeps offsets and
+    overlay scale in pixels of the zoomed frame, so they are converted to base pixels here.
+    For views with a layer stack, overlay is a list with one image per entry of view['layers'],
+    and icc_profiles (base profile, profiles) has one profile per entry too.
+    """
+    zoom_level = view['zoom']
+    layers = None
+    if 'layers' in view:
+        layers = [(image, layer['scale'] / zoom_level, (layer['offset'][0] / zoom_level, layer['offset'][1] / zoom_level),
+                   layer['rotation'], layer['opacity'], index == view['active_layer'])
+                  for index, (image, layer) in enumerate(zip(overlay, view['layers'])) if layer['visible']]
+        if icc_profiles:
+            icc_profiles = (icc_profiles[0], [profile for profile, layer in zip(icc_profiles[1], view['layers'])
+                                              if layer['visible']])
+        overlay = None
+    grid = None
+    if view['grid_visible'] and view['grid_interval']:
+        grid = (view['grid_interval'], view['grid_offset'][0], view['grid_offset'][1], view['grid_rotation'],
+                view['grid_center'][0], view['grid_center'][1])
+    return CompositeRenderer(
+        base, zoom_level if scale is None else scale,
+        base_offset=(view['base_offset'][0] / zoom_level, view['base_offset'][1] / zoom_level),
+        overlay=overlay,
+        overlay_scale=view['overlay_scale'] / zoom_level,
+        overlay_offset=(view['overlay_offset'][0] / zoom_level, view['overlay_offset'][1] / zoom_level),
+        overlay_rotation=view['overlay_rotation'],
+        opacity=view['opacity'],
+        compare_mode=view['compare_mode'],
+        split=view['split'],
+        levels=tuple(view['levels'][:2]),
+        gamma=view['levels'][2],
+        grid=grid,
+        layers=layers,
+        base_rotation=view.get('base_rotation', 0.0),
+        resample=view.get('resample_filter', "auto"),
+        icc_profiles=icc_profiles)
+
+
+def summarize_latencies(latencies, frame_budget_ms=FRAME_BUDGET_MS):
+    """Latency statistics in milliseconds; frames that miss the budget count as dropped"""
+    if not latencies:
+        return {'frames': 0, 'dropped_frames': 0, 'frame_budget_ms': frame_budget_ms}
+    ordered = sorted(latency * 1000 for latency in latencies)
+    
+    def percentile(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+    return {
+        'frames': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 2),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'max_ms': round(ordered[-1], 2),
+        'dropped_frames': sum(1 for latency in ordered if latency > frame_budget_ms),
+        'frame_budget_ms': round(frame_budget_ms, 2),
+    }
+
+
+def read_recording(path):
+    """Return (header, events) of a recording written by EventRecorder"""
+    import json
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    return lines[0], lines[1:]
+
+
+def replay_headless(path, image_path=None, frame_budget_ms=FRAME_BUDGET_MS):
+    """Re-render every frame of a recorded session without Tk and report frame latencies
+
+    Each event that produced a frame is rendered from its recorded view state with
+    CompositeRenderer. Events wait while the previous frame is still rendering, as they
+    would in the Tk event loop, so latency is measured from the recorded input time.
+    """
+    header, events = read_recording(path)
+    image_path = image_path or header['image']
+    frames = None
+    bases = {}  # (frame index, base ops) -> transformed base image
+    overlays = {}  # path -> overlay image
+    view = header['view']
+    clock = 0.0
+    latencies = []
+    try:
+        for event in events:
+            view = event.get('view', view)
+            if not event['rendered']:
+                continue
+            
+            key = (view['frame_index'], repr(view['base_ops']))
+            if key not in bases:
+                if view['frame_index'] and frames is None:
+                    frames = FrameSequence(image_path)
+                source = frames.get_frame(view['frame_index']) if view['frame_index'] else load_image(image_path)
+                bases[key] = apply_image_ops(source, view['base_ops'])
+            paths = [layer['path'] for layer in view['layers']] if 'layers' in view else [view['overlay_path']]
+            for overlay_path in paths:
+                if overlay_path and overlay_path not in overlays:
+                    overlays[overlay_path] = load_image(overlay_path)
+            overlay = overlays.get(view['overlay_path'])
+            if 'layers' in view:
+                overlay = [overlays[overlay_path] for overlay_path in paths]
+            
+            start = time.perf_counter()
+            renderer = renderer_from_view(bases[key], overlay, view)
+            renderer.render((0, 0) + renderer.size)
+            clock = max(clock, event['t']) + time.perf_counter() - start
+            latencies.append(clock - event['t'])
+    finally:
+        if frames:
+            frames.close()
+    
+    report = summarize_latencies(latencies, frame_budget_ms)
+    report['events'] = len(events)
+    return report
+
+
+class EventRecorder:
+    """Logs every input event a window handles, with timing and the resulting view state
+
+    Two bind tags are wrapped around each widget's own tags: the first notes when Tk
+    starts dispatching an event, the last runs after the widget, class and window
+    bindings and writes one JSON line with the event, the time spent handling it,
+    whether a frame was rendered and the view state if it changed.
+    """
+
+    def __init__(self, app, path):
+        import json
+        self.json = json
+        self.app = app
+        self.file = open(path, 'w')
+        self.start = time.perf_counter()
+        self.dispatching = []  # (start time, frames rendered before) of events being handled
+        self.last_view = app.get_view_state()
+        self.pre_tag = f"RecorderStart{id(self)}"
+        self.post_tag = f"RecorderEnd{id(self)}"
+        for sequence in RECORDED_EVENTS:
+            app.root.bind_class(self.pre_tag, sequence, self.on_event_start)
+            app.root.bind_class(self.post_tag, sequence, self.on_event_end)
+        self.tag_widgets(app.root)
+        
+        canvas = app.canvas
+        self.write({'version': 1, 'image': os.path.abspath(app.current_image_path), 'root': str(app.root),
+                    'canvas': [canvas.winfo_width(), canvas.winfo_height()], 'view': self.last_view})
+
+    def tag_widgets(self, widget):
+        widget.bindtags((self.pre_tag,) + widget.bindtags() + (self.post_tag,))
+        for child in widget.winfo_children():
+            if not isinstance(child, tk.Menu):
+                self.tag_widgets(child)
+
+    def untag_widgets(self, widget):
+        widget.bindtags(tuple(tag for tag in widget.bindtags() if tag not in (self.pre_tag, self.post_tag)))
+        for child in widget.winfo_children():
+            if not isinstance(child, tk.Menu):
+                self.untag_widgets(child)
+
+    def write(self, record):
+        self.file.write(self.json.dumps(record) + "\n")
+
+    def on_event_start(self, event):
+        self.dispatching.append((time.perf_counter(), self.app.frames_rendered))
+
+    def on_event_end(self, event):
+        if not self.dispatching:
+            return
+        start, frames_before = self.dispatching.pop()
+        record = {
+            't': round(start - self.start, 4),
+            'event': getattr(event.type, 'name', str(event.type)),
+            'widget': str(event.widget),
+            'handled_ms': round((time.perf_counter() - start) * 1000, 2),
+            'rendered': self.app.frames_rendered > frames_before,
+        }
+        if record['event'] in ('KeyPress', 'KeyRelease'):
+            record.update(keysym=event.keysym, state=event.state)
+        else:
+            record.update(x=event.x, y=event.y, state=event.state, num=event.num, delta=event.delta)
+        
+        # The view is only logged when it changed, replays carry the last one forward
+        view = self.app.get_view_state()
+        if view != self.last_view:
+            record['view'] = self.last_view = view
+        self.write(record)
+
+    def stop(self):
+        self.untag_widgets(self.app.root)
+        self.file.close()
+
+
+class CompareWindow:
+    """Window tiling the base image and up to COMPARE_MAX_PANES - 1 other images side by side
+
+    Zoom and pan are shared by all panes, in base image pixels, and the grid is the app's, so
+    grid moves and rotations made in either window show in every pane. Each update renders
+    only the visible part of every pane, all panes at once on the thread pool.
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = paths
+        self.panes = None
+        self.zoom = None
+        self.center = None
+        self.grid = None
+        self.grid_interval = 100  # Last valid entry of the grid interval box
+        self.resample_filter = None
+        self.photos = []
+        self.pane_items = []
+        self.pane_size = None
+        self.drag_start = None
+        self.settle_job = None
+        self.load_result = None
+        
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"Compare - {len(paths) + 1} images")
+        self.window.geometry(f"{app.root.winfo_width()}x{app.root.winfo_height()}")
+        self.canvas = tk.Canvas(self.window, bg="gray", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=tk.YES)
+        self.canvas.create_text(10, 10, anchor=tk.NW, text="Loading...", fill="white")
+        self.canvas.bind("<Configure>", lambda event: self.render())
+        self.canvas.bind("<Button-1>", self.on_mouse_click)
+        self.canvas.bind("<B1-Motion>", self.do_drag)
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)  # Windows
+        self.canvas.bind("<Button-4>", self.on_mouse_wheel)    # Linux scroll up
+        self.canvas.bind("<Button-5>", self.on_mouse_wheel)    # Linux scroll down
+        
+        # Grid keys act on the app's grid, which every pane draws
+        for sequence, handler in (("<F6>", lambda event: self.fit()), ("<F7>", app.toggle_grid),
+                                  ("<F9>", app.reset_grid_position), ("<Up>", app.move_grid_up),
+                                  ("<Down>", app.move_grid_down), ("<Shift-Left>", app.move_grid_left),
+                                  ("<Shift-Right>", app.move_grid_right), ("<Shift-Up>", app.rotate_grid_ccw),
+                                  ("<Shift-Down>", app.rotate_grid_cw), ("<Escape>", lambda event: self.close())):
+            self.window.bind(sequence, handler)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        base_pane = self.make_base_pane()
+        
+        def load():
+            try:
+                # Decoding and reducing release the GIL, so the images are prepared concurrently
+                images = list(get_thread_pool().map(load_image, paths))
+                base = base_pane.image
+                panes = [base_pane]
+                panes += [ComparePane(image, path, base.size) for path, image in zip(paths, images)]
+                list(get_thread_pool().map(ComparePane.prepare, panes))
+                self.load_result = panes
+            except Exception as e:
+                self.load_result = e
+        
+        self.load_thread = threading.Thread(target=load, daemon=True)
+        self.load_thread.start()
+        self.finish_loading()
+
+    def make_base_pane(self):
+        """Pane for the app's current base image, reusing its preview reductions when they match"""
+        base = self.app.original_image
+        levels = None
+        if self.app.preview_levels and self.app.preview_levels[0] is base:
+            levels = [(1, base)] + [level for level in self.app.preview_levels[1] if float(level[0]).is_integer()]
+        return ComparePane(base, None, base.size, levels)
+
+    def update_base(self):
+        """Swap in a new base pane after the app's base image changed (reload, frame, preset)
+
+        The other panes are rescaled to the new base size; the view is refitted if the size changed.
+        """
+        old_size = self.panes[0].image.size
+        base_pane = self.make_base_pane()
+        base_pane.prepare()
+        self.panes[0] = base_pane
+        for pane in self.panes[1:]:
+            pane.reference_size = base_pane.image.size
+            pane.ratio = pane.image.size[0] / pane.reference_size[0]
+            pane.frame_cache = None
+        if base_pane.image.size != old_size:
+            self.fit()
+        else:
+            self.render()
+
+    def finish_loading(self):
+        """Poll the background decode, then fit the base into a pane and render"""
+        from tkinter import messagebox
+        if not self.window.winfo_exists():
+            return  # Closed while loading
+        if self.load_thread.is_alive():
+            self.window.after(DECODE_POLL_MS, self.finish_loading)
+            return
+        if isinstance(self.load_result, Exception):
+            messagebox.showerror("Compare", f"Error opening images:\n{str(self.load_result)}", parent=self.window)
+            self.close()
+            return
+        self.panes = self.load_result
+        self.load_result = None
+        self.canvas.delete(tk.ALL)
+        self.fit()
+
+    def get_layout(self):
+        """(columns, rows, pane size) filling the canvas, close to square"""
+        count = len(self.panes)
+        columns = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+        width = max(1, (self.canvas.winfo_width() - COMPARE_PANE_GAP * (columns - 1)) // columns)
+        height = max(1, (self.canvas.winfo_height() - COMPARE_PANE_GAP * (rows - 1)) // rows)
+        return columns, rows, (width, height)
+
+    def get_grid(self):
+        """The app's grid in base pixels, None while it is hidden"""
+        app = self.app
+        if not app.grid_visible:
+            return None
+        try:
+            interval = int(app.grid_interval_var.get())
+        except ValueError:
+            interval = 0
+        if interval >= 1:
+            self.grid_interval = interval
+        return (self.grid_interval, app.grid_offset_x, app.grid_offset_y, app.grid_rotation,
+                app.grid_rotation_center_x, app.grid_rotation_center_y)
+
+    def fit(self):
+        """Whole base image in one pane (F6)"""
+        if not self.panes:
+            return
+        width, height = self.panes[0].image.size
+        pane_w, pane_h = self.get_layout()[2]
+        self.zoom = min(pane_w / width, pane_h / height)
+        self.center = (width / 2, height / 2)
+        self.render()
+
+    def refresh(self):
+        """Called after every app frame; re-renders only if the base, the shared grid or the filter changed"""
+        if not self.panes:
+            return
+        if self.app.original_image is not None and self.app.original_image is not self.panes[0].image:
+            self.update_base()
+        elif (self.get_grid(), self.app.resample_filter) != (self.grid, self.resample_filter):
+            self.render()
+
+    def render(self, draft=False):
+        """Render the visible part of every pane concurrently and put them on the canvas
+
+        Draft frames are followed by a full-quality one once no zoom or pan step has come for
+        COMPARE_SETTLE_MS.
+        """
+        if not self.panes or self.zoom is None:
+            return
+        if self.settle_job:
+            self.window.after_cancel(self.settle_job)
+            self.settle_job = None
+        if draft:
+            self.settle_job = self.window.after(COMPARE_SETTLE_MS, self.render)
+        start = time.perf_counter()
+        columns, rows, size = self.get_layout()
+        self.grid = self.get_grid()
+        self.resample_filter = self.app.resample_filter
+        frames = render_panes(self.panes, self.zoom, self.center, size, self.grid, draft, self.resample_filter)
+        
+        self.photos = [ImageTk.PhotoImage(frame) for frame in frames]
+        if len(self.pane_items) != len(frames) or self.pane_size != size:
+            self.canvas.delete(tk.ALL)
+            self.pane_items = []
+            for index, pane in enumerate(self.panes):
+                x = (index % columns) * (size[0] + COMPARE_PANE_GAP)
+                y = (index // columns) * (size[1] + COMPARE_PANE_GAP)
+                item = self.canvas.create_image(x, y, anchor=tk.NW)
+                self.canvas.create_text(x + 6, y + 4, anchor=tk.NW, text=pane.name, fill="red")
+                self.pane_items.append(item)
+            self.pane_size = size
+        for item, photo in zip(self.pane_items, self.photos):
+            self.canvas.itemconfig(item, image=photo)
+        
+        elapsed = (time.perf_counter() - start) * 1000
+        self.window.title(f"Compare - {len(self.panes)} images - {int(self.zoom * 100)}% - {elapsed:.0f} ms")
+
+    def get_pane_point(self, x, y):
+        """Base pixel under a canvas point, taken within the pane it falls on"""
+        columns, rows, size = self.get_layout()
+        pane_x = x % (size[0] + COMPARE_PANE_GAP)
+        pane_y = y % (size[1] + COMPARE_PANE_GAP)
+        return (self.center[0] + (pane_x - size[0] / 2) / self.zoom,
+                self.center[1] + (pane_y - size[1] / 2) / self.zoom)
+
+    def on_mouse_click(self, event):
+        self.window.focus_set()
+        self.drag_start = (event.x, event.y)
+
+    def do_drag(self, event):
+        """Pan all panes together"""
+        if not self.panes or not self.drag_start:
+            return
+        dx, dy = event.x - self.drag_start[0], event.y - self.drag_start[1]
+        self.drag_start = (event.x, event.y)
+        self.center = (self.center[0] - dx / self.zoom, self.center[1] - dy / self.zoom)
+        self.render(draft=True)
+
+    def on_mouse_wheel(self, event):
+        """Zoom all panes, keeping the point under the cursor in place"""
+        if not self.panes:
+            return
+        if platform.system() == "Windows":
+            direction = event.delta
+        else:
+            direction = 1 if event.num == 4 else -1
+        point = self.get_pane_point(event.x, event.y)
+        ratio = COMPARE_ZOOM_STEP if direction > 0 else 1 / COMPARE_ZOOM_STEP
+        if not 1 / 64 <= self.zoom * ratio <= 32:
+            return
+        self.center = (point[0] + (self.center[0] - point[0]) / ratio, point[1] + (self.center[1] - point[1]) / ratio)
+        self.zoom *= ratio
+        self.render(draft=True)
+
+    def close(self):
+        if self.settle_job:
+            self.window.after_cancel(self.settle_job)
+        if self.app.compare_window is self:
+            self.app.compare_window = None
+        self.window.destroy()
+
 
 class ImageZoomApp:
-    def __init__(self, root, image_path):
+    # The overlay controls (drag, resize, auto-align, compare) act on the active layer of the stack
+    overlay_image = _active_layer_property('image')
+    original_overlay_image = overlay_image
+    overlay_path = _active_layer_property('path')
+    overlay_scale = _active_layer_property('scale')
+    overlay_offset_x = _active_layer_property('offset_x')
+    overlay_offset_y = _active_layer_property('offset_y')
+    overlay_rotation = _active_layer_property('rotation')
+
+    def __init__(self, root, image_path, workspace=None):
         self.root = root
-        self.original_image = Image.open(image_path)
-        self.overlay_image = None  # Second layer image
-        self.original_overlay_image = None  # Keep original for aspect ratio
-        self.overlay_scale = 1.0  # Scale factor for overlay
-        self.overlay_offset_x = 0  # Overlay position offset
-        self.overlay_offset_y = 0
+        self.workspace = workspace  # read_workspace() result restored instead of the image's settings
+        self.startup_timings = {'import': _IMPORT_DONE - _STARTUP_T0}
+        self.startup_complete = False  # Set once the full image is decoded and settings applied
+        self.on_startup_complete = None  # Optional callback receiving startup_timings
+        self.profiler = None  # SessionProfiler while profiling is on
+        self.recorder = None  # EventRecorder while input events are being recorded
+        self.compare_window = None  # CompareWindow tiling other images next to this one
+        self.stats_enabled = False  # Show statistics of the grid cell under the pointer, see set_region_stats()
+        self.stats_tables = {}  # 'Base'/'Overlay' -> (image, (scale, rotation, grid rotation), RegionStats)
+        self.stats_job = None
+        self.stats_thread = None
+        self.stats_result = None
+        self.stats_pointer = None  # Pointer in base pixels of the frame (frame pixels / zoom)
+        self.stats_box = None  # [start, end] of a Shift-dragged box along the grid axes
+        self.loupe_enabled = False  # Show the source under the pointer magnified in a lens, see set_loupe()
+        self.loupe_magnification = 4  # Lens pixels per source pixel, whatever the zoom
+        self.loupe_pointer = None  # Last pointer event over the canvas, the lens is centred on it
+        self.loupe_renderer = None  # (images, (magnification, colour managed, view), CompositeRenderer, grid)
+        self.loupe_imgtk = None
+        self.watch_mode = False  # Reload the base image when its file changes, see set_watch_mode()
+        self.watch_job = None
+        self.watch_stat = None  # (path, mtime, size) of the version shown
+        self.watch_pending = None  # Changed (path, mtime, size) waiting one poll for the writer to finish
+        self.watch_digest = None  # file_digest() of the version shown
+        self.watch_thread = None
+        self.watch_result = None
+        self.frames_rendered = 0  # Counts update_zoom renders, used to tell which events drew a frame
+        self.render_suspended = False  # Set while apply_commands() runs a batch, which renders once at the end
+        profile_dir = os.environ.get(PROFILE_ENV_VAR)
+        if profile_dir:
+            self.start_profiling(profile_dir if os.path.isdir(profile_dir) else None)
+        self.current_zoom = None  # Zoom of the last rendered frame
+        self.displayed_frame = None  # Last fully rendered frame, reused as the preview while resizing
+        self.fit_mode = False  # Keep fitting the image to the window as it is resized (F6)
+        self.canvas_size = None  # Canvas size the current frame was placed for
+        self.resize_job = None  # Pending debounced re-render after a resize
+        self.layers = []  # Overlay layers from bottom to top, see OverlayLayer
+        self.active_layer = OverlayLayer(None)  # Layer the overlay controls act on, an empty stand-in without layers
+        self.align_thread = None  # Worker thread running auto-align
+        self.align_result = None
+        self.align_layer = None  # Layer being auto-aligned
+        self.export_thread = None  # Worker thread writing an exported composite
+        self.export_progress = (0, 0)
+        self.export_result = None
+        self.compare_mode = "blend"  # How the overlay is combined with the base, see COMPARE_MODES
+        self.resample_filter = "auto"  # Filter for zoomed frames and overlays, see RESAMPLE_FILTERS
+        self._offset_base_cache = None  # (base frame, base offset, padded frame)
+        self._checkerboard_cache = None  # (size, phase, mask)
         self.base_offset_x = 0  # Base image position offset
         self.base_offset_y = 0
         self.edit_overlay_mode = False  # Combined overlay edit mode
         self.move_base_mode = False  # Toggle for moving base layer
         self.dragging_what = None  # What is being dragged: None, "overlay", "base"
+        self.drag_serial = 0  # Counts drags, so the steps of one drag merge into a single undo entry
         self.drag_start_x = 0
         self.drag_start_y = 0
         self.grid_interval_var = tk.StringVar()
@@ -30,13 +2622,51 @@ class ImageZoomApp:
         self.grid_visible = True  # Grid visibility toggle
         self.last_directory = os.path.dirname(image_path)  # Remember last directory
         
-        # Initialize image variables early
-        self.true_original_image = Image.open(image_path).copy()  # This will always store the true original image.
-        self.original_image = self.true_original_image.copy()
+        # Only the header is read here; the full decode happens in finish_startup after the first paint
+        self.true_original_image = Image.open(image_path)  # This will always store the true original image.
+        self.original_image = self.true_original_image
+        self.base_ops = []  # Transforms applied to the base, replayed when the source frame changes
+        self.base_rotation = 0.0  # Free rotation in degrees counter-clockwise, applied to the frame after base_ops
+        self.rotation_job = None  # Pending full-quality render once the angle stops changing
+        self._rotation_cache = None  # (base, angle, {reduction factor: rotated level})
+        self._reduction_cache = None  # (base, {reduction factor: reduced base})
+        
+        # Multi-frame (TIFF pages, animated GIF/WebP) state
+        self.frames = None
+        self.frame_index = 0
+        self.animation_job = None
+        
         # Initialize rotation center to image center
         self.grid_rotation_center_x = self.original_image.size[0] // 2
         self.grid_rotation_center_y = self.original_image.size[1] // 2
         
+        # Window/level state for high bit-depth images (16-bit / float TIFF)
+        self.levels_min = None
+        self.levels_max = None
+        self.levels_gamma = 1.0
+        self._levels_histogram = None  # (source image, extrema, histogram)
+        self._levels_gamma_lut = None  # (gamma, 256-entry table)
+        self._zoom_cache = None  # (source image, (size, rotation, draft, filter), resized frame)
+        self._levels_frame_cache = None  # (high bit-depth frame, levels, 8-bit frame)
+        
+        # Embedded ICC profile of the base, applied to displayed frames only (View > Color Management)
+        self.color_managed = True
+        self.base_icc_profile = None
+        self._color_frame_cache = None  # (frame, (enabled, profile), frame in display colours)
+        self.levels_window = None
+        
+        # Reductions of large images kept on disk between sessions, see PreviewCache
+        self.preview_cache = PreviewCache()
+        self.preview_levels = None  # (source image, [(factor, reduced image)]) checked against the decoded image
+        self.decode_thread = None  # Worker thread decoding the full image during startup
+        self.decode_result = None
+        self.overlay_decodes = []  # (path, future) of workspace overlays decoded on the pool alongside
+        
+        # Undo/redo history as parameter deltas, see record_edit()
+        self.undo_stack = deque(maxlen=UNDO_HISTORY_SIZE)
+        self.redo_stack = []
+        self.edit_state = None  # Undoable parameters as of the last recorded edit
+
         # Initialize image size variable
         self.image_size_var = tk.StringVar()
         self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")  # Default image size
@@ -44,9 +2674,6 @@ class ImageZoomApp:
         # Dropdown for predefined sizes
         self.size_options = ["Custom", "7x7 inches (72 dpi)", "Original Size"]
         
-        # Create menu bar
-        self.create_menu()
-        
         # Grid positioning variables
         self.grid_offset_x = 0
         self.grid_offset_y = 0
@@ -63,9 +2690,14 @@ class ImageZoomApp:
         self.canvas.bind("<Button-1>", self.on_mouse_click)
         self.canvas.bind("<B1-Motion>", self.do_drag)
         self.canvas.bind("<ButtonRelease-1>", self.end_drag)
+        self.canvas.bind("<Shift-Button-1>", self.start_stats_box)
+        self.canvas.bind("<Shift-B1-Motion>", self.drag_stats_box)
+        self.canvas.bind("<Motion>", self.on_pointer_motion)
+        self.canvas.bind("<Leave>", self.hide_loupe)
         self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)  # Windows
         self.canvas.bind("<Button-4>", self.on_mouse_wheel)    # Linux scroll up
         self.canvas.bind("<Button-5>", self.on_mouse_wheel)    # Linux scroll down
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
 
         # Keyboard bindings for zoom control
         self.root.bind("<Left>", self.zoom_out_keyboard)
@@ -76,6 +2708,10 @@ class ImageZoomApp:
         self.root.bind("<F2>", self.flip_vertical)
         self.root.bind("<F3>", self.rotate_clockwise)
         self.root.bind("<F4>", self.rotate_counterclockwise)
+        self.root.bind("<Control-Right>", lambda event: self.set_base_rotation(self.base_rotation - ROTATE_STEP))
+        self.root.bind("<Control-Left>", lambda event: self.set_base_rotation(self.base_rotation + ROTATE_STEP))
+        self.root.bind("<Control-Shift-Right>", lambda event: self.set_base_rotation(self.base_rotation - ROTATE_FINE_STEP))
+        self.root.bind("<Control-Shift-Left>", lambda event: self.set_base_rotation(self.base_rotation + ROTATE_FINE_STEP))
         self.root.bind("<F5>", self.reset_image)
         self.root.bind("<F6>", self.fit_to_window)
         self.root.bind("<F7>", self.toggle_grid)
@@ -83,6 +2719,17 @@ class ImageZoomApp:
         self.root.bind("<F9>", self.reset_grid_position)
         self.root.bind("<o>", self.toggle_edit_overlay_mode)  # Combined overlay edit mode
         self.root.bind("<b>", self.toggle_move_base_mode)  # 'b' for base move
+        self.root.bind("<c>", self.cycle_compare_mode)  # 'c' for compare mode
+        self.root.bind("<l>", lambda event: self.cycle_layer(1))  # 'l' for the next overlay layer
+        self.root.bind("<L>", lambda event: self.cycle_layer(-1))
+        self.root.bind("<h>", lambda event: self.toggle_layer_visibility())  # 'h' to hide/show the active layer
+        self.root.bind("<m>", lambda event: self.set_loupe(not self.loupe_enabled))  # 'm' for the magnifier
+        self.root.bind("<M>", lambda event: self.cycle_loupe_magnification())
+        
+        # Keyboard bindings for multi-frame images
+        self.root.bind("<Next>", self.next_frame)  # Page Down
+        self.root.bind("<Prior>", self.previous_frame)  # Page Up
+        self.root.bind("<space>", self.toggle_animation)
         
         # Keyboard bindings for save
         self.root.bind("<Control-s>", lambda e: self.save_settings())
@@ -102,7 +2749,12 @@ class ImageZoomApp:
         self.root.bind("<Shift-Up>", self.rotate_grid_ccw)
         self.root.bind("<Shift-Down>", self.rotate_grid_cw)
         
-        self.root.bind("<Escape>", lambda event: self.root.quit())
+        self.root.bind("<Escape>", lambda event: self.close_window())
+        
+        # Input is swallowed while the window is busy, see set_busy()
+        for sequence in ("<Key>", "<Button>", "<ButtonRelease>", "<Motion>", "<MouseWheel>"):
+            self.root.bind_class(BUSY_BINDTAG, sequence, lambda event: "break")
+        self.root.protocol("WM_DELETE_WINDOW", self.close_window)  # Window manager close runs the same cleanup
         
         self.root.focus_set()  # Ensure window can receive keyboard events
 
@@ -115,7 +2767,7 @@ class ImageZoomApp:
         zoom_frame.pack(side=tk.LEFT, padx=10)
         
         tk.Label(zoom_frame, text="Zoom:", font=("Arial", 8)).pack(side=tk.TOP)
-        self.slider = tk.Scale(zoom_frame, from_=0.25, to_=3, orient=tk.HORIZONTAL, resolution=0.006, command=self.update_zoom, length=200)
+        self.slider = tk.Scale(zoom_frame, from_=0.25, to_=3, orient=tk.HORIZONTAL, resolution=0.006, command=self.on_slider_change, length=200)
         self.slider.set(1)  # Set default value to 1 (no zoom)
         self.slider.pack(side=tk.TOP)
         
@@ -144,6 +2796,16 @@ class ImageZoomApp:
         self.transparency_slider.set(255)  # Fully opaque by default
         self.transparency_slider.pack(side=tk.TOP)
 
+        # Split position for the split-view compare mode
+        split_frame = tk.Frame(self.control_frame)
+        split_frame.pack(side=tk.LEFT, padx=10)
+        
+        tk.Label(split_frame, text="Split:", font=("Arial", 8)).pack(side=tk.TOP)
+        self.split_slider = tk.Scale(split_frame, from_=0, to_=100, orient=tk.HORIZONTAL,
+                                     command=self.update_transparency, length=100)
+        self.split_slider.set(50)
+        self.split_slider.pack(side=tk.TOP)
+
         # Image size control
         size_frame = tk.Frame(self.control_frame)
         size_frame.pack(side=tk.LEFT, padx=10)
@@ -153,15 +2815,11 @@ class ImageZoomApp:
         self.image_size_entry.pack(side=tk.TOP)
         self.image_size_entry.bind("<Return>", self.set_image_size)
 
-        # Size preset dropdown
-        preset_frame = tk.Frame(self.control_frame)
-        preset_frame.pack(side=tk.LEFT, padx=10)
+        # Size preset dropdown (the ttk combobox itself is created in finish_startup)
+        self.preset_frame = tk.Frame(self.control_frame)
+        self.preset_frame.pack(side=tk.LEFT, padx=10)
         
-        tk.Label(preset_frame, text="Presets:", font=("Arial", 8)).pack(side=tk.TOP)
-        self.size_combobox = ttk.Combobox(preset_frame, values=self.size_options, state="readonly", width=12)
-        self.size_combobox.set(self.size_options[0])  # set default value to "Custom"
-        self.size_combobox.pack(side=tk.TOP)
-        self.size_combobox.bind("<<ComboboxSelected>>", self.on_size_combobox_change)
+        tk.Label(self.preset_frame, text="Presets:", font=("Arial", 8)).pack(side=tk.TOP)
 
         # Status bar at bottom
         self.status_frame = tk.Frame(root)
@@ -180,23 +2838,204 @@ class ImageZoomApp:
         
         self.move_base_label = tk.Label(self.status_frame, text="Move Base: OFF", font=("Arial", 8), fg="red", relief=tk.SUNKEN, anchor="w")
         self.move_base_label.pack(side=tk.LEFT, padx=2)
+        
+        self.frame_label = tk.Label(self.status_frame, text="Frame: 1/1", font=("Arial", 8), relief=tk.SUNKEN, anchor="w")
+        self.frame_label.pack(side=tk.LEFT, padx=2)
+        
+        self.compare_label = tk.Label(self.status_frame, text="Compare: Blend", font=("Arial", 8), relief=tk.SUNKEN, anchor="w")
+        self.compare_label.pack(side=tk.LEFT, padx=2)
+        
+        # Statistics of the grid cell under the pointer (or the Shift-dragged box), empty while off
+        self.stats_label = tk.Label(self.status_frame, text="", font=("Arial", 8), anchor="w")
+        self.stats_label.pack(side=tk.LEFT, padx=2)
+        
+        # Progress of background jobs such as exports, empty while idle
+        self.task_label = tk.Label(self.status_frame, text="", font=("Arial", 8), anchor="e")
+        self.task_label.pack(side=tk.RIGHT, padx=2)
+        self.update_frame_display()
+
+        # Initial display: a cheap preview first, everything else once it is on screen
+        self.show_startup_preview(image_path)
+        self.root.after_idle(lambda: self.finish_startup(image_path))
 
-        # Initial display
+    def show_startup_preview(self, image_path, fingerprint=None):
+        """Paint a fast, reduced-resolution preview of the image fitted to the window
+
+        fingerprint, when known (from a workspace), saves reading the file to find its cache entry.
+        """
         self.root.update()
-        self.update_zoom(1)
+        canvas_width = max(self.canvas.winfo_width(), 1)
+        canvas_height = max(self.canvas.winfo_height(), 1)
+        
+        try:
+            # Reductions cached by an earlier session map in milliseconds, whatever the format
+            if self.preview_cache.enabled:
+                cached = self.preview_cache.load(fingerprint or file_fingerprint(image_path))
+            else:
+                cached = None
+            if cached:
+                (width, height), levels = cached
+                scale = min(canvas_width / width, canvas_height / height, 1)
+                size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                preview = pick_level(levels, size)
+            else:
+                preview = Image.open(image_path)
+                # JPEG can decode straight at a reduced scale; other formats need the full decode
+                if preview.draft(preview.mode, (canvas_width, canvas_height)) is None:
+                    preview = load_image(image_path)
+                
+                scale = min(canvas_width / preview.size[0], canvas_height / preview.size[1], 1)
+                size = (max(1, int(preview.size[0] * scale)), max(1, int(preview.size[1] * scale)))
+            if self.is_high_bit_depth(preview):
+                preview = self.apply_levels(preview.resize(size, Image.NEAREST))
+            else:
+                preview = preview.resize(size, Image.BILINEAR, reducing_gap=2.0)
+            if preview.mode == "RGBX":
+                preview = preview.convert("RGB")  # Mapped RGB pixels are padded to RGBX
+            
+            self.imgtk = ImageTk.PhotoImage(preview)
+            self.canvas.create_image(canvas_width // 2, canvas_height // 2, anchor=tk.CENTER, image=self.imgtk)
+            self.root.update_idletasks()
+        except Exception as e:
+            print(f"Error showing preview: {e}")
+        
+        self.startup_timings['first_paint'] = time.perf_counter() - _STARTUP_T0
+
+    def finish_startup(self, image_path):
+        """Deferred startup: menus, then the full decode in the background with the preview kept up"""
+        from tkinter import ttk
+        
+        self.create_menu()
+        
+        self.size_combobox = ttk.Combobox(self.preset_frame, values=self.size_options, state="readonly", width=12)
+        self.size_combobox.set(self.size_options[0])  # set default value to "Custom"
+        self.size_combobox.pack(side=tk.TOP)
+        self.size_combobox.bind("<<ComboboxSelected>>", self.on_size_combobox_change)
+        
+        self.start_decode(image_path, self.workspace)
+        self.complete_startup(image_path)
 
-        # img settings recall
-        self.current_image_path = image_path  # Store current image path
-        # Load settings after UI setup
-        self.root.after(100, lambda: self.load_settings(image_path))
+    def start_decode(self, image_path, workspace=None):
+        """Decode the base on a worker thread, and a workspace's overlays on the pool at the same time
+
+        Input is ignored until is_decoding() turns false.
+        """
+        def decode():
+            try:
+                self.decode_result = load_image(image_path)
+            except Exception as e:
+                self.decode_result = e
+        
+        self.set_busy(True)
+        self.decode_thread = threading.Thread(target=decode, daemon=True)
+        self.decode_thread.start()
+        paths = [layer['path'] for layer in workspace['view'].get('layers', [])] if workspace else []
+        self.overlay_decodes = [(path, get_thread_pool().submit(load_image, path)) for path in paths]
+
+    def is_decoding(self):
+        return self.decode_thread.is_alive() or not all(future.done() for _, future in self.overlay_decodes)
+
+    def take_overlay_decodes(self):
+        """Layers for the overlays decoded by start_decode(), skipping files that failed"""
+        layers = []
+        for path, future in self.overlay_decodes:
+            try:
+                layers.append(OverlayLayer(future.result(), path))
+            except Exception as e:
+                print(f"Skipping overlay layer {path}: {e}")
+        self.overlay_decodes = []
+        return layers
+
+    def complete_startup(self, image_path):
+        """Poll the startup decode; once done apply saved settings and render one full-quality frame"""
+        if self.is_decoding():
+            self.root.after(DECODE_POLL_MS, lambda: self.complete_startup(image_path))
+            return
+        self.set_busy(False)
+        if isinstance(self.decode_result, Exception):
+            # Nothing was shown before the preview to fall back to, so the window goes
+            from tkinter import messagebox
+            self.take_overlay_decodes()
+            messagebox.showerror("Error", f"Could not open image:\n{str(self.decode_result)}")
+            self.decode_result = None
+            self.close_window()
+            return
+        
+        self.set_base_image(self.decode_result, image_path)
+        self.decode_result = None
+        self.startup_complete = True
+        # Apply saved settings (or the workspace) before rendering so the full-quality frame is drawn only once
+        if self.workspace:
+            self.apply_workspace(self.workspace, render=False)
+        else:
+            self.load_settings(image_path, render=False)
+        self.update_zoom(self.slider.get())
+        self.reset_history()
+        
+        self.startup_timings['first_full_frame'] = time.perf_counter() - _STARTUP_T0
+        self.update_preview_cache(image_path, self.workspace and self.workspace['base'].get('fingerprint'))
+        if self.on_startup_complete:
+            self.on_startup_complete(self.startup_timings)
+
+    def set_busy(self, busy):
+        """Ignore key and mouse input (and the menus) while the image is not ready yet"""
+        self.canvas.config(cursor="watch" if busy else "")
+        widgets = [self.root]
+        while widgets:
+            widget = widgets.pop()
+            tags = tuple(tag for tag in widget.bindtags() if tag != BUSY_BINDTAG)
+            widget.bindtags(((BUSY_BINDTAG,) if busy else ()) + tags)
+            widgets.extend(child for child in widget.winfo_children() if not isinstance(child, tk.Menu))
+        if self.root['menu']:
+            menubar = self.root.nametowidget(self.root['menu'])
+            for index in range(menubar.index(tk.END) + 1):
+                menubar.entryconfig(index, state=tk.DISABLED if busy else tk.NORMAL)
+
+    def set_base_image(self, image, image_path):
+        """Show a newly decoded base image unedited, with its own levels, colour profile and frames"""
+        # Images are never modified in place, so the decoded original can be shared
+        self.true_original_image = image
+        self.original_image = image
+        self.base_ops = []
+        self.base_rotation = 0.0
+        self.init_levels()
+        self.base_icc_profile = get_icc_profile(image, image_path)
+        self.load_frames(image_path)
+        self.update_frame_display()
+        self.current_image_path = image_path
+        self.last_directory = os.path.dirname(image_path)
+
+    def update_preview_cache(self, image_path, fingerprint=None):
+        """Check the cached reductions of a large base image against it, or build them, in the background"""
+        self.preview_levels = None
+        image = self.true_original_image
+        if not self.preview_cache.enabled or image.size[0] * image.size[1] < PREVIEW_CACHE_MIN_PIXELS:
+            return
+        screen_size = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+        
+        def update():
+            try:
+                levels = self.preview_cache.update(fingerprint or file_fingerprint(image_path), image, screen_size)
+                self.preview_levels = (image, levels)
+            except Exception as e:
+                print(f"Error updating preview cache: {e}")
+        
+        get_thread_pool().submit(update)
+
+    def check_startup_budget(self, budget=None):
+        """Return the startup phases that exceeded the budget as {phase: (measured, allowed)}"""
+        budget = budget or STARTUP_BUDGET
+        return {phase: (self.startup_timings[phase], allowed)
+                for phase, allowed in budget.items()
+                if self.startup_timings.get(phase, float('inf')) > allowed}
 
-    
     def get_settings_filename(self, image_path):
         """Generate a settings filename based on the image path"""
         return image_path + ".settings.json"
 
     def save_settings(self, image_path=None):
         """Save current settings to a JSON file"""
+        import json
         if not image_path:
             image_path = getattr(self, 'current_image_path', None)
             if not image_path:
@@ -213,19 +3052,37 @@ class ImageZoomApp:
             'grid_visible': self.grid_visible,
             'base_offset_x': self.base_offset_x,
             'base_offset_y': self.base_offset_y,
+            'base_rotation': self.base_rotation,
+            'resample_filter': self.resample_filter,
             'image_size': [self.original_image.size[0], self.original_image.size[1]],
             'size_preset': self.size_combobox.get()
         }
         
+        # Save display window for high bit-depth images
+        if self.is_high_bit_depth(self.true_original_image):
+            settings['levels'] = {
+                'min': self.levels_min,
+                'max': self.levels_max,
+                'gamma': self.levels_gamma
+            }
+        
         # Save overlay settings if present
         if self.overlay_image:
             settings['overlay'] = {
                 'scale': self.overlay_scale,
                 'offset_x': self.overlay_offset_x,
                 'offset_y': self.overlay_offset_y,
-                'transparency': int(self.transparency_slider.get())
+                'rotation': self.overlay_rotation,
+                'transparency': int(self.transparency_slider.get()),
+                'compare_mode': self.compare_mode,
+                'split': int(self.split_slider.get())
             }
         
+        # Save the overlay layer stack, bottom to top
+        if self.layers:
+            settings['layers'] = [self.get_layer_state(layer) for layer in self.layers]
+            settings['active_layer'] = self.layers.index(self.active_layer) if self.active_layer in self.layers else None
+        
         try:
             settings_file = self.get_settings_filename(image_path)
             with open(settings_file, 'w') as f:
@@ -234,8 +3091,9 @@ class ImageZoomApp:
         except Exception as e:
             print(f"Error saving settings: {e}")
 
-    def load_settings(self, image_path):
+    def load_settings(self, image_path, render=True):
         """Load settings from JSON file if it exists"""
+        import json
         settings_file = self.get_settings_filename(image_path)
         
         if not os.path.exists(settings_file):
@@ -267,13 +3125,28 @@ class ImageZoomApp:
                 self.base_offset_x = settings['base_offset_x']
             if 'base_offset_y' in settings:
                 self.base_offset_y = settings['base_offset_y']
+            if 'base_rotation' in settings:
+                self.base_rotation = settings['base_rotation']
+            if 'resample_filter' in settings:
+                self.set_resample_filter(settings['resample_filter'], render=False)
             if 'size_preset' in settings:
                 self.size_combobox.set(settings['size_preset'])
             if 'image_size' in settings:
                 width, height = settings['image_size']
                 self.image_size_var.set(f"{width}x{height}")
                 if settings['size_preset'] != "Original Size":
-                    self.original_image = self.original_image.resize((width, height), Image.BICUBIC)
+                    self.original_image = resize_image(self.original_image, (width, height), magnify_nearest=False)
+                    self.base_ops.append(('resize', (width, height)))
+            if 'levels' in settings and self.is_high_bit_depth(self.true_original_image):
+                levels = settings['levels']
+                self.levels_min = levels.get('min', self.levels_min)
+                self.levels_max = levels.get('max', self.levels_max)
+                self.levels_gamma = levels.get('gamma', 1.0)
+                self.sync_levels_dialog()
+            
+            # Restore the overlay layers, reloading their images
+            if 'layers' in settings:
+                self.set_layer_states(settings['layers'], settings.get('active_layer'))
             
             # Restore overlay settings (overlay would need to be loaded separately)
             if 'overlay' in settings and self.overlay_image:
@@ -281,11 +3154,15 @@ class ImageZoomApp:
                 self.overlay_scale = overlay_settings.get('scale', 1.0)
                 self.overlay_offset_x = overlay_settings.get('offset_x', 0)
                 self.overlay_offset_y = overlay_settings.get('offset_y', 0)
+                self.overlay_rotation = overlay_settings.get('rotation', 0.0)
                 self.transparency_slider.set(overlay_settings.get('transparency', 255))
+                self.split_slider.set(overlay_settings.get('split', 50))
+                self.set_compare_mode(overlay_settings.get('compare_mode', "blend"), render=False)
             
             # Update displays
             self.update_grid_position_display()
-            self.update_zoom(self.slider.get())
+            if render:
+                self.update_zoom(self.slider.get())
             
             print(f"Settings loaded from {settings_file}")
             return True
@@ -321,21 +3198,55 @@ class ImageZoomApp:
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Open Base Image...", command=self.open_new_image, accelerator="Ctrl+O")
         file_menu.add_command(label="Load Overlay Image...", command=self.load_overlay_image, accelerator="Ctrl+L")
+        file_menu.add_command(label="Export Composite...", command=self.export_composite, accelerator="Ctrl+E")
+        self.watch_var = tk.BooleanVar(value=self.watch_mode)
+        file_menu.add_checkbutton(label="Watch for Changes", variable=self.watch_var,
+                                  command=lambda: self.set_watch_mode(self.watch_var.get()))
         file_menu.add_separator()
         file_menu.add_command(label="Save Settings", command=lambda: self.save_settings(), accelerator="Ctrl+S")
         file_menu.add_command(label="Load Settings", command=lambda: self.load_settings(self.current_image_path))
+        file_menu.add_command(label="Open Workspace...", command=self.open_workspace)
+        file_menu.add_command(label="Save Workspace...", command=self.save_workspace)
         file_menu.add_separator()
         file_menu.add_command(label="Remove Overlay", command=self.remove_overlay)
         file_menu.add_command(label="Reset Overlay Size/Position", command=self.reset_overlay)
         file_menu.add_command(label="Reset Base Position", command=self.reset_base_position)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit, accelerator="Esc")
+        file_menu.add_command(label="Exit", command=self.close_window, accelerator="Esc")
+        
+        # Edit menu
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        edit_menu.add_command(label="Undo", command=self.undo, accelerator="Ctrl+Z")
+        edit_menu.add_command(label="Redo", command=self.redo, accelerator="Ctrl+Y")
         
         # View menu
         view_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="View", menu=view_menu)
         view_menu.add_command(label="Fit to Window", command=lambda: self.fit_to_window(None), accelerator="F6")
         view_menu.add_command(label="Reset Image", command=lambda: self.reset_image(None), accelerator="F5")
+        view_menu.add_command(label="Window/Level...", command=self.show_levels_dialog)
+        resample_menu = tk.Menu(view_menu, tearoff=0)
+        view_menu.add_cascade(label="Resampling", menu=resample_menu)
+        self.resample_filter_var = tk.StringVar(value=self.resample_filter)
+        for label, name, _ in RESAMPLE_FILTERS:
+            resample_menu.add_radiobutton(label=label, value=name, variable=self.resample_filter_var,
+                                          command=lambda n=name: self.set_resample_filter(n))
+        self.color_managed_var = tk.BooleanVar(value=self.color_managed)
+        view_menu.add_checkbutton(label="Color Management", variable=self.color_managed_var,
+                                  command=lambda: self.set_color_managed(self.color_managed_var.get()))
+        self.loupe_var = tk.BooleanVar(value=self.loupe_enabled)
+        view_menu.add_checkbutton(label="Magnifier", variable=self.loupe_var, accelerator="M",
+                                  command=lambda: self.set_loupe(self.loupe_var.get()))
+        loupe_menu = tk.Menu(view_menu, tearoff=0)
+        view_menu.add_cascade(label="Magnifier Zoom", menu=loupe_menu)
+        self.loupe_magnification_var = tk.IntVar(value=self.loupe_magnification)
+        for magnification in LOUPE_MAGNIFICATIONS:
+            loupe_menu.add_radiobutton(label=f"{magnification}x", value=magnification,
+                                       variable=self.loupe_magnification_var,
+                                       command=lambda m=magnification: self.set_loupe_magnification(m))
+        loupe_menu.add_separator()
+        loupe_menu.add_command(label="Next Magnification", command=self.cycle_loupe_magnification, accelerator="Shift+M")
         view_menu.add_separator()
         view_menu.add_command(label="Toggle Grid", command=lambda: self.toggle_grid(None), accelerator="F7")
         view_menu.add_command(label="Toggle Grid Move Rotate Mode", command=lambda: self.toggle_grid_move_mode(None), accelerator="F8")
@@ -348,6 +3259,22 @@ class ImageZoomApp:
         transform_menu.add_command(label="Flip Vertical", command=lambda: self.flip_vertical(None), accelerator="F2")
         transform_menu.add_command(label="Rotate Clockwise 90°", command=lambda: self.rotate_clockwise(None), accelerator="F3")
         transform_menu.add_command(label="Rotate Counter-clockwise 90°", command=lambda: self.rotate_counterclockwise(None), accelerator="F4")
+        transform_menu.add_separator()
+        transform_menu.add_command(label="Rotate Clockwise 1°", accelerator="Ctrl+Right",
+                                   command=lambda: self.set_base_rotation(self.base_rotation - ROTATE_STEP))
+        transform_menu.add_command(label="Rotate Counter-clockwise 1°", accelerator="Ctrl+Left",
+                                   command=lambda: self.set_base_rotation(self.base_rotation + ROTATE_STEP))
+        transform_menu.add_command(label="Rotate to Angle...", command=self.ask_base_rotation)
+        transform_menu.add_command(label="Reset Rotation", command=lambda: self.set_base_rotation(0.0, draft=False))
+        
+        # Frames menu (multi-page TIFF, animated GIF/WebP)
+        frames_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Frames", menu=frames_menu)
+        frames_menu.add_command(label="Next Frame", command=lambda: self.next_frame(None), accelerator="PgDn")
+        frames_menu.add_command(label="Previous Frame", command=lambda: self.previous_frame(None), accelerator="PgUp")
+        frames_menu.add_command(label="First Frame", command=lambda: self.show_frame(0))
+        frames_menu.add_separator()
+        frames_menu.add_command(label="Play/Pause Animation", command=lambda: self.toggle_animation(None), accelerator="Space")
         
         # Mode menu
         mode_menu = tk.Menu(menubar, tearoff=0)
@@ -361,16 +3288,43 @@ class ImageZoomApp:
         menubar.add_cascade(label="Overlay", menu=overlay_menu)
         overlay_menu.add_command(label="Load Overlay Image...", command=self.load_overlay_image, accelerator="Ctrl+L")
         overlay_menu.add_command(label="Remove Overlay", command=self.remove_overlay)
+        self.layers_menu = tk.Menu(overlay_menu, tearoff=0)
+        overlay_menu.add_cascade(label="Layers", menu=self.layers_menu)
+        self.active_layer_var = tk.IntVar(value=-1)
+        self.update_layers_menu()
         overlay_menu.add_separator()
         overlay_menu.add_command(label="Increase Size (+2px)", command=lambda: self.increase_overlay_size(None), accelerator="Ctrl+Shift++")
         overlay_menu.add_command(label="Decrease Size (-2px)", command=lambda: self.decrease_overlay_size(None), accelerator="Ctrl+Shift+-")
         overlay_menu.add_separator()
         overlay_menu.add_command(label="Reset Size/Position", command=self.reset_overlay)
+        overlay_menu.add_separator()
+        overlay_menu.add_command(label="Auto-align Overlay", command=self.auto_align_overlay, accelerator="Ctrl+A")
+        overlay_menu.add_command(label="Auto-align Overlay (with Rotation)",
+                                 command=lambda: self.auto_align_overlay(estimate_rotation=True))
+        overlay_menu.add_separator()
+        compare_menu = tk.Menu(overlay_menu, tearoff=0)
+        overlay_menu.add_cascade(label="Compare Mode", menu=compare_menu)
+        self.compare_mode_var = tk.StringVar(value=self.compare_mode)
+        for label, mode in COMPARE_MODES:
+            compare_menu.add_radiobutton(label=label, value=mode, variable=self.compare_mode_var,
+                                         command=lambda m=mode: self.set_compare_mode(m))
+        compare_menu.add_separator()
+        compare_menu.add_command(label="Next Compare Mode", command=lambda: self.cycle_compare_mode(None), accelerator="C")
         
         # Tools menu
         tools_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Tools", menu=tools_menu)
         tools_menu.add_command(label="Copy Zoom Level", command=self.copy_zoom_to_clipboard)
+        tools_menu.add_command(label="Compare Images Side by Side...", command=self.open_compare_window)
+        self.stats_var = tk.BooleanVar(value=self.stats_enabled)
+        tools_menu.add_checkbutton(label="Region Statistics", variable=self.stats_var,
+                                   command=lambda: self.set_region_stats(self.stats_var.get()))
+        tools_menu.add_command(label="Export Cell Statistics...", command=self.export_cell_stats)
+        self.profiling_var = tk.BooleanVar(value=self.profiler is not None)
+        tools_menu.add_checkbutton(label="Profile Session", variable=self.profiling_var, command=self.toggle_profiling)
+        self.recording_var = tk.BooleanVar(value=self.recorder is not None)
+        tools_menu.add_checkbutton(label="Record Input Events...", variable=self.recording_var,
+                                   command=self.toggle_recording)
         tools_menu.add_separator()
         tools_menu.add_command(label="Keyboard Shortcuts", command=self.show_shortcuts)
         
@@ -398,62 +3352,164 @@ class ImageZoomApp:
         # Bind keyboard shortcuts
         self.root.bind("<Control-o>", lambda e: self.open_new_image())
         self.root.bind("<Control-l>", lambda e: self.load_overlay_image())
+        self.root.bind("<Control-a>", lambda e: self.auto_align_overlay())
+        self.root.bind("<Control-e>", lambda e: self.export_composite())
+        self.root.bind("<Control-z>", lambda e: self.undo())
+        self.root.bind("<Control-y>", lambda e: self.redo())
+        self.root.bind("<Control-Z>", lambda e: self.redo())  # Ctrl+Shift+Z
 
-    def load_overlay_image(self):
-        """Load an overlay image"""
-        image_path = filedialog.askopenfilename(
-            initialdir=self.last_directory,
-            title="Select Overlay Image",
-            filetypes=[
-                ("All Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff *.tif *.webp"),
-                ("PNG files", "*.png"), 
-                ("JPEG files", "*.jpg *.jpeg"), 
-                ("GIF files", "*.gif"),
-                ("BMP files", "*.bmp"),
-                ("TIFF files", "*.tiff *.tif"),
-                ("WebP files", "*.webp"),
-                ("All files", "*.*")
-            ]
-        )
+    def load_overlay_image(self, image_path=None):
+        """Load an overlay image as a new top layer, asking for the file unless a path is given"""
+        from tkinter import messagebox
+        interactive = image_path is None
+        if interactive:
+            image_path = filedialog.askopenfilename(
+                initialdir=self.last_directory,
+                title="Select Overlay Image",
+                filetypes=IMAGE_FILETYPES
+            )
         
         if image_path:
             try:
-                self.original_overlay_image = Image.open(image_path)
-                self.overlay_image = self.original_overlay_image.copy()
-                self.overlay_scale = 1.0
-                self.overlay_offset_x = 0
-                self.overlay_offset_y = 0
+                layer = OverlayLayer(Image.open(image_path), os.path.abspath(image_path))
+                self.layers.append(layer)
+                self.select_layer(layer)
                 self.last_directory = os.path.dirname(image_path)
                 
                 # Refresh display to show overlay
                 self.update_zoom(self.slider.get())
                 
-                messagebox.showinfo("Overlay Loaded", f"Overlay image loaded: {os.path.basename(image_path)}\nPress 'O' to edit overlay (move)\nCtrl+Shift+Plus/Minus to resize")
+                if interactive:
+                    messagebox.showinfo("Overlay Loaded", f"Overlay image loaded: {os.path.basename(image_path)}\nPress 'O' to edit overlay (move)\nCtrl+Shift+Plus/Minus to resize\nPress 'L' to switch layers")
                 
             except Exception as e:
                 messagebox.showerror("Error", f"Could not open overlay image:\n{str(e)}")
 
     def remove_overlay(self):
-        """Remove the overlay image"""
-        self.overlay_image = None
-        self.original_overlay_image = None
-        self.overlay_scale = 1.0
-        self.overlay_offset_x = 0
-        self.overlay_offset_y = 0
-        self.edit_overlay_mode = False
-        self.edit_overlay_label.config(text="Edit Overlay: OFF", fg="red")
-        self.canvas.config(cursor="")
+        """Remove the active overlay layer; the layer below it becomes active"""
+        if self.active_layer not in self.layers:
+            return
+        index = self.layers.index(self.active_layer)
+        self.layers.remove(self.active_layer)
+        self.select_layer(self.layers[max(0, index - 1)] if self.layers else OverlayLayer(None))
+        if not self.layers:
+            self.edit_overlay_mode = False
+            self.edit_overlay_label.config(text="Edit Overlay: OFF", fg="red")
+            self.canvas.config(cursor="")
         self.update_zoom(self.slider.get())
 
     def reset_overlay(self):
-        """Reset overlay size and position"""
+        """Reset size and position of the active overlay layer"""
         if self.original_overlay_image:
-            self.overlay_scale = 1.0
-            self.overlay_offset_x = 0
-            self.overlay_offset_y = 0
-            self.overlay_image = self.original_overlay_image.copy()
+            self.active_layer.reset()
+            self.update_zoom(self.slider.get())
+
+    def select_layer(self, layer):
+        """Make a layer the one the overlay controls act on; the opacity slider follows it"""
+        self.active_layer.opacity = int(self.transparency_slider.get())
+        self.active_layer = layer
+        self.transparency_slider.set(layer.opacity)
+        self.update_layers_menu()
+
+    def cycle_layer(self, step, layer=None):
+        """Activate the next layer up (L key), down for a negative step (Shift+L), or the given layer"""
+        if not self.layers:
+            return
+        if layer is None:
+            index = self.layers.index(self.active_layer) if self.active_layer in self.layers else 0
+            layer = self.layers[(index + step) % len(self.layers)]
+        self.select_layer(layer)
+        if self.edit_overlay_mode:
+            self.update_zoom(self.slider.get())  # The edit border follows the active layer
+
+    def toggle_layer_visibility(self):
+        """Hide or show the active layer (H key)"""
+        if self.active_layer in self.layers:
+            self.active_layer.visible = not self.active_layer.visible
+            self.update_layers_menu()
+            self.update_zoom(self.slider.get())
+
+    def move_layer(self, step):
+        """Move the active layer up (step 1) or down (step -1) the stack"""
+        if self.active_layer not in self.layers:
+            return
+        index = self.layers.index(self.active_layer)
+        target = index + step
+        if 0 <= target < len(self.layers):
+            self.layers[index], self.layers[target] = self.layers[target], self.layers[index]
+            self.update_layers_menu()
             self.update_zoom(self.slider.get())
 
+    def update_layers_menu(self):
+        """Rebuild Overlay > Layers: one entry per layer, top first, then the stack controls"""
+        self.update_compare_label()
+        if not hasattr(self, 'layers_menu'):
+            return
+        menu = self.layers_menu
+        menu.delete(0, tk.END)
+        for index in reversed(range(len(self.layers))):
+            layer = self.layers[index]
+            label = f"{index + 1}. {layer.name}" + ("" if layer.visible else " (hidden)")
+            menu.add_radiobutton(label=label, value=index, variable=self.active_layer_var,
+                                 command=lambda l=layer: self.cycle_layer(0, l))
+        self.active_layer_var.set(self.layers.index(self.active_layer) if self.active_layer in self.layers else -1)
+        if self.layers:
+            menu.add_separator()
+        state = "normal" if self.layers else "disabled"
+        menu.add_command(label="Next Layer", command=lambda: self.cycle_layer(1), accelerator="L", state=state)
+        menu.add_command(label="Previous Layer", command=lambda: self.cycle_layer(-1), accelerator="Shift+L", state=state)
+        menu.add_command(label="Hide/Show Layer", command=self.toggle_layer_visibility, accelerator="H", state=state)
+        menu.add_command(label="Move Layer Up", command=lambda: self.move_layer(1), state=state)
+        menu.add_command(label="Move Layer Down", command=lambda: self.move_layer(-1), state=state)
+
+    def get_layer_opacity(self, layer):
+        """Opacity of a layer; the slider holds it for the active layer"""
+        return int(self.transparency_slider.get()) if layer is self.active_layer else layer.opacity
+
+    def get_layer_state(self, layer):
+        """Placement and visibility of a layer as plain JSON-friendly values"""
+        return {
+            'path': layer.path,
+            'visible': layer.visible,
+            'opacity': self.get_layer_opacity(layer),
+            'scale': layer.scale,
+            'offset': [layer.offset_x, layer.offset_y],
+            'rotation': layer.rotation,
+        }
+
+    def set_layer_states(self, states, active_index=None):
+        """Rebuild the layer stack from get_layer_state entries, reusing already loaded images"""
+        unused = list(self.layers)
+        layers = []
+        active = None
+        for index, state in enumerate(states):
+            layer = next((layer for layer in unused if layer.path == state['path']), None)
+            if layer:
+                unused.remove(layer)
+            else:
+                try:
+                    layer = OverlayLayer(Image.open(state['path']), state['path'])
+                except OSError as e:
+                    print(f"Skipping overlay layer {state['path']}: {e}")
+                    continue
+            layer.visible = state.get('visible', True)
+            layer.opacity = state.get('opacity', 255)
+            layer.scale = state.get('scale', 1.0)
+            layer.offset_x, layer.offset_y = state.get('offset', (0, 0))
+            layer.rotation = state.get('rotation', 0.0)
+            layers.append(layer)
+            if index == active_index:
+                active = layer
+        
+        self.layers = layers
+        self.active_layer = OverlayLayer(None)  # The states set every opacity, the slider is not written back
+        self.select_layer(active or (layers[-1] if layers else OverlayLayer(None)))
+
+    def scale_overlays(self, ratio):
+        """Scale every layer with a zoom change, so the overlays stay on the same spot of the base"""
+        for layer in self.layers:
+            layer.scale = max(0.1, layer.scale * ratio)  # Minimum scale limit
+
     def reset_base_position(self):
         """Reset base image position"""
         self.base_offset_x = 0
@@ -518,8 +3574,293 @@ class ImageZoomApp:
             self.overlay_scale = max(0.1, self.overlay_scale)  # Minimum scale limit
             self.update_zoom(self.slider.get())
 
+    def auto_align_overlay(self, estimate_rotation=False):
+        """Estimate overlay scale and offset (and optionally rotation) on a worker thread (Ctrl+A)"""
+        from tkinter import messagebox
+        if not self.overlay_image or (self.align_thread and self.align_thread.is_alive()):
+            return
+        if importlib.util.find_spec("numpy") is None:
+            messagebox.showerror("Auto-align", "Auto-align needs NumPy:\npip install numpy")
+            return
+        
+        # Work in base image pixels; the current overlay scale is the starting guess
+        zoom_level = float(self.slider.get())
+        base = self.original_image
+        overlay = self.original_overlay_image
+        initial_scale = self.overlay_scale / zoom_level
+        to_gray = lambda image: self.apply_levels(image).convert('L')
+        
+        def align():
+            try:
+                self.align_result = estimate_overlay_alignment(base, overlay, initial_scale, estimate_rotation, to_gray)
+            except Exception as e:
+                self.align_result = e
+        
+        self.align_result = None
+        self.align_layer = self.active_layer
+        self.align_cursor = self.canvas.cget('cursor')
+        self.canvas.config(cursor="watch")
+        self.align_thread = threading.Thread(target=align, daemon=True)
+        self.align_thread.start()
+        self.root.after(50, self.finish_auto_align)
+
+    def finish_auto_align(self):
+        """Poll the auto-align worker and write its result into the overlay state"""
+        from tkinter import messagebox
+        if self.align_thread.is_alive():
+            self.root.after(50, self.finish_auto_align)
+            return
+        self.canvas.config(cursor=self.align_cursor)
+        
+        result = self.align_result
+        if isinstance(result, Exception):
+            messagebox.showerror("Auto-align", f"Auto-align failed:\n{str(result)}")
+            return
+        layer = self.align_layer
+        if layer not in self.layers:
+            return  # Removed while aligning
+        if not result['matched_windows'] or not 0.01 < result['scale'] < 100:
+            messagebox.showwarning("Auto-align", "Could not find a reliable match between base and overlay.")
+            return
+        
+        # Overlay state is in displayed pixels, relative to the centre of the (base-offset) canvas
+        zoom_level = float(self.slider.get())
+        layer.scale = result['scale'] * zoom_level
+        layer.offset_x = int(round(result['offset_x'] * zoom_level)) + self.base_offset_x
+        layer.offset_y = int(round(result['offset_y'] * zoom_level)) + self.base_offset_y
+        layer.rotation = round(result['rotation'], 2)
+        self.update_zoom(zoom_level)
+        print(f"Auto-align: scale {result['scale']:.4f}, offset ({result['offset_x']:.1f}, {result['offset_y']:.1f}), "
+              f"rotation {result['rotation']:.2f}°, {result['matched_windows']} windows matched")
+
+    def get_view_state(self):
+        """Everything that decides what the frame shows, as plain JSON-friendly values
+
+        Offsets and overlay scale are in pixels of the zoomed frame, as the display keeps them.
+        """
+        try:
+            grid_interval = int(self.grid_interval_var.get())
+        except ValueError:
+            grid_interval = None
+        return {
+            'zoom': self.current_zoom,
+            'base_ops': [[op, list(value) if isinstance(value, tuple) else int(value)] for op, value in self.base_ops],
+            'base_rotation': self.base_rotation,
+            'base_offset': [self.base_offset_x, self.base_offset_y],
+            'frame_index': self.frame_index,
+            'levels': [self.levels_min, self.levels_max, self.levels_gamma],
+            'overlay_path': self.overlay_path if self.overlay_image else None,
+            'overlay_scale': self.overlay_scale,
+            'overlay_offset': [self.overlay_offset_x, self.overlay_offset_y],
+            'overlay_rotation': self.overlay_rotation,
+            'layers': [self.get_layer_state(layer) for layer in self.layers],
+            'active_layer': self.layers.index(self.active_layer) if self.active_layer in self.layers else None,
+            'opacity': int(self.transparency_slider.get()),
+            'compare_mode': self.compare_mode,
+            'resample_filter': self.resample_filter,
+            'split': int(self.split_slider.get()),
+            'grid_visible': self.grid_visible,
+            'grid_interval': grid_interval,
+            'grid_offset': [self.grid_offset_x, self.grid_offset_y],
+            'grid_rotation': self.grid_rotation,
+            'grid_center': [self.grid_rotation_center_x, self.grid_rotation_center_y],
+        }
+
+    def set_view_state(self, view, render=True):
+        """Restore a state from get_view_state; overlays are reloaded if their paths differ"""
+        if self.frames and view['frame_index'] != self.frame_index:
+            self.frame_index = view['frame_index'] % self.frames.n_frames
+            self.true_original_image = self.frames.get_frame(self.frame_index)
+            self.update_frame_display()
+        self.base_ops = [(op, tuple(value) if isinstance(value, list) else value) for op, value in view['base_ops']]
+        self.original_image = self.apply_base_ops(self.true_original_image)
+        self.base_rotation = view.get('base_rotation', 0.0)
+        self.base_offset_x, self.base_offset_y = view['base_offset']
+        self.levels_min, self.levels_max, self.levels_gamma = view['levels']
+        self.sync_levels_dialog()
+        
+        if 'layers' in view:
+            self.set_layer_states(view['layers'], view['active_layer'])
+        elif view['overlay_path'] != (self.overlay_path if self.overlay_image else None):
+            if view['overlay_path']:
+                self.load_overlay_image(view['overlay_path'])
+            else:
+                self.remove_overlay()
+        self.overlay_scale = view['overlay_scale']
+        self.overlay_offset_x, self.overlay_offset_y = view['overlay_offset']
+        self.overlay_rotation = view['overlay_rotation']
+        self.transparency_slider.set(view['opacity'])
+        self.split_slider.set(view['split'])
+        self.set_compare_mode(view['compare_mode'], render=False)
+        self.set_resample_filter(view.get('resample_filter', "auto"), render=False)
+        
+        self.grid_visible = view['grid_visible']
+        if view['grid_interval']:
+            self.grid_interval_var.set(str(view['grid_interval']))
+        self.grid_offset_x, self.grid_offset_y = view['grid_offset']
+        self.grid_rotation = view['grid_rotation']
+        self.grid_rotation_center_x, self.grid_rotation_center_y = view['grid_center']
+        self.update_grid_position_display()
+        
+        self.slider.set(view['zoom'])
+        if render:
+            self.update_zoom(view['zoom'])
+
+    def get_edit_state(self):
+        """The undoable part of the view state, with overlay scales taken relative to the zoom
+
+        Layers are kept as (layer, scale, offset, rotation, visible), so undo also restores
+        the stack itself: its order, and layers that were loaded or removed.
+        """
+        view = self.get_view_state()
+        state = {key: view[key] for key in UNDO_KEYS}
+        state['layers'] = tuple((layer, round(layer.scale / (view['zoom'] or 1), 9), layer.offset_x, layer.offset_y,
+                                 layer.rotation, layer.visible) for layer in self.layers)
+        return state
+
+    def record_edit(self):
+        """Push what changed since the last rendered edit onto the undo stack (called per frame)
+
+        Consecutive steps of one drag, and repeats of the same edit within UNDO_MERGE_SECONDS,
+        are merged into one entry that keeps the first before value and the last after value.
+        """
+        state = self.get_edit_state()
+        previous, self.edit_state = self.edit_state, state
+        if previous is None:
+            return
+        delta = {key: (previous[key], value) for key, value in state.items() if value != previous[key]}
+        if not delta:
+            return
+        
+        now = time.perf_counter()
+        group = ("drag", self.drag_serial) if self.dragging_what else tuple(sorted(delta))
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if last and last['group'] == group and (self.dragging_what or now - last['time'] < UNDO_MERGE_SECONDS):
+            for key, (before, after) in delta.items():
+                last['delta'][key] = (last['delta'].get(key, (before,))[0], after)
+            last['time'] = now
+        else:
+            self.undo_stack.append({'delta': delta, 'group': group, 'time': now})
+        self.redo_stack.clear()
+
+    def reset_history(self):
+        """Forget undo/redo, starting over from the current state (a new image or startup)"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.edit_state = self.get_edit_state()
+
+    def undo(self):
+        """Step back one edit (Ctrl+Z)"""
+        if self.undo_stack:
+            entry = self.undo_stack.pop()
+            self.redo_stack.append(entry)
+            self.apply_edit({key: before for key, (before, after) in entry['delta'].items()})
+
+    def redo(self):
+        """Step forward again after an undo (Ctrl+Y / Ctrl+Shift+Z)"""
+        if self.redo_stack:
+            entry = self.redo_stack.pop()
+            self.undo_stack.append(entry)
+            self.apply_edit({key: after for key, (before, after) in entry['delta'].items()})
+
+    def apply_edit(self, values):
+        """Set undoable parameters and re-render through the normal cached path"""
+        zoom_level = self.current_zoom or float(self.slider.get())
+        if 'base_ops' in values:
+            self.base_ops = [(op, tuple(value) if isinstance(value, list) else value) for op, value in values['base_ops']]
+            self.original_image = self.apply_base_ops(self.true_original_image)
+            self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")
+        if 'base_rotation' in values:
+            self.base_rotation = values['base_rotation']
+        if 'base_offset' in values:
+            self.base_offset_x, self.base_offset_y = values['base_offset']
+        if 'layers' in values:
+            self.layers = []
+            for layer, scale, offset_x, offset_y, rotation, visible in values['layers']:
+                layer.scale = scale * zoom_level
+                layer.offset_x, layer.offset_y = offset_x, offset_y
+                layer.rotation = rotation
+                layer.visible = visible
+                self.layers.append(layer)
+            if self.active_layer not in self.layers:
+                self.select_layer(self.layers[-1] if self.layers else OverlayLayer(None))
+            self.update_layers_menu()
+        if values.get('grid_interval'):
+            self.grid_interval_var.set(str(values['grid_interval']))
+        if 'grid_offset' in values:
+            self.grid_offset_x, self.grid_offset_y = values['grid_offset']
+        if 'grid_rotation' in values:
+            self.grid_rotation = values['grid_rotation']
+        if 'grid_center' in values:
+            self.grid_rotation_center_x, self.grid_rotation_center_y = values['grid_center']
+        self.update_grid_position_display()
+        
+        # The restored state is the new baseline, so the render below records nothing
+        self.edit_state = self.get_edit_state()
+        self.update_zoom(zoom_level)
+
+    def get_renderer(self, scale=1.0):
+        """Snapshot the current view for rendering off the Tk thread
+
+        scale is output pixels per base image pixel; 1.0 renders at the source resolution.
+        """
+        overlays = [layer.image for layer in self.layers]
+        return renderer_from_view(self.original_image, overlays, self.get_view_state(), scale)
+
+    def export_composite(self, path=None, scale=1.0):
+        """Write base, overlay and grid at full resolution to a TIFF or PNG file (Ctrl+E)
+
+        Runs in the background; the edit-mode border is not part of the export.
+        """
+        if self.export_thread and self.export_thread.is_alive():
+            return
+        if path is None:
+            name = os.path.splitext(os.path.basename(self.current_image_path))[0]
+            path = filedialog.asksaveasfilename(
+                title="Export Composite",
+                initialdir=self.last_directory,
+                initialfile=f"{name}_composite.tif",
+                defaultextension=".tif",
+                filetypes=EXPORT_FILETYPES
+            )
+            if not path:
+                return
+        
+        renderer = self.get_renderer(scale)
+        
+        def progress(done, total):
+            self.export_progress = (done, total)
+        
+        def export():
+            try:
+                write_composite(renderer, path, progress=progress)
+                self.export_result = path
+            except Exception as e:
+                self.export_result = e
+        
+        self.export_progress = (0, 0)
+        self.export_result = None
+        self.export_thread = threading.Thread(target=export, daemon=True)
+        self.export_thread.start()
+        self.root.after(100, self.finish_export)
+
+    def finish_export(self):
+        """Show export progress in the status bar and report the result when done"""
+        from tkinter import messagebox
+        if self.export_thread.is_alive():
+            done, total = self.export_progress
+            self.task_label.config(text=f"Exporting... {done * 100 // max(1, total)}%")
+            self.root.after(100, self.finish_export)
+            return
+        self.task_label.config(text="")
+        
+        if isinstance(self.export_result, Exception):
+            messagebox.showerror("Export Composite", f"Export failed:\n{str(self.export_result)}")
+        else:
+            print(f"Exported composite to {self.export_result}")
+
     def update_transparency(self, value):
-        """Update overlay transparency"""
+        """Update overlay transparency (of the active layer) or the split position"""
         if self.overlay_image:
             self.update_zoom(self.slider.get())
 
@@ -531,8 +3872,8 @@ class ImageZoomApp:
         # Calculate canvas layout
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
-        base_width = int(self.original_image.size[0] * zoom_level)
-        base_height = int(self.original_image.size[1] * zoom_level)
+        base_width = int(self.get_base_size()[0] * zoom_level)
+        base_height = int(self.get_base_size()[1] * zoom_level)
         
         # Base image position on canvas (centered)
         base_x = max((canvas_width - base_width) // 2, 0)
@@ -576,160 +3917,1177 @@ class ImageZoomApp:
             
         return "pan"
 
+    @profiled
     def composite_images(self, base_image, zoom_level):
-        """Composite the base image with overlay if present"""
-        # Store original base image for later use
-        original_base = base_image.copy()
-        
+        """Composite the base image with the visible overlay layers, bottom to top"""
         # Apply base image offset by creating a larger canvas if needed
         if self.base_offset_x != 0 or self.base_offset_y != 0:
-            # Calculate new canvas size to accommodate offset
-            base_w, base_h = base_image.size
-            new_w = base_w + abs(self.base_offset_x) * 2
-            new_h = base_h + abs(self.base_offset_y) * 2
+            base_image = self.get_offset_base(base_image)
+        
+        # A layer whose frame below and placement are unchanged returns the same image as last
+        # time, and the blended layers above a changed one are added as one precomposited image,
+        # so editing one layer of the stack costs about as much as editing a single overlay
+        layers = [layer for layer in self.layers if layer.visible]
+        placements = [self.place_layer(layer, base_image.size) for layer in layers]
+        result = base_image
+        below = base_image  # A changed frame under the bottom layer changes every layer above it
+        index = 0
+        while index < len(layers):
+            layer, placement = layers[index], placements[index]
+            index += 1
+            if placement is None:
+                continue
+            changed = not self.is_composed(layer, below, placement)
+            result = self.compose_layer(layer, result, placement)
+            below = None
             
-            # Create larger canvas
-            offset_base = Image.new('RGB', (new_w, new_h), 'white')
+            end = index
+            while end < len(layers) and (placements[end] is None or placements[end][3] == "blend"):
+                end += 1
+            if end - index > 1 and (changed or self.is_run_composed(layers[index:end], placements[index:end], result)):
+                result = self.compose_run(layers[index:end], placements[index:end], result)
+                index = end
+        
+        # Draw overlay border if overlay exists and edit mode is on
+        if self.overlay_image and self.edit_overlay_mode:
+            result = self.draw_overlay_border(result, zoom_level)
+        
+        return result
+
+    def get_offset_base(self, base_image):
+        """The base frame on a larger white canvas, shifted by the base offset"""
+        offset = (self.base_offset_x, self.base_offset_y)
+        cache = self._offset_base_cache
+        if cache and cache[0] is base_image and cache[1] == offset:
+            return cache[2]
+        
+        # Calculate new canvas size to accommodate offset
+        base_w, base_h = base_image.size
+        new_w = base_w + abs(self.base_offset_x) * 2
+        new_h = base_h + abs(self.base_offset_y) * 2
+        
+        # Create larger canvas
+        offset_base = Image.new('RGB', (new_w, new_h), 'white')
+        
+        # Calculate paste position (center the original, then apply offset)
+        paste_x = (new_w - base_w) // 2 + self.base_offset_x
+        paste_y = (new_h - base_h) // 2 + self.base_offset_y
+        
+        try:
+            offset_base.paste(base_image, (paste_x, paste_y))
+        except:
+            return base_image  # If paste fails, use original base
+        self._offset_base_cache = (base_image, offset, offset_base)
+        return offset_base
+
+    def place_layer(self, layer, frame_size):
+        """(patch, x, y, mode, phase) of a layer on a frame of the given size, or None if it is off the frame
+
+        The active layer uses the compare mode, the others are blended. phase is where the
+        patch starts within the whole overlay, for the checkerboard.
+        """
+        # Calculate scaled overlay size
+        orig_w, orig_h = layer.image.size
+        scaled_w = int(orig_w * layer.scale)
+        scaled_h = int(orig_h * layer.scale)
+        
+        # Calculate position to paste overlay (centered by default, plus offset)
+        # A rotated overlay is larger than scaled_w x scaled_h but stays centred on the same point
+        base_w, base_h = frame_size
+        patch_w, patch_h = rotated_size((scaled_w, scaled_h), layer.rotation)
+        paste_x = (base_w - patch_w) // 2 + layer.offset_x
+        paste_y = (base_h - patch_h) // 2 + layer.offset_y
+        
+        # Only the part of the overlay over the frame is resampled and composited
+        visible = (max(0, -paste_x), max(0, -paste_y), min(patch_w, base_w - paste_x), min(patch_h, base_h - paste_y))
+        if scaled_w < 1 or scaled_h < 1 or visible[2] <= visible[0] or visible[3] <= visible[1]:
+            return None
+        
+        overlay_patch = self.get_overlay_patch(layer, scaled_w, scaled_h, visible)
+        mode = self.compare_mode if layer is self.active_layer else "blend"
+        return (overlay_patch, paste_x + visible[0], paste_y + visible[1], mode, visible[:2])
+
+    def get_overlay_patch(self, layer, scaled_w, scaled_h, visible):
+        """The visible part of a layer's resized (and rotated) overlay as RGBA
+
+        visible is a box in the bounding box of the rotated overlay. Only the source under it,
+        plus OVERLAY_PATCH_MARGIN, is resampled; the patch is reused while the visible part
+        stays inside it and size, rotation and levels are unchanged.
+        """
+        overlay = layer.image
+        params = (scaled_w, scaled_h, layer.rotation, self.resample_filter, self.color_managed, self.levels_min,
+                  self.levels_max, self.levels_gamma)
+        cache = layer.patch_cache
+        fresh = cache and cache[0] is overlay and cache[1] == params
+        if not (fresh and cache[2][0] <= visible[0] and cache[2][1] <= visible[1]
+                and visible[2] <= cache[2][2] and visible[3] <= cache[2][3]):
+            patch_w, patch_h = rotated_size((scaled_w, scaled_h), layer.rotation)
+            margin = OVERLAY_PATCH_MARGIN
+            region = (max(0, visible[0] - margin), max(0, visible[1] - margin),
+                      min(patch_w, visible[2] + margin), min(patch_h, visible[3] + margin))
             
-            # Calculate paste position (center the original, then apply offset)
-            paste_x = (new_w - base_w) // 2 + self.base_offset_x
-            paste_y = (new_h - base_h) // 2 + self.base_offset_y
+            # Patches are mapped with one window for the whole overlay, not their own extrema
+            window = None
+            if self.is_high_bit_depth(overlay):
+                if cache and cache[0] is overlay and cache[1][5:] == params[5:]:
+                    window = cache[3]
+                elif self.levels_min is None or self.levels_max is None:
+                    window = overlay.getextrema()
+                else:
+                    window = (self.levels_min, self.levels_max)
+            gamma_lut = self.get_gamma_lut() if self.levels_gamma != 1.0 else None
+            profile = layer.icc_profile if self.color_managed else None
+            if window:
+                to_display = lambda image: map_levels(image, window[0], window[1], gamma_lut)
+            else:
+                to_display = lambda image: apply_color_transform(image, profile)
             
-            try:
-                offset_base.paste(base_image, (paste_x, paste_y))
-                base_image = offset_base
-            except:
-                pass  # If paste fails, use original base
+            resample = choose_resample(scaled_w / overlay.size[0], self.resample_filter)
+            patch = render_overlay_region(overlay, (scaled_w, scaled_h), layer.rotation, region, to_display, resample)
+            cache = (overlay, params, region, window, patch, None, None)
         
-        if not self.overlay_image:
-            return base_image
+        region, patch = cache[2], cache[4]
+        if cache[5] != visible:
+            # The same visible box gives the same image object, so the compose cache keeps working
+            box = (visible[0] - region[0], visible[1] - region[1], visible[2] - region[0], visible[3] - region[1])
+            cropped = patch if box == (0, 0) + patch.size else patch.crop(box)
+            cache = cache[:5] + (visible, cropped)
+        layer.patch_cache = cache
+        return cache[6]
+
+    def get_compose_params(self, layer, placement):
+        """Everything besides the frame and patch that decides how a layer is composited"""
+        overlay, paste_x, paste_y, mode, phase = placement
+        split = int(self.split_slider.get()) if mode == "split" else None
+        return (mode, paste_x, paste_y, self.get_layer_opacity(layer), split, phase)
+
+    def is_composed(self, layer, base_image, placement):
+        """Whether compose_layer would return its cached result for this frame and placement
+
+        With base_image None only the layer's own patch and parameters are compared.
+        """
+        cache = layer.compose_cache
+        return bool(cache and (base_image is None or cache[0] is base_image) and cache[1] is placement[0]
+                    and cache[2] == self.get_compose_params(layer, placement))
+
+    def get_faded_patch(self, layer, overlay, alpha):
+        """A layer's patch with its opacity applied to its own alpha (e.g. rotated corners stay clear)"""
+        cache = layer.fade_cache
+        if cache and cache[0] is overlay and cache[1] == alpha:
+            return cache[2]
         
-        # Calculate scaled overlay size
+        faded = overlay.copy()
+        faded.putalpha(overlay.getchannel('A').point(lambda a: a * alpha // 255))
+        layer.fade_cache = (overlay, alpha, faded)
+        return faded
+
+    def compose_layer(self, layer, base_image, placement):
+        """Combine a layer's patch with the frame below it, blended or with a compare mode
+
+        The result is reused while frame, patch and parameters are unchanged.
+        """
+        overlay, paste_x, paste_y, mode, phase = placement
+        params = self.get_compose_params(layer, placement)
+        if self.is_composed(layer, base_image, placement):
+            return layer.compose_cache[3]
+        
+        alpha = params[3]
+        result = base_image.convert('RGB')  # Always a new image, the frame below stays untouched
+        if mode == "blend":
+            # The patch lies within the frame, so it can be pasted straight onto the copy
+            overlay_with_alpha = self.get_faded_patch(layer, overlay, alpha)
+            result.paste(overlay_with_alpha, (paste_x, paste_y), overlay_with_alpha)
+            layer.compose_cache = (base_image, overlay, params, result)
+            return result
+        
+        base_w, base_h = base_image.size
+        left, top = max(0, paste_x), max(0, paste_y)
+        right = min(base_w, paste_x + overlay.size[0])
+        bottom = min(base_h, paste_y + overlay.size[1])
+        
+        if right > left and bottom > top:
+            base_region = result.crop((left, top, right, bottom))
+            overlay_region = overlay.crop((left - paste_x, top - paste_y, right - paste_x, bottom - paste_y))
+            
+            # Squares are anchored to the overlay so they move with it
+            checkerboard = None
+            if mode == "checkerboard":
+                checkerboard = self.get_checkerboard_mask(base_region.size,
+                                                          (left - paste_x + phase[0], top - paste_y + phase[1]))
+            split_x = base_region.size[0] * int(self.split_slider.get()) // 100
+            patch = compare_patch(mode, base_region, overlay_region.convert('RGB'), alpha,
+                                  split_x, checkerboard)
+            
+            # Transparent parts of the overlay keep showing the base
+            result.paste(patch, (left, top), overlay_region.getchannel('A'))
+        
+        layer.compose_cache = (base_image, overlay, params, result)
+        return result
+
+    def get_run_key(self, layers, placements):
+        """(parameters, patches) that decide the precomposited stack of a run of layers"""
+        params = [(layer, self.get_compose_params(layer, placement))
+                  for layer, placement in zip(layers, placements) if placement]
+        return params, [placement[0] for placement in placements if placement]
+
+    def is_run_composed(self, layers, placements, base_image):
+        """Whether compose_run would reuse its result for this frame, or with base_image None its stack"""
+        cache = layers[0].run_cache
+        if not cache or (base_image is not None and cache[4] is not base_image):
+            return False
+        params, patches = self.get_run_key(layers, placements)
+        return cache[0] == params and len(cache[1]) == len(patches) and all(a is b for a, b in zip(cache[1], patches))
+
+    def compose_run(self, layers, placements, base_image):
+        """Blend a run of layers onto the frame at once, through their precomposited RGBA stack
+
+        Blending is associative, so the stack of the run is kept (on its bottom layer) while
+        none of its layers change, and a changed layer below costs one composite, not one per
+        layer. The result for the same frame is reused as well.
+        """
+        params, patches = self.get_run_key(layers, placements)
+        cache = layers[0].run_cache
+        current = self.is_run_composed(layers, placements, None)
+        if current and cache[4] is base_image:
+            return cache[5]
+        if current:
+            box, stack = cache[2], cache[3]
+        else:
+            # Stack the faded patches over the union of their boxes
+            boxes = [(x, y, x + patch.size[0], y + patch.size[1]) for patch, x, y, mode, phase in placements if patch]
+            box = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+            stack = Image.new('RGBA', (box[2] - box[0], box[3] - box[1]), (0, 0, 0, 0))
+            for layer, placement in zip(layers, placements):
+                if placement:
+                    faded = self.get_faded_patch(layer, placement[0], self.get_layer_opacity(layer))
+                    stack.alpha_composite(faded, (placement[1] - box[0], placement[2] - box[1]))
+        
+        result = base_image.convert('RGB')
+        region = result.crop(box).convert('RGBA')
+        region.alpha_composite(stack)
+        result.paste(region.convert('RGB'), box[:2])
+        layers[0].run_cache = (params, patches, box, stack, base_image, result)
+        return result
+
+    def get_checkerboard_mask(self, size, phase):
+        """Checkerboard mask of the given size, with squares offset by phase"""
+        cache = self._checkerboard_cache
+        if cache and cache[0] == size and cache[1] == phase:
+            return cache[2]
+        
+        mask = checkerboard_mask(size, phase)
+        self._checkerboard_cache = (size, phase, mask)
+        return mask
+
+    def set_compare_mode(self, mode, render=True):
+        """Switch how the overlay is combined with the base"""
+        labels = dict((m, label) for label, m in COMPARE_MODES)
+        if mode not in labels:
+            return
+        self.compare_mode = mode
+        if hasattr(self, 'compare_mode_var'):
+            self.compare_mode_var.set(mode)
+        self.update_compare_label()
+        if render and self.overlay_image:
+            self.update_zoom(self.slider.get())
+
+    def update_compare_label(self):
+        """Show the compare mode and, with several overlays, the active layer it applies to"""
+        text = f"Compare: {dict((m, label) for label, m in COMPARE_MODES)[self.compare_mode]}"
+        if len(self.layers) > 1 and self.active_layer in self.layers:
+            text += f"  Layer {self.layers.index(self.active_layer) + 1}/{len(self.layers)}: {self.active_layer.name}"
+        self.compare_label.config(text=text)
+
+    def set_resample_filter(self, name, render=True):
+        """Choose the filter for zoomed frames and overlays (View > Resampling), "auto" to pick per zoom"""
+        if name not in [n for _, n, _ in RESAMPLE_FILTERS]:
+            return
+        self.resample_filter = name
+        if hasattr(self, 'resample_filter_var'):
+            self.resample_filter_var.set(name)
+        if render:
+            self.update_zoom(self.slider.get())
+
+    def set_color_managed(self, enabled, render=True):
+        """Show frames converted from their embedded ICC profiles to the display (View > Color Management)"""
+        self.color_managed = bool(enabled)
+        if hasattr(self, 'color_managed_var'):
+            self.color_managed_var.set(self.color_managed)
+        if render:
+            self.update_zoom(self.slider.get())
+
+    def cycle_compare_mode(self, event):
+        """Switch to the next compare mode (C key)"""
+        modes = [mode for _, mode in COMPARE_MODES]
+        self.set_compare_mode(modes[(modes.index(self.compare_mode) + 1) % len(modes)])
+
+    def draw_overlay_border(self, image, zoom_level):
+        """Draw border on the overlay (no more resize handles)"""
+        image_with_border = image.convert('RGB')  # A copy, in colour even for grayscale frames
+        draw = ImageDraw.Draw(image_with_border)
+        
+        # Calculate overlay bounds in the current image coordinate space
         orig_w, orig_h = self.original_overlay_image.size
         scaled_w = int(orig_w * self.overlay_scale)
         scaled_h = int(orig_h * self.overlay_scale)
         
-        # Resize overlay with current scale
-        overlay_resized = self.original_overlay_image.resize((scaled_w, scaled_h), Image.BICUBIC)
+        base_w, base_h = image.size
+        overlay_x = (base_w - scaled_w) // 2 + self.overlay_offset_x + self.base_offset_x
+        overlay_y = (base_h - scaled_h) // 2 + self.overlay_offset_y + self.base_offset_y
+        overlay_right = overlay_x + scaled_w
+        overlay_bottom = overlay_y + scaled_h
+        
+        # Draw overlay border only
+        if overlay_x < base_w and overlay_y < base_h and overlay_right > 0 and overlay_bottom > 0:
+            # Clamp border to image bounds for drawing
+            border_left = max(0, overlay_x)
+            border_top = max(0, overlay_y)
+            border_right = min(base_w - 1, overlay_right)
+            border_bottom = min(base_h - 1, overlay_bottom)
+            
+            if border_right > border_left and border_bottom > border_top:
+                draw.rectangle([border_left, border_top, border_right, border_bottom], 
+                              outline="red", width=2)
+        
+        return image_with_border
+
+    def open_new_image(self):
+        """Open a new image file"""
+        from tkinter import messagebox
+        image_path = filedialog.askopenfilename(
+            initialdir=self.last_directory,
+            title="Select Base Image",
+            filetypes=IMAGE_FILETYPES
+        )
+        
+        if image_path:
+            try:
+                self.open_image(image_path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not open image:\n{str(e)}")
+
+    def open_image(self, image_path):
+        """Show another base image with the view reset and its saved settings applied, in one render"""
+        # Load new image
+        self.set_base_image(load_image(image_path), image_path)
+        self.update_preview_cache(image_path)
+        
+        # Reset all transformations
+        self.slider.set(1)
+        self.grid_offset_x = 0
+        self.grid_offset_y = 0
+        self.grid_rotation = 0
+        self.grid_rotation_center_x = self.original_image.size[0] // 2
+        self.grid_rotation_center_y = self.original_image.size[1] // 2
+        self.size_combobox.set("Original Size")
+        self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")
+        
+        # Update window title
+        filename = os.path.basename(image_path)
+        self.root.title(f"Image Zoomer - {filename}")
+        
+        #load image settings
+        self.load_settings(image_path, render=False)
+        self.update_grid_position_display()
+        self.update_zoom(self.slider.get())
+        self.reset_history()
+
+    def save_workspace(self, path=None):
+        """Save the session to a workspace file: base and overlay paths, the full view, and the
+        preview cache fingerprint of the base, so reopening it needs no settings file or reloading
+        """
+        import json
+        if not path:
+            path = filedialog.asksaveasfilename(
+                initialdir=self.last_directory,
+                title="Save Workspace",
+                defaultextension=WORKSPACE_EXTENSION,
+                filetypes=WORKSPACE_FILETYPES
+            )
+            if not path:
+                return
+        
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            view = self.get_view_state()
+            view['layers'] = [dict(state, path=workspace_relpath(state['path'], directory))
+                              for state in view['layers'] if state['path']]
+            if view['overlay_path']:
+                view['overlay_path'] = workspace_relpath(view['overlay_path'], directory)
+            stat = os.stat(self.current_image_path)
+            workspace = {
+                'version': WORKSPACE_VERSION,
+                'base': {
+                    'path': workspace_relpath(self.current_image_path, directory),
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'fingerprint': file_fingerprint(self.current_image_path),
+                },
+                'view': view,
+                'size_preset': self.size_combobox.get(),
+                'color_managed': self.color_managed,
+            }
+            with open(path, 'w') as f:
+                json.dump(workspace, f, indent=2)
+            print(f"Workspace saved to {path}")
+        except Exception as e:
+            print(f"Error saving workspace: {e}")
+
+    def open_workspace(self, path=None):
+        """Restore a workspace file in this window
+
+        The base's cached preview is shown at once, then the base and every overlay are decoded
+        concurrently and the saved view is applied before the first full-quality frame.
+        """
+        from tkinter import messagebox
+        if not path:
+            path = filedialog.askopenfilename(
+                initialdir=self.last_directory,
+                title="Open Workspace",
+                filetypes=WORKSPACE_FILETYPES
+            )
+            if not path:
+                return
+        
+        try:
+            workspace = read_workspace(path)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Error", f"Could not open workspace:\n{str(e)}")
+            return
+        
+        base = workspace['base']
+        self.workspace = workspace
+        self.startup_complete = False  # Frames wait for the decodes, the preview stays up meanwhile
+        self.show_startup_preview(base['path'], base.get('fingerprint'))
+        self.start_decode(base['path'], workspace)
+        self.complete_workspace(base['path'])
+
+    def complete_workspace(self, image_path):
+        """Poll the workspace decodes; once done restore the session and render it"""
+        from tkinter import messagebox
+        if self.is_decoding():
+            self.root.after(DECODE_POLL_MS, lambda: self.complete_workspace(image_path))
+            return
+        self.set_busy(False)
+        self.startup_complete = True
+        if isinstance(self.decode_result, Exception):
+            self.take_overlay_decodes()
+            messagebox.showerror("Error", f"Could not open image:\n{str(self.decode_result)}")
+            self.decode_result = None
+            self.update_zoom(self.slider.get())  # Back to the image shown before
+            return
+        
+        self.set_base_image(self.decode_result, image_path)
+        self.decode_result = None
+        self.apply_workspace(self.workspace)
+        self.reset_history()
+        self.update_preview_cache(image_path, self.workspace['base'].get('fingerprint'))
+
+    def apply_workspace(self, workspace, render=True):
+        """Apply a workspace to the decoded base: overlay layers from start_decode(), then the view"""
+        # Layers already loaded under the saved paths are picked up by set_layer_states()
+        self.layers = self.take_overlay_decodes()
+        self.set_view_state(workspace['view'], render=False)
+        self.size_combobox.set(workspace.get('size_preset', "Original Size"))
+        self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")
+        self.set_color_managed(workspace.get('color_managed', True), render=False)
+        self.root.title(f"Image Zoomer - {os.path.basename(self.current_image_path)}")
+        if render:
+            self.update_zoom(self.slider.get())
+
+    def set_watch_mode(self, enabled):
+        """Reload the base image whenever its file changes on disk (File > Watch for Changes)
+
+        The file is polled with os.stat every WATCH_POLL_MS. A new version is taken once its
+        size and modification time have held still for one poll; it is hashed, and decoded on
+        a worker thread only if the content differs from the version shown.
+        """
+        self.watch_mode = enabled
+        if hasattr(self, 'watch_var'):
+            self.watch_var.set(enabled)
+        if self.watch_job:
+            self.root.after_cancel(self.watch_job)
+            self.watch_job = None
+        self.watch_stat = self.watch_pending = None
+        if enabled:
+            self.watch_job = self.root.after(WATCH_POLL_MS, self.poll_watched_file)
+
+    def poll_watched_file(self):
+        """Check the base image file for a new version, see set_watch_mode()"""
+        self.watch_job = self.root.after(WATCH_POLL_MS, self.poll_watched_file)
+        if not self.startup_complete or (self.watch_thread and self.watch_thread.is_alive()):
+            return
+        if self.watch_thread:
+            self.watch_thread = None
+            self.finish_reload()
+        
+        image_path = self.current_image_path
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return  # Being replaced, look again on the next poll
+        stat = (image_path, stat.st_mtime_ns, stat.st_size)
+        if self.watch_stat is None or self.watch_stat[0] != image_path:
+            # Just switched on, or another image was opened: only hash the version shown
+            self.watch_stat = stat
+            self.watch_digest = None
+            self.start_reload(image_path, decode=False)
+        elif stat == self.watch_stat:
+            self.watch_pending = None
+        elif stat != self.watch_pending:
+            self.watch_pending = stat  # Still being written, or just done: wait one poll
+        else:
+            self.watch_stat = stat
+            self.watch_pending = None
+            self.start_reload(image_path, decode=True)
+
+    def start_reload(self, image_path, decode):
+        """Hash the file on a worker thread and decode it there too if its content changed"""
+        shown_digest = self.watch_digest
+        
+        def reload():
+            try:
+                digest = file_digest(image_path)
+                # Not kept in the decoded image cache, which is keyed on mtime and would pin every version
+                image = load_image(image_path, cache=False) if decode and digest != shown_digest else None
+                self.watch_result = (image_path, digest, image)
+            except Exception as e:
+                self.watch_result = e
         
-        # Get transparency value
-        alpha = int(self.transparency_slider.get())
+        self.watch_result = None
+        self.watch_thread = threading.Thread(target=reload, daemon=True)
+        self.watch_thread.start()
+
+    def finish_reload(self):
+        """Swap in the version the reload worker decoded, if the content changed"""
+        result, self.watch_result = self.watch_result, None
+        if isinstance(result, Exception):
+            print(f"Error reloading {self.current_image_path}: {result}")
+            return
+        image_path, digest, image = result
+        if image_path != self.current_image_path:
+            return  # Another image was opened meanwhile
+        self.watch_digest = digest
+        if image is not None:
+            self.reload_image(image, image_path)
+
+    def reload_image(self, image, image_path):
+        """Show a new version of the base image, keeping zoom, pan, grid, overlays and base edits"""
+        was_high_bit_depth = self.is_high_bit_depth(self.true_original_image)
+        frame_index = self.frame_index
+        self.true_original_image = image
+        self.original_image = self.apply_base_ops(image)
+        if self.is_high_bit_depth(image) != was_high_bit_depth:
+            self.init_levels()
+        else:
+            self._levels_histogram = None  # The window stays, the data range is recomputed when asked for
+        self.base_icc_profile = get_icc_profile(image, image_path)
+        self.load_frames(image_path)
+        self.update_preview_cache(image_path)
+        print(f"Reloaded {os.path.basename(image_path)}")
+        if self.frames and frame_index:
+            self.show_frame(frame_index)
+            return
+        self.update_frame_display()
+        self.update_zoom(self.slider.get())
+
+    def open_compare_window(self, paths=None):
+        """Tile the base image and up to COMPARE_MAX_PANES - 1 other images with a shared view and grid"""
+        if paths is None:
+            paths = filedialog.askopenfilenames(
+                initialdir=self.last_directory,
+                title=f"Select Images to Compare (up to {COMPARE_MAX_PANES - 1})",
+                filetypes=IMAGE_FILETYPES
+            )
+        paths = list(paths)[:COMPARE_MAX_PANES - 1]
+        if not paths:
+            return
+        if self.compare_window:
+            self.compare_window.close()
+        self.compare_window = CompareWindow(self, paths)
+
+    def set_region_stats(self, enabled):
+        """Show mean, std, min and max of the grid cell under the pointer (Tools > Region Statistics)
+
+        Summed-area tables of the base and the active overlay are built in the background and
+        rebuilt only when an image, its scale or rotation, or the grid rotation changes.
+        """
+        from tkinter import messagebox
+        if enabled and importlib.util.find_spec("numpy") is None:
+            messagebox.showerror("Region Statistics", "Region statistics need NumPy:\npip install numpy")
+            enabled = False
+        self.stats_enabled = enabled
+        if hasattr(self, 'stats_var'):
+            self.stats_var.set(enabled)
+        if enabled:
+            self.update_region_stats()
+        else:
+            if self.stats_job:
+                self.root.after_cancel(self.stats_job)
+                self.stats_job = None
+            self.stats_tables = {}  # The tables take 16 bytes per pixel, free them
+            self.stats_box = None
+            self.show_region_stats()
+
+    def get_stats_grid(self):
+        """(interval, origin, rotation) of the grid in base pixels of the frame, laid out as exports draw it"""
+        try:
+            interval = max(1, int(self.grid_interval_var.get()))
+        except ValueError:
+            interval = 1
+        if self.grid_rotation == 0:
+            origin = (self.grid_offset_x, self.grid_offset_y)
+        else:
+            origin = (self.grid_rotation_center_x + self.grid_offset_x, self.grid_rotation_center_y + self.grid_offset_y)
+        return interval, origin, self.grid_rotation
+
+    def to_grid(self, point):
+        """A point in base pixels of the frame along the grid axes, from the grid origin"""
+        _, origin, rotation = self.get_stats_grid()
+        cos_a, sin_a = math.cos(math.radians(rotation)), math.sin(math.radians(rotation))
+        dx, dy = point[0] - origin[0], point[1] - origin[1]
+        return (dx * cos_a + dy * sin_a, -dx * sin_a + dy * cos_a)
+
+    def from_grid(self, point):
+        """Inverse of to_grid()"""
+        _, origin, rotation = self.get_stats_grid()
+        cos_a, sin_a = math.cos(math.radians(rotation)), math.sin(math.radians(rotation))
+        return (origin[0] + point[0] * cos_a - point[1] * sin_a, origin[1] + point[0] * sin_a + point[1] * cos_a)
+
+    def get_stats_sources(self):
+        """{name: (image, (scale, rotation, grid rotation), centre)} for the base and the active overlay
+
+        Scale is frame pixels per image pixel at zoom 1 and centre is in base pixels of the frame,
+        placed like the display places them.
+        """
+        zoom = self.current_zoom
+        base_w, base_h = self.get_base_size()
+        pad_x, pad_y = abs(self.base_offset_x) / zoom, abs(self.base_offset_y) / zoom
+        sources = {'Base': (self.original_image, (1.0, self.base_rotation, self.grid_rotation),
+                            (pad_x + self.base_offset_x / zoom + base_w / 2, pad_y + self.base_offset_y / zoom + base_h / 2))}
+        layer = self.active_layer
+        if layer in self.layers and layer.visible:
+            sources['Overlay'] = (layer.image, (round(layer.scale / zoom, 6), layer.rotation, self.grid_rotation),
+                                  (pad_x + layer.offset_x / zoom + base_w / 2, pad_y + layer.offset_y / zoom + base_h / 2))
+        return sources
+
+    def get_stats_tables(self, build=False):
+        """{name: (RegionStats, shift)} of the sources whose tables are current, building the others if build"""
+        tables = {}
+        for name, (image, params, centre) in self.get_stats_sources().items():
+            cached = self.stats_tables.get(name)
+            if not (cached and cached[0] is image and cached[1] == params):
+                if not build:
+                    continue
+                cached = (image, params, RegionStats(image, *params))
+                self.stats_tables[name] = cached
+            tables[name] = (cached[2], self.to_grid(centre))
+        return tables
+
+    def update_region_stats(self):
+        """Refresh the statistics display, rebuilding out of date tables once changes settle"""
+        sources = self.get_stats_sources()
+        for name in list(self.stats_tables):
+            if name not in sources:
+                del self.stats_tables[name]
+        if len(self.get_stats_tables()) < len(sources):
+            if self.stats_job:
+                self.root.after_cancel(self.stats_job)
+            self.stats_job = self.root.after(STATS_SETTLE_MS, self.build_region_stats)
+        self.show_region_stats()
+
+    def build_region_stats(self):
+        """Build the out of date tables on a worker thread"""
+        self.stats_job = None
+        if self.stats_thread and self.stats_thread.is_alive():
+            self.stats_job = self.root.after(STATS_SETTLE_MS, self.build_region_stats)
+            return
+        stale = {name: (image, params) for name, (image, params, _) in self.get_stats_sources().items()
+                 if not (name in self.stats_tables and self.stats_tables[name][0] is image
+                         and self.stats_tables[name][1] == params)}
         
-        # Convert to RGBA if needed
-        if base_image.mode != 'RGBA':
-            base_image = base_image.convert('RGBA')
-        if overlay_resized.mode != 'RGBA':
-            overlay_resized = overlay_resized.convert('RGBA')
+        def build():
+            try:
+                self.stats_result = {name: (image, params, RegionStats(image, *params))
+                                     for name, (image, params) in stale.items()}
+            except Exception as e:
+                self.stats_result = e
         
-        # Apply transparency to overlay
-        overlay_with_alpha = overlay_resized.copy()
-        overlay_with_alpha.putalpha(alpha)
+        self.stats_result = None
+        self.stats_thread = threading.Thread(target=build, daemon=True)
+        self.stats_thread.start()
+        self.root.after(50, self.finish_region_stats)
+
+    def finish_region_stats(self):
+        """Take the tables from build_region_stats() once they are done"""
+        if self.stats_thread.is_alive():
+            self.root.after(50, self.finish_region_stats)
+            return
+        self.stats_thread = None
+        if isinstance(self.stats_result, Exception):
+            print(f"Error building region statistics: {self.stats_result}")
+        elif self.stats_enabled:
+            self.stats_tables.update(self.stats_result)
+            self.update_region_stats()  # Builds again if the images changed meanwhile
+        self.stats_result = None
+
+    def get_pointer_position(self, event):
+        """Pointer position in base pixels of the frame (frame pixels divided by the zoom)"""
+        x0, y0 = self.canvas.coords(self.image_on_canvas)[:2]
+        return ((self.canvas.canvasx(event.x) - x0) / self.current_zoom,
+                (self.canvas.canvasy(event.y) - y0) / self.current_zoom)
+
+    def on_pointer_motion(self, event):
+        if not self.startup_complete:
+            return
+        if self.loupe_enabled:
+            self.loupe_pointer = event
+            self.show_loupe()
+        if not self.stats_enabled:
+            return
+        self.stats_pointer = self.get_pointer_position(event)
+        if not self.stats_box:
+            self.show_region_stats()
+
+    def start_stats_box(self, event):
+        """Shift-click starts a statistics box along the grid axes; a normal click while statistics are off"""
+        if not self.stats_enabled:
+            return self.on_mouse_click(event)
+        start = self.to_grid(self.get_pointer_position(event))
+        self.stats_box = [start, start]
+
+    def drag_stats_box(self, event):
+        if not self.stats_box:
+            return self.do_drag(event)
+        self.stats_box[1] = self.to_grid(self.get_pointer_position(event))
+        self.show_region_stats()
+
+    def show_region_stats(self):
+        """Put the statistics of the box, or of the cell under the pointer, in the status bar
+
+        Only table lookups, the frame is not rendered again; the box is drawn as a canvas item.
+        """
+        self.canvas.delete("stats_box")
+        if not self.stats_enabled:
+            self.stats_label.config(text="")
+            return
         
-        # Create a new image same size as base for compositing
-        composite_base = base_image.copy()
+        if self.stats_box:
+            (a0, b0), (a1, b1) = self.stats_box
+            box = (min(a0, a1), min(b0, b1), max(a0, a1), max(b0, b1))
+            title = f"Box {box[2] - box[0]:.0f}x{box[3] - box[1]:.0f}"
+            x0, y0 = self.canvas.coords(self.image_on_canvas)[:2]
+            corners = [self.from_grid(corner) for corner in
+                       ((box[0], box[1]), (box[2], box[1]), (box[2], box[3]), (box[0], box[3]))]
+            self.canvas.create_polygon([v for x, y in corners for v in (x0 + x * self.current_zoom, y0 + y * self.current_zoom)],
+                                       outline="yellow", fill="", dash=(4, 2), tags="stats_box")
+        elif self.stats_pointer:
+            interval = self.get_stats_grid()[0]
+            a, b = self.to_grid(self.stats_pointer)
+            column, row = math.floor(a / interval), math.floor(b / interval)
+            box = (column * interval, row * interval, (column + 1) * interval, (row + 1) * interval)
+            title = f"Cell {column},{row}"
+        else:
+            self.stats_label.config(text="")
+            return
         
-        # Calculate position to paste overlay (centered by default, plus offset)
-        base_w, base_h = base_image.size
-        paste_x = (base_w - scaled_w) // 2 + self.overlay_offset_x
-        paste_y = (base_h - scaled_h) // 2 + self.overlay_offset_y
+        tables = self.get_stats_tables()
+        parts = [title]
+        for name in self.get_stats_sources():
+            if name not in tables:
+                parts.append(f"{name}: updating...")
+                continue
+            stats, shift = tables[name]
+            result = stats.query(box, shift)
+            if result:
+                count, mean, std, low, high = result
+                parts.append(f"{name}: mean {mean:.1f} std {std:.1f} min {low:g} max {high:g} ({count} px)")
+        self.stats_label.config(text=" | ".join(parts))
+
+    def export_cell_stats(self, path=None):
+        """Write mean, std, min and max of every grid cell of the base and the active overlay to CSV
+
+        Cells are numbered from the grid origin along the grid axes; their bounds are in base
+        pixels along the same axes.
+        """
+        import csv
+        from tkinter import messagebox
+        if importlib.util.find_spec("numpy") is None:
+            messagebox.showerror("Cell Statistics", "Cell statistics need NumPy:\npip install numpy")
+            return
+        if path is None:
+            name = os.path.splitext(os.path.basename(self.current_image_path))[0]
+            path = filedialog.asksaveasfilename(
+                title="Export Cell Statistics",
+                initialdir=self.last_directory,
+                initialfile=f"{name}_cells.csv",
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv")]
+            )
+            if not path:
+                return
         
-        # Paste overlay onto base image
+        interval = self.get_stats_grid()[0]
+        cells = {name: stats.cells(interval, shift) for name, (stats, shift) in self.get_stats_tables(build=True).items()}
+        keys = sorted(set().union(*cells.values()), key=lambda cell: (cell[1], cell[0]))
+        header = ['column', 'row', 'left', 'top', 'right', 'bottom']
+        for name in cells:
+            header += [f"{name.lower()}_{field}" for field in ('pixels', 'mean', 'std', 'min', 'max')]
         try:
-            composite_base.paste(overlay_with_alpha, (paste_x, paste_y), overlay_with_alpha)
-        except:
-            # If paste fails (overlay outside bounds), try alpha_composite
-            overlay_positioned = Image.new('RGBA', base_image.size, (0, 0, 0, 0))
-            if 0 <= paste_x < base_w and 0 <= paste_y < base_h:
-                overlay_positioned.paste(overlay_with_alpha, (paste_x, paste_y))
-            composite_base = Image.alpha_composite(composite_base, overlay_positioned)
-        
-        # Convert back to RGB for display
-        result = composite_base.convert('RGB')
-        
-        # Draw overlay border if overlay exists and edit mode is on
-        if self.overlay_image and self.edit_overlay_mode:
-            result = self.draw_overlay_border(result, zoom_level)
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                for column, row in keys:
+                    line = [column, row, column * interval, row * interval, (column + 1) * interval, (row + 1) * interval]
+                    for values in cells.values():
+                        line += list(values.get((column, row), ('',) * 5))
+                    writer.writerow(line)
+            print(f"Cell statistics saved to {path}")
+            if not self.stats_enabled:
+                self.stats_tables = {}
+        except OSError as e:
+            messagebox.showerror("Cell Statistics", f"Could not write {path}:\n{e}")
+
+    def set_loupe(self, enabled):
+        """Show a lens that follows the pointer with the source under it magnified (View > Magnifier, M)
+
+        The lens is rendered straight from the full-resolution base and overlays, so each update
+        reads and resamples only the pixels under the lens, whatever the image size and zoom, and
+        the frame is not rendered again.
+        """
+        self.loupe_enabled = enabled
+        if hasattr(self, 'loupe_var'):
+            self.loupe_var.set(enabled)
+        if not enabled:
+            self.loupe_renderer = None
+            self.loupe_imgtk = None
+        self.show_loupe()
+
+    def set_loupe_magnification(self, magnification):
+        self.loupe_magnification = magnification
+        if hasattr(self, 'loupe_magnification_var'):
+            self.loupe_magnification_var.set(magnification)
+        self.show_loupe()
+
+    def cycle_loupe_magnification(self):
+        magnification = self.loupe_magnification
+        index = LOUPE_MAGNIFICATIONS.index(magnification) if magnification in LOUPE_MAGNIFICATIONS else -1
+        self.set_loupe_magnification(LOUPE_MAGNIFICATIONS[(index + 1) % len(LOUPE_MAGNIFICATIONS)])
+
+    def get_loupe_renderer(self):
+        """(CompositeRenderer, grid) of the view at the lens magnification, rebuilt only when the view changes
+
+        The renderer reads no pixels until render() is called, so building it is cheap; the grid
+        is taken out of it because show_loupe() draws only the lines near the lens.
+        """
+        images = (self.original_image,) + tuple(layer.image for layer in self.layers)
+        view = self.get_view_state()
+        key = (self.loupe_magnification, self.color_managed, view)
+        cache = self.loupe_renderer
+        if (cache and len(cache[0]) == len(images) and all(a is b for a, b in zip(cache[0], images))
+                and cache[1] == key):
+            return cache[2], cache[3]
         
-        return result
+        profiles = None
+        if self.color_managed:
+            profiles = (self.base_icc_profile, [layer.icc_profile for layer in self.layers])
+        renderer = renderer_from_view(self.original_image, list(images[1:]), view, self.loupe_magnification, profiles)
+        grid, renderer.grid = renderer.grid, None
+        self.loupe_renderer = (images, key, renderer, grid)
+        return renderer, grid
 
-    def draw_overlay_border(self, image, zoom_level):
-        """Draw border on the overlay (no more resize handles)"""
-        image_with_border = image.copy()
-        draw = ImageDraw.Draw(image_with_border)
+    def show_loupe(self):
+        """Draw the lens centred on the pointer as a canvas item, over the frame already shown"""
+        self.canvas.delete("loupe")
+        if not (self.loupe_enabled and self.loupe_pointer and self.startup_complete):
+            return
         
-        # Calculate overlay bounds in the current image coordinate space
-        orig_w, orig_h = self.original_overlay_image.size
-        scaled_w = int(orig_w * self.overlay_scale)
-        scaled_h = int(orig_h * self.overlay_scale)
+        renderer, grid = self.get_loupe_renderer()
+        scale = self.loupe_magnification
+        x, y = self.get_pointer_position(self.loupe_pointer)
+        left = int(round(x * scale)) - LOUPE_SIZE // 2
+        top = int(round(y * scale)) - LOUPE_SIZE // 2
+        lens = renderer.render((left, top, left + LOUPE_SIZE, top + LOUPE_SIZE))
         
-        base_w, base_h = image.size
-        overlay_x = (base_w - scaled_w) // 2 + self.overlay_offset_x + self.base_offset_x
-        overlay_y = (base_h - scaled_h) // 2 + self.overlay_offset_y + self.base_offset_y
-        overlay_right = overlay_x + scaled_w
-        overlay_bottom = overlay_y + scaled_h
+        if grid:
+            interval, offset, rotation, center = grid
+            if rotation:
+                # The grid repeats every interval along its axes, so draw it from the crossing
+                # nearest the lens instead of laying out lines over the whole magnified canvas
+                cos_a, sin_a = math.cos(math.radians(rotation)), math.sin(math.radians(rotation))
+                cx, cy = center[0] + offset[0], center[1] + offset[1]
+                dx, dy = left + LOUPE_SIZE / 2 - cx, top + LOUPE_SIZE / 2 - cy
+                along = round((dx * cos_a + dy * sin_a) / interval) * interval
+                across = round((-dx * sin_a + dy * cos_a) / interval) * interval
+                center = (cx + along * cos_a - across * sin_a, cy + along * sin_a + across * cos_a)
+                offset = (0, 0)
+            draw_grid_lines(ImageDraw.Draw(lens), lens.size, interval, offset, rotation, center, origin=(left, top))
         
-        # Draw overlay border only
-        if overlay_x < base_w and overlay_y < base_h and overlay_right > 0 and overlay_bottom > 0:
-            # Clamp border to image bounds for drawing
-            border_left = max(0, overlay_x)
-            border_top = max(0, overlay_y)
-            border_right = min(base_w - 1, overlay_right)
-            border_bottom = min(base_h - 1, overlay_bottom)
-            
-            if border_right > border_left and border_bottom > border_top:
-                draw.rectangle([border_left, border_top, border_right, border_bottom], 
-                              outline="red", width=2)
+        self.loupe_imgtk = ImageTk.PhotoImage(lens)
+        canvas_x = self.canvas.canvasx(self.loupe_pointer.x)
+        canvas_y = self.canvas.canvasy(self.loupe_pointer.y)
+        self.canvas.create_image(canvas_x, canvas_y, image=self.loupe_imgtk, tags="loupe")
+        half = LOUPE_SIZE / 2
+        self.canvas.create_rectangle(canvas_x - half, canvas_y - half, canvas_x + half, canvas_y + half,
+                                     outline="yellow", tags="loupe")
+
+    def hide_loupe(self, event=None):
+        """Pointer left the canvas"""
+        self.loupe_pointer = None
+        self.canvas.delete("loupe")
+
+    def set_zoom(self, zoom_level):
+        """Zoom to a level like the wheel does, overlays keep their place on the base"""
+        old_zoom = float(self.slider.get())
+        self.fit_mode = False
+        self.slider.set(zoom_level)
+        self.scale_overlays(float(self.slider.get()) / old_zoom)  # The slider clamps to its range
+        self.update_zoom(self.slider.get())
+
+    def apply_command(self, command):
+        """Apply one automation command, a dict naming it under 'cmd'
+
+        open {path}, zoom {value}, grid {interval, offset, rotation, center, visible},
+        overlay {path, scale, offset, rotation, opacity, visible} (path loads a new top layer,
+        the rest place the active one), base_rotation {value}, resample {value},
+        compare_mode {value}, levels {min, max, gamma}, and view {state} for any part of
+        get_view_state(). Offsets and overlay scale are in pixels of the zoomed frame, grid
+        values in base pixels, as in the view state.
+        """
+        name = command['cmd']
+        if name == 'open':
+            self.open_image(command['path'])
+        elif name == 'zoom':
+            self.set_zoom(float(command['value']))
+        elif name == 'grid':
+            if 'interval' in command:
+                self.grid_interval_var.set(str(int(command['interval'])))
+            if 'offset' in command:
+                self.grid_offset_x, self.grid_offset_y = command['offset']
+            if 'rotation' in command:
+                self.grid_rotation = command['rotation']
+            if 'center' in command:
+                self.grid_rotation_center_x, self.grid_rotation_center_y = command['center']
+            if 'visible' in command:
+                self.grid_visible = bool(command['visible'])
+            self.update_grid_position_display()
+        elif name == 'overlay':
+            if 'path' in command:
+                layer = OverlayLayer(load_image(command['path']), os.path.abspath(command['path']))
+                self.layers.append(layer)
+                self.select_layer(layer)
+            if not self.overlay_image:
+                raise ValueError("no overlay loaded")
+            if 'scale' in command:
+                self.overlay_scale = float(command['scale'])
+            if 'offset' in command:
+                self.overlay_offset_x, self.overlay_offset_y = command['offset']
+            if 'rotation' in command:
+                self.overlay_rotation = float(command['rotation'])
+            if 'opacity' in command:
+                self.transparency_slider.set(int(command['opacity']))
+            if 'visible' in command:
+                self.active_layer.visible = bool(command['visible'])
+        elif name == 'base_rotation':
+            self.set_base_rotation(float(command['value']), draft=False)
+        elif name == 'resample':
+            if command['value'] not in [n for _, n, _ in RESAMPLE_FILTERS]:
+                raise ValueError(f"unknown filter {command['value']!r}")
+            self.set_resample_filter(command['value'], render=False)
+        elif name == 'compare_mode':
+            if command['value'] not in [mode for _, mode in COMPARE_MODES]:
+                raise ValueError(f"unknown compare mode {command['value']!r}")
+            self.set_compare_mode(command['value'], render=False)
+        elif name == 'levels':
+            self.levels_min = command.get('min', self.levels_min)
+            self.levels_max = command.get('max', self.levels_max)
+            self.levels_gamma = command.get('gamma', self.levels_gamma)
+            self.sync_levels_dialog()
+        elif name == 'view':
+            self.set_view_state(dict(self.get_view_state(), **command['state']), render=False)
+        else:
+            raise ValueError(f"unknown command {name!r}")
+
+    def apply_commands(self, commands):
+        """Apply a batch of automation commands as one change, with a single render at the end
+
+        Renders that the commands would trigger one by one are held back. If a command fails
+        the view (and base image) from before the batch is restored and ValueError is raised.
+        Returns the rendered frame with timings in milliseconds and the resulting view state.
+        """
+        start = time.perf_counter()
+        frames_rendered = self.frames_rendered
+        before = (self.true_original_image, self.current_image_path, self.get_view_state())
+        self.render_suspended = True
+        try:
+            for index, command in enumerate(commands):
+                try:
+                    self.apply_command(command)
+                except Exception as e:
+                    image, image_path, view = before
+                    if image is not self.true_original_image:
+                        self.set_base_image(image, image_path)
+                    self.set_view_state(view, render=False)
+                    raise ValueError(f"command {index} ({command.get('cmd')}): {e}") from e
+        finally:
+            self.render_suspended = False
+            applied = time.perf_counter()
+            self.update_zoom(self.slider.get())
         
-        return image_with_border
+        rendered = time.perf_counter()
+        return {
+            'frame': self.displayed_frame,
+            'timings': {
+                'apply_ms': (applied - start) * 1000,
+                'render_ms': (rendered - applied) * 1000,
+                'total_ms': (rendered - start) * 1000,
+            },
+            'renders': self.frames_rendered - frames_rendered,
+            'view': self.get_view_state(),
+        }
 
-    def open_new_image(self):
-        """Open a new image file"""
-        image_path = filedialog.askopenfilename(
+    def handle_automation_request(self, request):
+        """Run one request from AutomationServer and build its JSON reply, see send_automation_request()"""
+        import base64
+        try:
+            result = self.apply_commands(request.get('commands', []))
+            frame = result['frame']
+            reply = {'ok': True, 'timings': result['timings'], 'renders': result['renders'],
+                     'size': list(frame.size), 'view': result['view']}
+            if request.get('save'):
+                frame.save(request['save'])
+            if request.get('capture') == 'png':
+                encoded = io.BytesIO()
+                frame.save(encoded, 'PNG', compress_level=1)
+                reply['png'] = base64.b64encode(encoded.getvalue()).decode('ascii')
+            return reply
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def start_profiling(self, output_dir=None):
+        """Capture cProfile and tracemalloc data for the interactive handlers"""
+        if self.profiler is None:
+            self.profiler = SessionProfiler(output_dir)
+
+    def stop_profiling(self):
+        """Write the profile and allocation report, return their paths (None if not profiling)"""
+        if self.profiler is None:
+            return None
+        try:
+            paths = self.profiler.stop()
+        finally:
+            self.profiler = None
+        print(f"Profile written to {paths[0]}, report in {paths[1]}")
+        return paths
+
+    def toggle_profiling(self):
+        """Start or stop profiling from the Tools menu"""
+        from tkinter import messagebox
+        if self.profiling_var.get():
+            self.start_profiling()
+            return
+        paths = self.stop_profiling()
+        if paths:
+            messagebox.showinfo("Profile Session", f"Profile: {paths[0]}\nReport: {paths[1]}")
+
+    def start_recording(self, path):
+        """Log every handled input event with timing and view state to path (JSON lines)"""
+        self.stop_recording()
+        self.recorder = EventRecorder(self, path)
+        if hasattr(self, 'recording_var'):
+            self.recording_var.set(True)
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.stop()
+            print(f"Input events recorded to {self.recorder.file.name}")
+            self.recorder = None
+        if hasattr(self, 'recording_var'):
+            self.recording_var.set(False)
+
+    def toggle_recording(self):
+        """Start or stop event recording from the Tools menu"""
+        if not self.recording_var.get():
+            self.stop_recording()
+            return
+        name = os.path.splitext(os.path.basename(self.current_image_path))[0]
+        path = filedialog.asksaveasfilename(
+            title="Record Input Events",
             initialdir=self.last_directory,
-            title="Select Base Image",
-            filetypes=[
-                ("All Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff *.tif *.webp"),
-                ("PNG files", "*.png"), 
-                ("JPEG files", "*.jpg *.jpeg"), 
-                ("GIF files", "*.gif"),
-                ("BMP files", "*.bmp"),
-                ("TIFF files", "*.tiff *.tif"),
-                ("WebP files", "*.webp"),
-                ("All files", "*.*")
-            ]
+            initialfile=f"{name}_events.jsonl",
+            defaultextension=".jsonl",
+            filetypes=[("Event recordings", "*.jsonl")]
         )
+        if path:
+            self.start_recording(path)
+        else:
+            self.recording_var.set(False)
+
+    def replay_events(self, header, events, on_done, frame_budget_ms=FRAME_BUDGET_MS):
+        """Feed a recorded session into this window at the recorded times
+
+        Events are generated on the widgets they were recorded on, through the normal Tk
+        bindings. Latency runs from an event's recorded time to the end of its handling,
+        including the repaint, so a busy loop delays later events like real input would.
+        on_done receives the latency report.
+        """
+        self.set_view_state(header['view'])
+        self.root.update()
+        recorded_root = header['root'].rstrip('.')
+        latencies = []
+        start = time.perf_counter()
         
-        if image_path:
+        def inject(event):
+            path = event['widget']
+            if path.startswith(recorded_root):
+                path = str(self.root).rstrip('.') + path[len(recorded_root):]
             try:
-                # Load new image
-                self.original_image = Image.open(image_path)
-                self.true_original_image = self.original_image.copy()
-                self.last_directory = os.path.dirname(image_path)
-                
-                # Reset all transformations
-                self.slider.set(1)
-                self.grid_offset_x = 0
-                self.grid_offset_y = 0
-                self.grid_rotation = 0
-                self.grid_rotation_center_x = self.original_image.size[0] // 2
-                self.grid_rotation_center_y = self.original_image.size[1] // 2
-                self.size_combobox.set("Original Size")
-                self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")
-                
-                # Update window title
-                filename = os.path.basename(image_path)
-                self.root.title(f"Image Zoomer - {filename}")
-                
-                # Refresh display
-                self.update_grid_position_display()
-                self.update_zoom(1)
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not open image:\n{str(e)}")
+                widget = self.root.nametowidget(path or '.')
+            except KeyError:
+                return  # Transient widgets such as combobox popups are not replayed
+            
+            frames_before = self.frames_rendered
+            kind = event['event']
+            if kind in ('KeyPress', 'KeyRelease'):
+                widget.focus_force()
+                widget.event_generate(f"<{kind}>", keysym=event['keysym'], state=event['state'])
+            elif kind in ('ButtonPress', 'ButtonRelease'):
+                widget.event_generate(f"<{kind}-{event['num']}>", x=event['x'], y=event['y'], state=event['state'])
+            elif kind == 'MouseWheel':
+                widget.event_generate("<MouseWheel>", x=event['x'], y=event['y'], delta=event['delta'],
+                                      state=event['state'])
+            else:
+                widget.event_generate(f"<{kind}>", x=event['x'], y=event['y'], state=event['state'])
+            
+            if self.frames_rendered > frames_before:
+                self.root.update_idletasks()  # Include the repaint in the frame time
+                latencies.append(time.perf_counter() - start - event['t'])
         
-        #load image settings
-        self.current_image_path = image_path
-        self.load_settings(image_path)
+        def finish():
+            report = summarize_latencies(latencies, frame_budget_ms)
+            report['events'] = len(events)
+            on_done(report)
+        
+        for event in events:
+            self.root.after(int(event['t'] * 1000), lambda event=event: inject(event))
+        last = events[-1]['t'] if events else 0
+        self.root.after(int(last * 1000) + 1, finish)
+
+    def close_window(self):
+        """Close this viewer window; closing the main window exits the application"""
+        try:
+            self.stop_profiling()
+        except Exception as e:
+            print(f"Error writing profile: {e}")
+        self.stop_recording()
+        self.stop_animation()
+        self.set_watch_mode(False)
+        if self.frames:
+            self.frames.close()
+        if isinstance(self.root, tk.Tk):
+            self.root.quit()
+        else:
+            self.root.destroy()
 
     def toggle_grid_move_mode(self, event):
         """Toggle grid move mode (F8)"""
@@ -811,14 +5169,13 @@ class ImageZoomApp:
     def zoom_in_keyboard(self, event):
         """Zoom in using keyboard (Right arrow key)"""
         if not self.grid_move_mode:  # Only zoom if not in grid move mode
+            self.fit_mode = False
             current_zoom = self.slider.get()
             new_zoom = min(current_zoom + 0.02, self.slider['to'])  # Small increment, respect max limit
             
-            # If we have an overlay, scale it proportionally with the zoom change
-            if self.overlay_image and self.original_overlay_image and current_zoom > 0:
-                zoom_ratio = new_zoom / current_zoom
-                self.overlay_scale *= zoom_ratio
-                self.overlay_scale = max(0.1, self.overlay_scale)  # Minimum scale limit
+            # If we have overlays, scale them proportionally with the zoom change
+            if current_zoom > 0:
+                self.scale_overlays(new_zoom / current_zoom)
             
             self.slider.set(new_zoom)
             self.update_zoom(new_zoom)
@@ -826,20 +5183,20 @@ class ImageZoomApp:
     def zoom_out_keyboard(self, event):
         """Zoom out using keyboard (Left arrow key)"""
         if not self.grid_move_mode:  # Only zoom if not in grid move mode
+            self.fit_mode = False
             current_zoom = self.slider.get()
             new_zoom = max(current_zoom - 0.02, self.slider['from'])  # Small decrement, respect min limit
             
-            # If we have an overlay, scale it proportionally with the zoom change
-            if self.overlay_image and self.original_overlay_image and current_zoom > 0:
-                zoom_ratio = new_zoom / current_zoom
-                self.overlay_scale *= zoom_ratio
-                self.overlay_scale = max(0.1, self.overlay_scale)  # Minimum scale limit
+            # If we have overlays, scale them proportionally with the zoom change
+            if current_zoom > 0:
+                self.scale_overlays(new_zoom / current_zoom)
             
             self.slider.set(new_zoom)
             self.update_zoom(new_zoom)
 
     def zoom_in_keyboard_ctrl(self, event):
         """Zoom in using Ctrl+Shift++ keyboard shortcut"""
+        self.fit_mode = False
         current_zoom = self.slider.get()
         new_zoom = min(current_zoom + 0.1, self.slider['to'])
         self.slider.set(new_zoom)
@@ -847,6 +5204,7 @@ class ImageZoomApp:
 
     def zoom_out_keyboard_ctrl(self, event):
         """Zoom out using Ctrl+Shift+- keyboard shortcut"""
+        self.fit_mode = False
         current_zoom = self.slider.get()
         new_zoom = max(current_zoom - 0.1, self.slider['from'])
         self.slider.set(new_zoom)
@@ -854,30 +5212,73 @@ class ImageZoomApp:
     def flip_horizontal(self, event):
         """Flip image horizontally (F1)"""
         self.original_image = self.original_image.transpose(Image.FLIP_LEFT_RIGHT)
+        self.base_ops.append(('transpose', Image.FLIP_LEFT_RIGHT))
+        self.base_rotation = -self.base_rotation  # Mirroring the rotated frame turns it the other way
         current_zoom = self.slider.get()
         self.update_zoom(current_zoom)
 
     def flip_vertical(self, event):
         """Flip image vertically (F2)"""
         self.original_image = self.original_image.transpose(Image.FLIP_TOP_BOTTOM)
+        self.base_ops.append(('transpose', Image.FLIP_TOP_BOTTOM))
+        self.base_rotation = -self.base_rotation
         current_zoom = self.slider.get()
         self.update_zoom(current_zoom)
 
     def rotate_clockwise(self, event):
         """Rotate image 90° clockwise (F3)"""
         self.original_image = self.original_image.transpose(Image.ROTATE_270)
+        self.base_ops.append(('transpose', Image.ROTATE_270))
         current_zoom = self.slider.get()
         self.update_zoom(current_zoom)
 
     def rotate_counterclockwise(self, event):
         """Rotate image 90° counterclockwise (F4)"""
         self.original_image = self.original_image.transpose(Image.ROTATE_90)
+        self.base_ops.append(('transpose', Image.ROTATE_90))
         current_zoom = self.slider.get()
         self.update_zoom(current_zoom)
 
+    def set_base_rotation(self, angle, draft=True):
+        """Turn the base to a free angle in degrees counter-clockwise (Ctrl+Left/Right)
+
+        While the angle keeps changing, frames are drafted from a coarse level; the full-quality
+        frame follows once no step has come for ROTATE_SETTLE_MS, or at once with draft False.
+        """
+        angle = round((angle + 180) % 360 - 180, 6)
+        if angle == self.base_rotation:
+            return
+        self.base_rotation = angle
+        if self.rotation_job:
+            self.root.after_cancel(self.rotation_job)
+            self.rotation_job = None
+        if draft:
+            self.rotation_job = self.root.after(ROTATE_SETTLE_MS, self.settle_rotation)
+        self.update_zoom(self.slider.get())
+
+    def settle_rotation(self):
+        """Full-quality render once the angle has stopped changing"""
+        self.rotation_job = None
+        self.update_zoom(self.slider.get())
+
+    def ask_base_rotation(self):
+        """Type the base angle in degrees (Transform > Rotate to Angle...)"""
+        from tkinter import simpledialog
+        angle = simpledialog.askfloat("Rotate to Angle", "Angle in degrees (counter-clockwise, negative for clockwise):",
+                                      initialvalue=self.base_rotation, parent=self.root)
+        if angle is not None:
+            self.set_base_rotation(angle, draft=False)
+
+    def get_base_size(self):
+        """Size of the base as displayed, in base pixels: the bounding box once it is rotated"""
+        return rotated_size(self.original_image.size, self.base_rotation)
+
     def reset_image(self, event):
-        """Reset image to original state (F5)"""
-        self.original_image = self.true_original_image.copy()
+        """Reset image to original state (F5); switches back to the shared original, nothing is copied"""
+        self.original_image = self.true_original_image
+        self.base_ops = []
+        self.base_rotation = 0.0
+        self.fit_mode = False
         self.slider.set(1)
         self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")
         self.size_combobox.set("Original Size")
@@ -890,20 +5291,29 @@ class ImageZoomApp:
         self.update_grid_position_display()
         self.update_zoom(1)
 
-    def fit_to_window(self, event):
-        """Fit image to window (F6)"""
+    def get_fit_zoom(self):
+        """Zoom level that fits the image in the canvas, within the slider limits"""
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
-        img_width, img_height = self.original_image.size
+        img_width, img_height = self.get_base_size()
         
         # Calculate zoom level to fit image in canvas
         zoom_x = canvas_width / img_width
         zoom_y = canvas_height / img_height
         zoom_level = min(zoom_x, zoom_y, self.slider['to'])  # Don't exceed max zoom
-        zoom_level = max(zoom_level, self.slider['from'])   # Don't go below min zoom
+        return max(zoom_level, self.slider['from'])   # Don't go below min zoom
+
+    def fit_to_window(self, event):
+        """Fit image to window (F6); stays fitted while the window is resized until the zoom is changed"""
+        zoom_level = self.get_fit_zoom()
+        
+        # Keep the overlay on the same spot of the base, as the other zoom controls do
+        if self.current_zoom:
+            self.scale_overlays(zoom_level / self.current_zoom)
         
         self.slider.set(zoom_level)
         self.update_zoom(zoom_level)
+        self.fit_mode = True
 
     def toggle_grid(self, event):
         """Toggle grid visibility (F7)"""
@@ -913,6 +5323,7 @@ class ImageZoomApp:
 
     def show_shortcuts(self):
         """Show keyboard shortcuts in a popup"""
+        from tkinter import messagebox
         shortcuts = """Keyboard Shortcuts:
 
 Left/Right Arrows: Zoom out/in (when grid move OFF)
@@ -923,6 +5334,7 @@ F1: Flip horizontal
 F2: Flip vertical  
 F3: Rotate clockwise 90°
 F4: Rotate counterclockwise 90°
+Ctrl+Right/Left: Rotate base clockwise/counterclockwise 1° (Ctrl+Shift: 0.1°, Transform menu: typed angle)
 F5: Reset to original image + grid position/rotation
 F6: Fit image to window
 F7: Toggle grid on/off
@@ -930,10 +5342,20 @@ F8: Toggle grid move mode on/off
 F9: Reset grid position and rotation to (0,0,0°)
 O: Toggle overlay edit mode (move only)
 B: Toggle base image move mode on/off
+C: Next overlay compare mode (blend, difference, subtract, multiply, screen, checkerboard, split)
+L / Shift+L: Next/previous overlay layer (the active layer is the one edited and compared)
+H: Hide/show the active overlay layer
+M: Magnifier lens under the pointer on/off (Shift+M: next magnification)
+Page Down/Page Up: Next/previous frame (multi-page TIFF, animated GIF/WebP)
+Space: Play/pause animation
 Ctrl+Shift++: Increase overlay size by 2 pixels (independent of zoom)
 Ctrl+Shift+-: Decrease overlay size by 2 pixels (independent of zoom)
 Ctrl+O: Open base image
-Ctrl+L: Load overlay image
+Ctrl+L: Load overlay image (as a new top layer)
+Ctrl+A: Auto-align overlay to base (scale and position)
+Ctrl+E: Export composite at full resolution (TIFF/PNG)
+Ctrl+Z: Undo grid, overlay and base edits (a whole drag undoes at once)
+Ctrl+Y / Ctrl+Shift+Z: Redo
 Escape: Close application
 
 Mouse:
@@ -944,7 +5366,7 @@ Click + drag: Move grid (when grid move ON)
 Click + drag overlay: Move overlay (when edit overlay ON)
 Click + drag base: Move base image (when base move ON)
 
-Overlay transparency slider adjusts overlay visibility.
+Overlay transparency slider adjusts the visibility of the active overlay layer.
 In edit overlay mode:
 - Click and drag the overlay to move it
 - Use Ctrl+Shift+Plus/Minus to resize overlay by 2 pixels (independent of zoom)
@@ -970,14 +5392,16 @@ In edit overlay mode:
             # Resize the image to 7 inches at 96 dpi
             new_width = 7 * 96 - discr # 7 inches * 96 dpi
             new_height = 7 * 96 - discr # 7 inches * 96 dpi
-            self.original_image = self.original_image.resize((new_width, new_height), Image.BICUBIC)
+            self.original_image = resize_image(self.original_image, (new_width, new_height), magnify_nearest=False)
+            self.base_ops.append(('resize', (new_width, new_height)))
             self.image_size_var.set(f"{new_width}x{new_height}")  # Update the entry widget
 
             # Set the zoom level to 1 (100%)
             self.slider.set(1)
             self.update_displayed_image()
         elif selected_option == "Original Size":
-            self.original_image = self.true_original_image.copy()  # Reset to the true original image
+            self.original_image = self.true_original_image  # Reset to the true original image, shared not copied
+            self.base_ops = []
             self.slider.set(1)  # Reset zoom to 100%
             self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")
             self.update_displayed_image()
@@ -985,99 +5409,39 @@ In edit overlay mode:
         elif selected_option == "Custom":
             self.image_size_entry.focus_set()  # Set focus to the entry widget
 
+    @profiled
     def draw_grid(self, image, grid_interval):
         if not self.grid_visible:
             return image
             
         # Create a copy to avoid modifying the original
         image_with_grid = image.copy()
-        width, height = image.size
-        
-        # If no rotation, use the simple method
-        if self.grid_rotation == 0:
-            draw = ImageDraw.Draw(image_with_grid)
-            
-            # Apply grid offset
-            start_x = self.grid_offset_x % grid_interval
-            start_y = self.grid_offset_y % grid_interval
-
-            # Draw vertical lines
-            for i in range(start_x, width, grid_interval):
-                draw.line([(i, 0), (i, height)], fill="black")
-                
-            # Draw horizontal lines
-            for j in range(start_y, height, grid_interval):
-                draw.line([(0, j), (width, j)], fill="black")
-        else:
-            # For rotated grid, draw a proper rotated square grid
-            draw = ImageDraw.Draw(image_with_grid)
-            
-            # Convert rotation to radians
-            angle_rad = math.radians(self.grid_rotation)
-            cos_a = math.cos(angle_rad)
-            sin_a = math.sin(angle_rad)
-            
-            # Use the clicked point as rotation center (accounting for offset)
-            cx = self.grid_rotation_center_x + self.grid_offset_x
-            cy = self.grid_rotation_center_y + self.grid_offset_y
-            
-            # Calculate the maximum distance from center to cover the entire image
-            max_dist = int(math.sqrt(width**2 + height**2)) + grid_interval
-            
-            # Two perpendicular directions for the grid
-            # Direction 1: original vertical direction rotated
-            dir1_x = -sin_a  # perpendicular to angle
-            dir1_y = cos_a
-            
-            # Direction 2: original horizontal direction rotated  
-            dir2_x = cos_a
-            dir2_y = sin_a
-            
-            # Draw grid lines in both directions
-            for i in range(-max_dist // grid_interval, max_dist // grid_interval + 1):
-                offset = i * grid_interval
-                
-                # Lines in direction 1 (rotated vertical lines)
-                # Start point: center + offset in direction 2, extended backwards in direction 1
-                start_x = cx + offset * dir2_x - max_dist * dir1_x
-                start_y = cy + offset * dir2_y - max_dist * dir1_y
-                # End point: center + offset in direction 2, extended forwards in direction 1  
-                end_x = cx + offset * dir2_x + max_dist * dir1_x
-                end_y = cy + offset * dir2_y + max_dist * dir1_y
-                
-                if self._line_intersects_image(start_x, start_y, end_x, end_y, width, height):
-                    draw.line([(start_x, start_y), (end_x, end_y)], fill="black")
-                
-                # Lines in direction 2 (rotated horizontal lines)
-                # Start point: center + offset in direction 1, extended backwards in direction 2
-                start_x = cx + offset * dir1_x - max_dist * dir2_x
-                start_y = cy + offset * dir1_y - max_dist * dir2_y
-                # End point: center + offset in direction 1, extended forwards in direction 2
-                end_x = cx + offset * dir1_x + max_dist * dir2_x
-                end_y = cy + offset * dir1_y + max_dist * dir2_y
-                
-                if self._line_intersects_image(start_x, start_y, end_x, end_y, width, height):
-                    draw.line([(start_x, start_y), (end_x, end_y)], fill="black")
-
+        draw_grid_lines(ImageDraw.Draw(image_with_grid), image.size, grid_interval,
+                        (self.grid_offset_x, self.grid_offset_y), self.grid_rotation,
+                        (self.grid_rotation_center_x, self.grid_rotation_center_y))
         return image_with_grid
-    
-    def _line_intersects_image(self, x1, y1, x2, y2, width, height):
-        """Check if a line intersects with the image bounds"""
-        # Simple bounding box check
-        min_x, max_x = min(x1, x2), max(x1, x2)
-        min_y, max_y = min(y1, y2), max(y1, y2)
-        
-        return not (max_x < 0 or min_x > width or max_y < 0 or min_y > height)
 
+    @profiled
     def update_zoom(self, zoom_level):
+        if not self.startup_complete:
+            return  # The startup preview stays until finish_startup renders the real frame
         zoom_level = float(zoom_level)
+        self.current_zoom = zoom_level
+        if self.render_suspended:
+            return  # apply_commands() renders once when the batch is done
         
         # Update zoom percentage display
         self.zoom_percentage_label.config(text=f"{int(zoom_level * 100)}%")
+        self.update_frame_display()  # Shows the base rotation, which every path that turns the base renders after
         
         grid_interval = int(self.grid_interval_var.get())
-        width, height = self.original_image.size
-        zoomed_image = self.original_image.resize((int(width * zoom_level), int(height * zoom_level)), Image.BICUBIC)
+        zoomed_image = self.get_zoomed_base(zoom_level)
+
+        # Map high bit-depth data to 8-bit only on the downscaled frame
+        zoomed_image = self.apply_levels(zoomed_image)
+
+        # Colour-manage only the pixels shown, after resampling
+        zoomed_image = self.color_manage_frame(zoomed_image)
 
         # Composite with overlay if present
         zoomed_image = self.composite_images(zoomed_image, zoom_level)
@@ -1093,19 +5457,409 @@ In edit overlay mode:
         zoomed_image = self.draw_grid(zoomed_image, scaled_grid_interval)
         self.grid_offset_x, self.grid_offset_y = orig_offset_x, orig_offset_y
 
-        self.imgtk = ImageTk.PhotoImage(zoomed_image)
+        self.displayed_frame = zoomed_image
+        self.draw_frame(zoomed_image)
+        self.frames_rendered += 1
+        self.record_edit()
+        if self.compare_window:
+            self.compare_window.refresh()  # Grid changes show in the compare panes too
+        if self.stats_enabled:
+            self.update_region_stats()
+        if self.loupe_enabled:
+            self.show_loupe()  # draw_frame() cleared the canvas
+
+    def draw_frame(self, image):
+        """Put a rendered frame on the canvas, centred while it is smaller than the canvas"""
+        self.imgtk = ImageTk.PhotoImage(image)
         self.canvas.delete(tk.ALL)
-        
-        # Calculate centering offsets
+        self.image_on_canvas = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.imgtk)
+        self.center_frame()
+
+    def center_frame(self):
+        """Move the frame already on the canvas to the centre, no re-render needed"""
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
-        img_width = zoomed_image.width
-        img_height = zoomed_image.height
-        x_offset = max((canvas_width - img_width) / 2, 0)
-        y_offset = max((canvas_height - img_height) / 2, 0)
-        
-        self.image_on_canvas = self.canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=self.imgtk)
+        x_offset = max((canvas_width - self.imgtk.width()) / 2, 0)
+        y_offset = max((canvas_height - self.imgtk.height()) / 2, 0)
+        self.canvas.coords(self.image_on_canvas, x_offset, y_offset)
         self.canvas.config(scrollregion=self.canvas.bbox(tk.ALL))
+        self.canvas_size = (canvas_width, canvas_height)
+
+    def on_canvas_configure(self, event):
+        """Window resized: recentre at once; in fit mode preview the cached frame and re-render later"""
+        if not self.startup_complete or self.displayed_frame is None:
+            return
+        if (event.width, event.height) == self.canvas_size:
+            return
+        
+        zoom_level = self.get_fit_zoom()
+        if not self.fit_mode or zoom_level == self.current_zoom:
+            self.center_frame()  # The zoom stays, only the centring depends on the canvas size
+            return
+        
+        # Scale the last frame to the new fit as a cheap preview, the real render waits for the drag to settle
+        ratio = zoom_level / self.current_zoom
+        frame_w, frame_h = self.displayed_frame.size
+        size = (max(1, int(frame_w * ratio)), max(1, int(frame_h * ratio)))
+        self.draw_frame(self.displayed_frame.resize(size, Image.NEAREST))
+        
+        if self.resize_job:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(RESIZE_DEBOUNCE_MS, self.finish_resize)
+
+    def finish_resize(self):
+        """Full-quality render once the window size has settled"""
+        self.resize_job = None
+        if self.fit_mode:
+            self.fit_to_window(None)
+
+    def get_zoomed_base(self, zoom_level):
+        """Resize (and rotate) the base image to the zoom level, reusing the last result when unchanged"""
+        width, height = self.get_base_size()
+        size = (int(width * zoom_level), int(height * zoom_level))
+        params = (size, self.base_rotation, self.rotation_job is not None, self.resample_filter)
+        cache = self._zoom_cache
+        if cache and cache[0] is self.original_image and cache[1] == params:
+            return cache[2]
+        if self.base_rotation:
+            zoomed_image = self.get_rotated_base(size, zoom_level, draft=params[2])
+            self._zoom_cache = (self.original_image, params, zoomed_image)
+            return zoomed_image
+        
+        # Far enough out, a cached reduction of the untransformed image gives the same frame for less work
+        source = self.original_image
+        if self.preview_levels and self.preview_levels[0] is source:
+            level = pick_level(self.preview_levels[1], size, PREVIEW_LEVEL_GAP)
+            if level.size[0] >= size[0] * PREVIEW_LEVEL_GAP and level.size[1] >= size[1] * PREVIEW_LEVEL_GAP \
+                    and level.mode in (source.mode, "RGBX" if source.mode == "RGB" else None):
+                source = level
+        
+        zoomed_image = resize_image(source, size, self.resample_filter)
+        if zoomed_image.mode == "RGBX":
+            zoomed_image = zoomed_image.convert("RGB")  # Cached RGB levels are padded to RGBX
+        self._zoom_cache = (self.original_image, params, zoomed_image)
+        return zoomed_image
+
+    def get_rotated_base(self, size, zoom_level, draft=False):
+        """The base turned by base_rotation and resized to size, from a pyramid of rotated levels
+
+        Only the coarsest power-of-two reduction that still has a pixel per frame pixel is
+        rotated, so the work follows the frame, not the image. Rotated levels are kept for the
+        angle, so later zooms and pans only resize them. Draft frames, while the angle is still
+        changing, rotate a level ROTATE_DRAFT_FACTOR times coarser with bilinear filtering.
+        """
+        source = self.original_image
+        factor = 1
+        while zoom_level * factor * 2 <= 1:
+            factor *= 2
+        if draft:
+            factor *= ROTATE_DRAFT_FACTOR
+        while factor > 1 and min(source.size) // factor < 64:
+            factor //= 2  # Keep a usable level even for small images
+        
+        cache = self._rotation_cache
+        if not (cache and cache[0] is source and cache[1] == self.base_rotation):
+            cache = (source, self.base_rotation, {})
+            self._rotation_cache = cache
+        rotated = cache[2].get(factor)
+        if rotated is None:
+            resample = Image.BILINEAR if draft else Image.BICUBIC
+            rotated = rotate_image(self.get_reduced_base(factor), self.base_rotation, resample)
+            if not draft:
+                cache[2][factor] = rotated
+        
+        if draft:
+            zoomed_image = resample_parallel(rotated, size, Image.BILINEAR)
+        else:
+            zoomed_image = resize_image(rotated, size, self.resample_filter)
+        if zoomed_image.mode == "RGBX":
+            zoomed_image = zoomed_image.convert("RGB")
+        return zoomed_image
+
+    def get_reduced_base(self, factor):
+        """The unrotated base reduced by an integer factor, taken from the preview cache when it has the level"""
+        source = self.original_image
+        if factor == 1:
+            return source
+        cache = self._reduction_cache
+        if not (cache and cache[0] is source):
+            cache = (source, {})
+            if self.preview_levels and self.preview_levels[0] is source:
+                cache[1].update((level_factor, level) for level_factor, level in self.preview_levels[1]
+                                if level.mode in (source.mode, "RGBX" if source.mode == "RGB" else None))
+            self._reduction_cache = cache
+        if factor not in cache[1]:
+            cache[1][factor] = reduce_image(source, factor)
+        return cache[1][factor]
+
+    def is_high_bit_depth(self, image):
+        """Check whether an image holds more than 8 bits per sample"""
+        return image is not None and image.mode in HIGH_BIT_DEPTH_MODES
+
+    def init_levels(self):
+        """Reset the display window to the full data range of the current image"""
+        self._levels_histogram = None
+        self.levels_gamma = 1.0
+        if self.is_high_bit_depth(self.true_original_image):
+            self.levels_min, self.levels_max = self.get_levels_histogram()[0]
+        else:
+            self.levels_min = None
+            self.levels_max = None
+        self.sync_levels_dialog()
+
+    def get_levels_histogram(self):
+        """Return (extrema, histogram) of the true original image, computed once per image"""
+        image = self.true_original_image
+        cache = self._levels_histogram
+        if cache and cache[0] is image:
+            return cache[1], cache[2]
+        
+        # Sample large images with nearest neighbour so the scan stays cheap
+        sample = image
+        width, height = image.size
+        if width * height > LEVELS_HISTOGRAM_MAX_PIXELS:
+            step = math.sqrt(width * height / LEVELS_HISTOGRAM_MAX_PIXELS)
+            sample = image.resize((max(1, int(width / step)), max(1, int(height / step))), Image.NEAREST)
+        if sample.mode.startswith("I;16"):
+            sample = sample.convert("I")
+        
+        extrema = sample.getextrema()
+        if extrema[0] == extrema[1]:
+            extrema = (extrema[0], extrema[0] + 1)
+        histogram = sample.histogram(extrema=extrema)
+        self._levels_histogram = (image, extrema, histogram)
+        return extrema, histogram
+
+    def auto_levels(self, low_percent=0.5, high_percent=99.5):
+        """Set the display window from histogram percentiles"""
+        if not self.is_high_bit_depth(self.true_original_image):
+            return
+        (low, high), histogram = self.get_levels_histogram()
+        total = sum(histogram)
+        bin_width = (high - low) / len(histogram)
+        
+        # Walk the cumulative histogram to find both percentile bins
+        low_count = total * low_percent / 100
+        high_count = total * high_percent / 100
+        low_bin, high_bin = 0, len(histogram) - 1
+        running = 0
+        for i, count in enumerate(histogram):
+            previous = running
+            running += count
+            if previous <= low_count < running:
+                low_bin = i
+            if previous < high_count <= running:
+                high_bin = i
+                break
+        
+        self.levels_min = low + low_bin * bin_width
+        self.levels_max = low + (high_bin + 1) * bin_width
+        self.sync_levels_dialog()
+        self.update_zoom(self.slider.get())
+
+    def full_range_levels(self):
+        """Set the display window to the data extrema"""
+        if not self.is_high_bit_depth(self.true_original_image):
+            return
+        self.levels_min, self.levels_max = self.get_levels_histogram()[0]
+        self.levels_gamma = 1.0
+        self.sync_levels_dialog()
+        self.update_zoom(self.slider.get())
+
+    def get_gamma_lut(self):
+        """Return the 256-entry gamma table, rebuilt only when gamma changes"""
+        cache = self._levels_gamma_lut
+        if cache and cache[0] == self.levels_gamma:
+            return cache[1]
+        
+        inverse = 1.0 / max(self.levels_gamma, 0.01)
+        lut = [int(round(255 * (i / 255) ** inverse)) for i in range(256)]
+        self._levels_gamma_lut = (self.levels_gamma, lut)
+        return lut
+
+    def apply_levels(self, image):
+        """Map a high bit-depth frame to 8-bit using the current window/level"""
+        if not self.is_high_bit_depth(image):
+            return image
+        
+        # The same frame maps to the same image object, which the overlay layer caches key on
+        params = (self.levels_min, self.levels_max, self.levels_gamma)
+        cache = self._levels_frame_cache
+        if cache and cache[0] is image and cache[1] == params:
+            return cache[2]
+        
+        gamma_lut = self.get_gamma_lut() if self.levels_gamma != 1.0 else None
+        mapped = map_levels(image, self.levels_min, self.levels_max, gamma_lut)
+        self._levels_frame_cache = (image, params, mapped)
+        return mapped
+
+    def color_manage_frame(self, frame):
+        """Convert a displayed frame from the base's embedded profile to the display profile
+
+        The converted frame is kept, so pans that reuse the zoomed frame and overlay edits
+        convert nothing and the layer caches keyed on the frame keep working.
+        """
+        params = (self.color_managed, self.base_icc_profile)
+        cache = self._color_frame_cache
+        if cache and cache[0] is frame and cache[1] == params:
+            return cache[2]
+        managed = apply_color_transform(frame, self.base_icc_profile) if self.color_managed else frame
+        self._color_frame_cache = (frame, params, managed)
+        return managed
+
+    def show_levels_dialog(self):
+        """Open the window/level controls for high bit-depth images"""
+        from tkinter import messagebox
+        if not self.is_high_bit_depth(self.true_original_image):
+            messagebox.showinfo("Window/Level", "Window/level applies to 16-bit and floating point images.\n"
+                                f"Current image mode: {self.true_original_image.mode}")
+            return
+        if self.levels_window and self.levels_window.winfo_exists():
+            self.levels_window.lift()
+            return
+        
+        (low, high), _ = self.get_levels_histogram()
+        resolution = 1 if self.true_original_image.mode != "F" else (high - low) / 1000
+        
+        self.levels_window = tk.Toplevel(self.root)
+        self.levels_window.title("Window/Level")
+        self.levels_window.resizable(False, False)
+        
+        tk.Label(self.levels_window, text="Min:", font=("Arial", 8)).pack(side=tk.TOP, anchor="w", padx=5)
+        self.levels_min_slider = tk.Scale(self.levels_window, from_=low, to_=high, orient=tk.HORIZONTAL,
+                                          resolution=resolution, length=300, command=self.on_levels_change)
+        self.levels_min_slider.pack(side=tk.TOP, padx=5)
+        
+        tk.Label(self.levels_window, text="Max:", font=("Arial", 8)).pack(side=tk.TOP, anchor="w", padx=5)
+        self.levels_max_slider = tk.Scale(self.levels_window, from_=low, to_=high, orient=tk.HORIZONTAL,
+                                          resolution=resolution, length=300, command=self.on_levels_change)
+        self.levels_max_slider.pack(side=tk.TOP, padx=5)
+        
+        tk.Label(self.levels_window, text="Gamma:", font=("Arial", 8)).pack(side=tk.TOP, anchor="w", padx=5)
+        self.levels_gamma_slider = tk.Scale(self.levels_window, from_=0.1, to_=5, orient=tk.HORIZONTAL,
+                                            resolution=0.01, length=300, command=self.on_levels_change)
+        self.levels_gamma_slider.pack(side=tk.TOP, padx=5)
+        
+        button_frame = tk.Frame(self.levels_window)
+        button_frame.pack(side=tk.TOP, pady=5)
+        tk.Button(button_frame, text="Auto Levels", command=self.auto_levels).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Full Range", command=self.full_range_levels).pack(side=tk.LEFT, padx=5)
+        
+        self.sync_levels_dialog()
+
+    def sync_levels_dialog(self):
+        """Push the current window/level values into the dialog sliders"""
+        if not (self.levels_window and self.levels_window.winfo_exists()):
+            return
+        self._syncing_levels = True
+        try:
+            self.levels_min_slider.set(self.levels_min)
+            self.levels_max_slider.set(self.levels_max)
+            self.levels_gamma_slider.set(self.levels_gamma)
+        finally:
+            self._syncing_levels = False
+
+    def on_levels_change(self, value):
+        """Apply window/level slider changes to the displayed frame"""
+        if getattr(self, '_syncing_levels', False):
+            return
+        self.levels_min = float(self.levels_min_slider.get())
+        self.levels_max = float(self.levels_max_slider.get())
+        self.levels_gamma = float(self.levels_gamma_slider.get())
+        # Only the LUT changes here - the zoomed frame comes from the cache
+        self.update_zoom(self.slider.get())
+
+    def apply_base_ops(self, image):
+        """Replay the recorded flips, rotations and resizes on a source image"""
+        return apply_image_ops(image, self.base_ops)
+
+    def load_frames(self, image_path):
+        """Open the frame sequence of a multi-frame image (frames are decoded lazily)"""
+        self.stop_animation()
+        if self.frames:
+            self.frames.close()
+        self.frames = None
+        self.frame_index = 0
+        
+        try:
+            frames = FrameSequence(image_path)
+        except Exception as e:
+            print(f"Error reading frames: {e}")
+            return
+        
+        if frames.n_frames > 1:
+            frames.seed(0, self.true_original_image)
+            frames.prefetch(0)
+            self.frames = frames
+        else:
+            frames.close()
+
+    def show_frame(self, index):
+        """Switch the base image to another frame, keeping view, grid and overlay state
+
+        Returns False if there is no such frame or it could not be decoded.
+        """
+        from tkinter import messagebox
+        if not self.frames:
+            return False
+        index = index % self.frames.n_frames
+        try:
+            frame = self.frames.get_frame(index)
+        except Exception as e:
+            self.stop_animation()
+            messagebox.showerror("Error", f"Could not decode frame {index + 1}:\n{str(e)}")
+            return False
+        
+        self.frame_index = index
+        self.true_original_image = frame
+        self.original_image = self.apply_base_ops(frame)
+        self.frames.prefetch(index)
+        self.update_frame_display()
+        self.update_zoom(self.slider.get())
+        return True
+
+    def next_frame(self, event):
+        """Show the next frame (Page Down)"""
+        self.show_frame(self.frame_index + 1)
+
+    def previous_frame(self, event):
+        """Show the previous frame (Page Up)"""
+        self.show_frame(self.frame_index - 1)
+
+    def toggle_animation(self, event):
+        """Start or stop animation playback (Space)"""
+        if self.animation_job:
+            self.stop_animation()
+        elif self.frames:
+            self.animation_job = self.root.after_idle(self.animate_step)
+
+    def animate_step(self):
+        """Advance one frame and schedule the next one using the frame duration"""
+        if not self.show_frame(self.frame_index + 1) or not self.animation_job:
+            return  # Playback was stopped (a frame that failed to decode stops it), do not bring it back
+        duration = self.true_original_image.info.get('duration') or 100
+        self.animation_job = self.root.after(max(int(duration), 20), self.animate_step)
+
+    def stop_animation(self):
+        """Cancel scheduled animation playback"""
+        if self.animation_job:
+            self.root.after_cancel(self.animation_job)
+            self.animation_job = None
+
+    def update_frame_display(self):
+        """Update the frame counter, and the base rotation while there is one, in the status bar"""
+        total = self.frames.n_frames if self.frames else 1
+        text = f"Frame: {self.frame_index + 1}/{total}"
+        if self.base_rotation:
+            text += f"  Rotation: {self.base_rotation:g}°"
+        self.frame_label.config(text=text)
+
+    def on_slider_change(self, value):
+        """Zoom slider callback; skips the echo of slider.set() for a frame already rendered"""
+        if self.current_zoom is not None and abs(float(value) - self.current_zoom) <= self.slider['resolution'] / 2:
+            return
+        self.fit_mode = False
+        self.update_zoom(value)
 
     def update_displayed_image(self):
         zoom_level = float(self.slider.get())
@@ -1117,6 +5871,7 @@ In edit overlay mode:
         
         # Determine what should be dragged
         self.dragging_what = self.get_what_to_drag(event.x, event.y, zoom_level)
+        self.drag_serial += 1
         
         # Store initial drag position
         self.drag_start_x = event.x
@@ -1127,8 +5882,8 @@ In edit overlay mode:
             # Convert canvas coordinates to image coordinates for grid rotation center
             canvas_width = self.canvas.winfo_width()
             canvas_height = self.canvas.winfo_height()
-            img_width = int(self.original_image.size[0] * zoom_level)
-            img_height = int(self.original_image.size[1] * zoom_level)
+            img_width = int(self.get_base_size()[0] * zoom_level)
+            img_height = int(self.get_base_size()[1] * zoom_level)
             
             # Calculate image position on canvas (centered)
             x_offset = max((canvas_width - img_width) / 2, 0)
@@ -1139,13 +5894,14 @@ In edit overlay mode:
             image_y = (event.y - y_offset) / zoom_level
             
             # Store rotation center (clamped to image bounds)
-            self.grid_rotation_center_x = max(0, min(image_x, self.original_image.size[0]))
-            self.grid_rotation_center_y = max(0, min(image_y, self.original_image.size[1]))
+            self.grid_rotation_center_x = max(0, min(image_x, self.get_base_size()[0]))
+            self.grid_rotation_center_y = max(0, min(image_y, self.get_base_size()[1]))
 
         # Set up canvas scanning for pan mode
         if self.dragging_what == "pan":
             self.canvas.scan_mark(event.x, event.y)
 
+    @profiled
     def do_drag(self, event):
         """Handle mouse drag based on what's being dragged"""
         if not self.dragging_what:
@@ -1186,7 +5942,11 @@ In edit overlay mode:
     def end_drag(self, event):
         """Clean up after dragging ends"""
         self.dragging_what = None
+        if self.stats_box and self.stats_box[0] == self.stats_box[1]:
+            self.stats_box = None  # A Shift-click without a drag goes back to the cell under the pointer
+            self.show_region_stats()
 
+    @profiled
     def on_mouse_wheel(self, event):
         # Linux: Check event.num to determine the direction of the scroll
         if platform.system() == "Windows":
@@ -1195,21 +5955,17 @@ In edit overlay mode:
             direction = 1 if event.num == 4 else -1
 
         # Determine zoom change
+        self.fit_mode = False
         zoom_change = 0.1 if direction > 0 else -0.1
         new_zoom = self.slider.get() + zoom_change
         
         # Clamp to slider bounds
         new_zoom = max(self.slider['from'], min(new_zoom, self.slider['to']))
         
-        # If we have an overlay, scale it proportionally with the zoom change
-        if self.overlay_image and self.original_overlay_image:
-            # Calculate the zoom ratio change
-            old_zoom = self.slider.get()
-            if old_zoom > 0:  # Avoid division by zero
-                zoom_ratio = new_zoom / old_zoom
-                # Apply the same zoom ratio to overlay scale
-                self.overlay_scale *= zoom_ratio
-                self.overlay_scale = max(0.1, self.overlay_scale)  # Minimum scale limit
+        # If we have overlays, scale them proportionally with the zoom change
+        old_zoom = self.slider.get()
+        if old_zoom > 0:  # Avoid division by zero
+            self.scale_overlays(new_zoom / old_zoom)
         
         self.slider.set(new_zoom)
         self.update_zoom(new_zoom)
@@ -1218,8 +5974,9 @@ In edit overlay mode:
         size_str = self.image_size_var.get()
         try:
             width, height = map(int, size_str.split("x"))
-            resized_image = self.original_image.resize((width, height), Image.BICUBIC)
+            resized_image = resize_image(self.original_image, (width, height), magnify_nearest=False)
             self.original_image = resized_image  # Update the original image reference
+            self.base_ops.append(('resize', (width, height)))
             self.update_zoom(self.slider.get())  # Refresh the image
         except ValueError:
             # If the format is wrong, flash the entry in red
@@ -1230,40 +5987,141 @@ In edit overlay mode:
             self.image_size_var.set(f"{self.original_image.size[0]}x{self.original_image.size[1]}")
 
 
+_IMPORT_DONE = time.perf_counter()
+
+
+def open_image_window(master, image_path):
+    """Open an image (or a workspace) in a new top-level window of a running instance"""
+    from tkinter import messagebox
+    window = None
+    try:
+        workspace = None
+        if image_path.endswith(WORKSPACE_EXTENSION):
+            workspace = read_workspace(image_path)
+            image_path = workspace['base']['path']
+        with Image.open(image_path) as image:
+            width, height = image.size
+        window = tk.Toplevel(master)
+        window.geometry(f"{width}x{height+50}")  # +50 to account for controls
+        window.title(f"Image Zoomer - {os.path.basename(image_path)}")
+        return ImageZoomApp(window, image_path, workspace)
+    except Exception as e:
+        if window:
+            window.destroy()
+        messagebox.showerror("Error", f"Could not open image:\n{str(e)}")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image viewer with zoom, overlay and grid")
+    parser.add_argument("image", nargs="?",
+                        help=f"image or {WORKSPACE_EXTENSION} workspace to open (a file dialog is shown if omitted)")
+    parser.add_argument("--single-instance", action="store_true",
+                        help="hand the image to an already running Image Zoomer instead of starting a new one")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="print startup timings as JSON and exit after the first full-quality frame")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record every handled input event with timing and view state to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recorded session, print frame latencies as JSON and exit")
+    parser.add_argument("--headless", action="store_true",
+                        help="with --replay, re-render the recorded frames without opening a window")
+    parser.add_argument("--watch", action="store_true",
+                        help="reload the image whenever another program rewrites it, keeping the view")
+    parser.add_argument("--automation", nargs="?", const="", metavar="SOCKET",
+                        help="run JSON command batches sent to SOCKET (a per-user default if omitted), "
+                             "rendering once per batch; see send_automation_request")
+    parser.add_argument("--mmap", action="store_true",
+                        help="decode images once into raw files in the cache directory and map them, "
+                             "sharing the pixels between windows and processes")
+    args = parser.parse_args()
+    exit_code = 0
+    
+    if args.mmap or os.environ.get(PIXEL_STORE_ENV_VAR, "0") != "0":
+        enable_pixel_store()
+
+    replay = None
+    if args.replay:
+        if args.headless:
+            import json
+            print(json.dumps(replay_headless(args.replay, args.image), indent=2))
+            sys.exit(0)
+        replay = read_recording(args.replay)
+
+    # Hand over to a warm instance before paying for any window setup
+    if args.single_instance and args.image and send_to_running_instance(args.image):
+        sys.exit(0)
+
     root = tk.Tk()
     root.configure(bg='gray')
 
-    # Determine desktop path based on OS
-    if platform.system() == "Windows":
-        desktop = os.path.join(os.path.expanduser("~"), 'Desktop')
-    else:  # This should cover Linux and MacOS
-        desktop = os.path.expanduser("~/Desktop")
-
-    image_path = filedialog.askopenfilename(
-        initialdir=desktop, 
-        title="Select Image to Open",
-        filetypes=[
-            ("All Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff *.tif *.webp"),
-            ("PNG files", "*.png"), 
-            ("JPEG files", "*.jpg *.jpeg"), 
-            ("GIF files", "*.gif"),
-            ("BMP files", "*.bmp"),
-            ("TIFF files", "*.tiff *.tif"),
-            ("WebP files", "*.webp"),
-            ("All files", "*.*")
-        ]
-    )
+    image_path = args.image or (replay and replay[0]['image'])
+    if not image_path:
+        # Determine desktop path based on OS
+        if platform.system() == "Windows":
+            desktop = os.path.join(os.path.expanduser("~"), 'Desktop')
+        else:  # This should cover Linux and MacOS
+            desktop = os.path.expanduser("~/Desktop")
+
+        image_path = filedialog.askopenfilename(
+            initialdir=desktop, 
+            title="Select Image to Open",
+            filetypes=IMAGE_FILETYPES
+        )
+
+    workspace = None
+    if image_path and image_path.endswith(WORKSPACE_EXTENSION):
+        workspace = read_workspace(image_path)
+        image_path = workspace['base']['path']
 
     if image_path:
         # Get the image dimensions
         image = Image.open(image_path)
         width, height = image.size
 
-        # Set window geometry to image dimensions
+        # Set window geometry to image dimensions (a replay gets the recorded canvas size back)
+        if replay:
+            width, height = replay[0]['canvas']
         root.geometry(f"{width}x{height+50}")  # +50 to account for controls
         root.title(f"Image Zoomer - {os.path.basename(image_path)}")
 
-        app = ImageZoomApp(root, image_path)
+        app = ImageZoomApp(root, image_path, workspace)
+        if args.watch:
+            app.set_watch_mode(True)
+
+        if args.measure_startup:
+            def report_startup(timings):
+                import json
+                global exit_code
+                over_budget = app.check_startup_budget()
+                print(json.dumps({'timings': timings, 'over_budget': over_budget}, indent=2))
+                exit_code = 1 if over_budget else 0
+                root.quit()
+            app.on_startup_complete = report_startup
+        elif replay:
+            def report_replay(report):
+                import json
+                print(json.dumps(report, indent=2))
+                root.quit()
+            app.on_startup_complete = lambda timings: app.replay_events(*replay, on_done=report_replay)
+        elif args.record:
+            app.on_startup_complete = lambda timings: app.start_recording(args.record)
+
+        server = None
+        if args.single_instance:
+            server = InstanceServer(root, lambda path: open_image_window(root, path))
+            server.start()
+        automation = None
+        if args.automation is not None:
+            automation = AutomationServer(app, args.automation or None)
+            if automation.start():
+                print(f"Automation socket: {automation.socket_path}")
         
-        root.mainloop()
+        try:
+            root.mainloop()
+        finally:
+            if server:
+                server.stop()
+            if automation:
+                automation.stop()
+    
+    sys.exit(exit_code)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import ImageZoomer
+
+
+def smooth_noise(shape, seed):
+    """Random texture with some spatial correlation, like image content"""
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 256, (shape[0] // 4, shape[1] // 4), dtype=np.uint8))
+    return np.asarray(image.resize(shape[::-1], Image.BICUBIC), dtype=np.float32)
+
+
+@pytest.mark.parametrize("shift", [(0, 0), (5, -9), (-17, 3), (31, 30)])
+def test_phase_correlate_finds_whole_pixel_shift(shift):
+    a = smooth_noise((128, 96), 5)
+    b = np.roll(a, shift, axis=(0, 1))
+    dy, dx, peak = ImageZoomer.phase_correlate(a, b)
+    # b(y + dy, x + dx) == a(y, x)
+    assert (dy, dx) == pytest.approx(shift, abs=0.05)
+    assert peak > 0.5
+
+
+def test_phase_correlate_finds_sub_pixel_shift():
+    large = smooth_noise((256, 256), 6)
+    a = np.asarray(Image.fromarray(large).reduce(2))
+    # Half a pixel at the reduced scale is one pixel before reducing
+    b = np.asarray(Image.fromarray(np.roll(large, (1, -1), axis=(0, 1))).reduce(2))
+    dy, dx, _ = ImageZoomer.phase_correlate(a, b)
+    assert (dy, dx) == pytest.approx((0.5, -0.5), abs=0.2)
+
+
+def test_phase_correlate_unrelated_images_have_a_low_peak():
+    rng = np.random.default_rng(7)
+    a, b = rng.random((64, 64)), rng.random((64, 64))
+    assert ImageZoomer.phase_correlate(a, b)[2] < ImageZoomer.ALIGN_MIN_PEAK * 4
@@ -0,0 +1,53 @@
+import os
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import ImageZoomer
+
+
+@pytest.fixture
+def renderer():
+    rng = np.random.default_rng(1)
+    base = Image.fromarray(rng.integers(0, 256, (203, 157, 3), dtype=np.uint8))
+    overlay = Image.fromarray(rng.integers(0, 256, (60, 90, 4), dtype=np.uint8))
+    return ImageZoomer.CompositeRenderer(base, scale=1.5, base_offset=(7, -4), overlay=overlay,
+                                         overlay_scale=1.2, overlay_offset=(10, 5), overlay_rotation=12,
+                                         opacity=180, grid=(25, 3, 4, 7, 40, 50))
+
+
+@pytest.mark.parametrize("extension", [".png", ".tif"])
+def test_strip_export_matches_render(renderer, tmp_path, extension):
+    path = str(tmp_path / f"export{extension}")
+    progress = []
+    ImageZoomer.write_composite(renderer, path, strip_height=32, progress=lambda done, total: progress.append(done))
+
+    width, height = renderer.size
+    expected = np.vstack([np.asarray(renderer.render((0, top, width, min(height, top + 32))))
+                          for top in range(0, height, 32)])
+    with Image.open(path) as exported:
+        assert exported.size == renderer.size
+        pixels = np.asarray(exported.convert('RGB'))
+    assert np.array_equal(pixels, expected)
+    # Resampling a strip can round differently from resampling the whole image, but only by one level
+    whole = np.asarray(renderer.render((0, 0, width, height)), dtype=int)
+    assert np.abs(pixels - whole).max() <= 1
+    assert progress == list(range(1, len(progress) + 1))
+    assert len(progress) == -(-renderer.size[1] // 32)
+
+
+def test_export_rejects_unknown_extension(renderer, tmp_path):
+    path = str(tmp_path / "export.jpg")
+    with pytest.raises(ValueError):
+        ImageZoomer.write_composite(renderer, path)
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("lengths", [(0, 10), (1, 1), (1000, 70000), (65521, 65522), (300000, 5)])
+def test_adler32_combine(lengths):
+    rng = np.random.default_rng(sum(lengths))
+    first, second = (rng.integers(0, 256, length, dtype=np.uint8).tobytes() for length in lengths)
+    combined = ImageZoomer._adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second))
+    assert combined == zlib.adler32(first + second)
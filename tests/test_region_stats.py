@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import ImageZoomer
+
+
+def expected_cells(values, mask, origin, interval):
+    """Statistics of every cell straight from the pixels, for comparison with the tables"""
+    height, width = values.shape
+    left, top = origin
+    cells = {}
+    for row in range(int(np.floor(top / interval)), int(np.floor((top + height) / interval)) + 1):
+        for column in range(int(np.floor(left / interval)), int(np.floor((left + width) / interval)) + 1):
+            x0, x1 = (int(np.clip(round(v), 0, width)) for v in (column * interval - left, (column + 1) * interval - left))
+            y0, y1 = (int(np.clip(round(v), 0, height)) for v in (row * interval - top, (row + 1) * interval - top))
+            block = values[y0:y1, x0:x1].astype(np.float64)
+            if mask is not None:
+                block = block[mask[y0:y1, x0:x1]]
+            if block.size:
+                cells[(column, row)] = (block.size, block.mean(), block.std(), block.min(), block.max())
+    return cells
+
+
+def assert_cells_match(actual, expected):
+    assert actual.keys() == expected.keys()
+    for cell, (count, mean, std, low, high) in expected.items():
+        assert actual[cell][0] == count
+        assert actual[cell][1:] == pytest.approx((mean, std, low, high), rel=1e-9, abs=1e-6)
+
+
+@pytest.mark.parametrize("mode, maximum", [("L", 256), ("I;16", 65536), ("F", 1)])
+def test_cells_unrotated(mode, maximum):
+    rng = np.random.default_rng(2)
+    width, height = 97, 61
+    if mode == "F":
+        array = rng.random((height, width), dtype=np.float32)
+    else:
+        array = rng.integers(0, maximum, (height, width)).astype(np.uint8 if mode == "L" else np.uint16)
+    image = Image.fromarray(array)
+    assert image.mode == mode
+    stats = ImageZoomer.RegionStats(image)
+    shift = (width / 2 + 5, height / 2 + 3)  # The image's top left corner lands at (5, 3) from the grid origin
+
+    cells = stats.cells(16, shift)
+    assert_cells_match(cells, expected_cells(array, None, (5, 3), 16))
+    assert stats.query((16, 16, 32, 32), shift) == pytest.approx(cells[(1, 1)])
+    assert stats.query((-50, -50, -40, -40), shift) is None
+
+
+def test_cells_of_32_bit_values():
+    # Sums of squares of these would overflow integer tables
+    rng = np.random.default_rng(4)
+    array = rng.integers(-2**31, 2**31, (64, 64), dtype=np.int64).astype(np.int32)
+    image = Image.fromarray(array)
+    assert image.mode == "I"
+    stats = ImageZoomer.RegionStats(image)
+
+    assert_cells_match(stats.cells(32, (32, 32)), expected_cells(array, None, (0, 0), 32))
+
+
+@pytest.mark.parametrize("scale, rotation, grid_rotation", [(1.0, 0.0, 30.0), (0.7, 15.0, 0.0), (2.5, 0.0, -8.0)])
+def test_cells_along_grid_axes(scale, rotation, grid_rotation):
+    rng = np.random.default_rng(3)
+    image = Image.fromarray(rng.integers(0, 256, (80, 120), dtype=np.uint8))
+    stats = ImageZoomer.RegionStats(image, scale, rotation, grid_rotation)
+    shift = (11.5, -7.25)
+
+    cells = stats.cells(10, shift)
+    origin = (stats.origin[0] + shift[0], stats.origin[1] + shift[1])
+    assert_cells_match(cells, expected_cells(stats.values, stats.mask, origin, 10))
+    for (column, row), values in cells.items():
+        box = (column * 10, row * 10, (column + 1) * 10, (row + 1) * 10)
+        assert stats.query(box, shift) == pytest.approx(values)
+    # Every resampled pixel of the image falls in exactly one cell
+    assert sum(values[0] for values in cells.values()) == stats.mask.sum()
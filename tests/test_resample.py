@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import ImageZoomer
+
+
+def random_image(size, mode="RGB", seed=4):
+    rng = np.random.default_rng(seed)
+    if mode == "I;16":
+        return Image.fromarray(rng.integers(0, 65536, size[::-1]).astype(np.uint16))
+    return Image.fromarray(rng.integers(0, 256, size[::-1] + (3,), dtype=np.uint8))
+
+
+@pytest.fixture
+def banded(monkeypatch):
+    """Run the parallel paths even on small images and single-core machines"""
+    monkeypatch.setattr(ImageZoomer, "THREAD_POOL_SIZE", 4)
+    monkeypatch.setattr(ImageZoomer, "PARALLEL_RESAMPLE_MIN_PIXELS", 0)
+
+
+def max_difference(a, b):
+    return np.abs(np.asarray(a, dtype=np.int64) - np.asarray(b, dtype=np.int64)).max()
+
+
+@pytest.mark.parametrize("mode", ["RGB", "I;16"])
+def test_resize_by_whole_factor_is_block_average(mode):
+    image = random_image((400, 300), mode)
+    resized = ImageZoomer.resize_image(image, (100, 75))
+    assert resized.size == (100, 75)
+    assert max_difference(resized, ImageZoomer.reduce_image(image, 4)) == 0
+
+
+def test_resize_reduces_before_lanczos():
+    image = random_image((1000, 700))
+    resized = ImageZoomer.resize_image(image, (97, 68))
+    factor = int(min(1000 / 97, 700 / 68) / ImageZoomer.RESAMPLE_REDUCING_GAP)
+    expected = image.reduce(factor).resize((97, 68), Image.LANCZOS)
+    assert max_difference(resized, expected) == 0
+    # Close to a direct Lanczos resize of the full image
+    direct = np.asarray(image.resize((97, 68), Image.LANCZOS), dtype=np.int64)
+    assert np.abs(np.asarray(resized, dtype=np.int64) - direct).mean() < 2
+
+
+def test_resize_magnifies_with_nearest_from_threshold():
+    image = random_image((40, 30))
+    size = (int(40 * ImageZoomer.NEAREST_MIN_ZOOM), int(30 * ImageZoomer.NEAREST_MIN_ZOOM))
+    assert max_difference(ImageZoomer.resize_image(image, size), image.resize(size, Image.NEAREST)) == 0
+    smooth = ImageZoomer.resize_image(image, size, magnify_nearest=False)
+    assert max_difference(smooth, image.resize(size, Image.BICUBIC)) == 0
+
+
+@pytest.mark.parametrize("policy, resample", [(name, resample) for _, name, resample in ImageZoomer.RESAMPLE_FILTERS
+                                              if resample is not None])
+def test_resize_in_bands_matches_single_resize(banded, policy, resample):
+    image = random_image((331, 257))
+    for size in ((150, 117), (700, 531)):
+        resized = ImageZoomer.resize_image(image, size, policy)
+        assert resized.size == size
+        assert max_difference(resized, image.resize(size, resample)) <= 1
+
+
+@pytest.mark.parametrize("angle", [7.5, -33.0, 90.0, 135.0])
+def test_rotate_matches_pillow(angle):
+    image = random_image((123, 77))
+    rotated = ImageZoomer.rotate_image(image, angle)
+    expected = image.rotate(angle, Image.BICUBIC, expand=True, fillcolor='white')
+    assert rotated.size == expected.size == ImageZoomer.rotated_size(image.size, angle)
+    # The affine coefficients are computed separately from Pillow's, so a pixel may round the other way
+    assert max_difference(rotated, expected) <= 1
+
+
+@pytest.mark.parametrize("angle", [7.5, -33.0])
+def test_rotate_in_bands_matches_pillow(banded, angle):
+    image = random_image((301, 217))
+    rotated = ImageZoomer.rotate_image(image, angle)
+    expected = image.rotate(angle, Image.BICUBIC, expand=True, fillcolor='white')
+    assert rotated.size == expected.size
+    assert max_difference(rotated, expected) <= 1
@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tkinter as tk
+
+import pytest
+from PIL import Image
+
+import ImageZoomer
+
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("needs a display")
+    root.withdraw()
+    yield root
+    root.destroy()
+
+
+@pytest.fixture
+def image_path(tmp_path, monkeypatch):
+    monkeypatch.setenv(ImageZoomer.PREVIEW_CACHE_ENV_VAR, str(tmp_path / "cache"))
+    path = tmp_path / "image.png"
+    Image.new("RGB", (640, 480), "gray").save(path)
+    return path
+
+
+def test_startup_timings(root, image_path, monkeypatch):
+    # Measure as if the module had just been imported, not at the start of the test session
+    now = time.perf_counter()
+    monkeypatch.setattr(ImageZoomer, "_STARTUP_T0", ImageZoomer._STARTUP_T0 + now - ImageZoomer._IMPORT_DONE)
+    monkeypatch.setattr(ImageZoomer, "_IMPORT_DONE", now)
+
+    app = ImageZoomer.ImageZoomApp(root, str(image_path))
+    reported = []
+    app.on_startup_complete = reported.append
+    deadline = time.monotonic() + 30
+    while not reported and time.monotonic() < deadline:
+        root.update()
+        time.sleep(0.005)
+
+    assert reported, "startup did not complete"
+    timings = app.startup_timings
+    for phase in ('import', 'first_paint', 'first_full_frame'):
+        assert timings[phase] >= 0
+    assert timings['first_paint'] <= timings['first_full_frame']
+    assert app.check_startup_budget() == {}
+
+
+def test_measure_startup(image_path):
+    command = [sys.executable, os.path.abspath(ImageZoomer.__file__), "--measure-startup", str(image_path)]
+    if not os.environ.get("DISPLAY"):
+        if not shutil.which("xvfb-run"):
+            pytest.skip("needs a display or xvfb-run")
+        command = ["xvfb-run", "-a"] + command
+    result = subprocess.run(command, capture_output=True, text=True, timeout=60)
+
+    # Other messages may be printed around the report
+    report, _ = json.JSONDecoder().raw_decode(result.stdout, result.stdout.index("{\n"))
+    assert set(report['timings']) >= set(ImageZoomer.STARTUP_BUDGET)
+    assert report['over_budget'] == {}
+    assert result.returncode == 0, result.stderr